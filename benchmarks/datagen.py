@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic data for benchmarks and load tests.
+
+For a seed and a scale every run produces the same users with
+  - recurring and one-time ``AccountEntry`` items (salary with yearly raises, rent, utilities,
+    subscriptions, insurance, occasional purchases),
+  - a multi-year bank statement in the German CSV export format read by ``convert_to_utf8``
+    (latin1, ``;`` separated, ``dd.mm.yy`` dates, decimal comma),
+  - electricity, gas and water counters with monthly readings and seasonal consumption.
+
+Usage:
+    python3 benchmarks/datagen.py --users 3 --years 5 --transactions-per-month 40
+    python3 benchmarks/datagen.py --csv statement.csv --years 10
+"""
+import argparse
+import calendar
+import csv
+import dataclasses
+import datetime
+import io
+import math
+import os
+import random
+import string
+import sys
+import uuid
+from typing import List
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(PARENT_DIR)
+
+# fmt: off
+from home_api.db.tables import AccountEntry, BankTransaction, EnergyCounter, EnergyCounterReading  # noqa: E402
+from home_api.db.utils import diff_month  # noqa: E402
+from home_api.managers.user_manager import UserManager  # noqa: E402
+# fmt: on
+
+FIRST_NAME = "Synthetic"
+
+CSV_HEADER = ["Auftragskonto", "Buchungstag", "Valutadatum", "Buchungstext", "Verwendungszweck",
+              "Gläubiger ID", "Mandatsreferenz", "Kundenreferenz (End-to-End)", "Sammlerreferenz",
+              "Lastschrift Ursprungsbetrag", "Auslagenersatz Rücklastschrift",
+              "Begünstigter/Zahlungspflichtiger", "Kontonummer/IBAN", "BIC (SWIFT-Code)", "Betrag",
+              "Währung", "Info"]
+
+# (counterparty, purpose, category, subcategory, keyword, booking text, mean amount, purchases per month)
+MERCHANTS = [
+    ("REWE Markt GmbH", "REWE SAGT DANKE", "Shopping", "Supermarket", "rewe", "KARTENZAHLUNG", -38.0, 5),
+    ("EDEKA Center", "EDEKA Einkauf", "Shopping", "Supermarket", "edeka", "KARTENZAHLUNG", -29.0, 3),
+    ("ALDI SUED", "ALDI SUED Filiale", "Shopping", "Supermarket", "aldi", "KARTENZAHLUNG", -24.0, 3),
+    ("dm-drogerie markt", "dm Filiale", "Shopping", "Drugstore", "dm", "KARTENZAHLUNG", -15.0, 1.5),
+    ("AMAZON EU S.A R.L.", "AMAZON.DE Bestellung", "Shopping", "Online Retail", "amazon", "FOLGELASTSCHRIFT",
+     -42.0, 2),
+    ("Lieferando.de", "Lieferando Bestellung", "Food & Drinks", "Delivery Service", "lieferando",
+     "FOLGELASTSCHRIFT", -27.0, 1.5),
+    ("Restaurant Da Mario", "Restaurant Besuch", "Food & Drinks", "Restaurant", "restaurant",
+     "KARTENZAHLUNG", -46.0, 1.5),
+    ("Baeckerei Behrens-Meyer", "Baeckerei Einkauf", "Food & Drinks", "Bakery", "baeckerei",
+     "KARTENZAHLUNG", -6.5, 4),
+    ("ARAL Station", "ARAL Tankstelle", "Transport", "Gas Station", "aral", "KARTENZAHLUNG", -64.0, 1.5),
+    ("Geldautomat Sparkasse", "Bargeldauszahlung Geldautomat", "Other", "Cash Withdrawal", "geldautomat",
+     "BARGELDAUSZAHLUNG", -100.0, 1),
+    ("Apotheke am Markt", "Apotheke Einkauf", "Health", "Pharmacy", "apotheke", "KARTENZAHLUNG", -18.0, 0.5),
+    ("IKEA Deutschland", "IKEA Einrichtung", "Shopping", "Furniture & Living", "ikea", "KARTENZAHLUNG",
+     -120.0, 0.2),
+]
+
+# (counterparty, purpose, category, subcategory, keyword, booking text, amount, tag)
+RECURRING = [
+    ("Arbeitgeber GmbH", "LOHN/GEHALT", "Income", "Salary", "lohn/gehalt", "LOHN / GEHALT", 3200.0, "#Income"),
+    ("Hausverwaltung Nord", "Miete Wohnung", "Living Expenses", "Rent", "miete", "DAUERAUFTRAG", -950.0, "#Rent"),
+    ("Stadtwerke Energie", "Abschlag Strom", "Living Expenses", "Electricity & Gas", "strom", "FOLGELASTSCHRIFT",
+     -65.0, "#Utilities"),
+    ("Telekom Deutschland", "Telekom Rechnung Internet", "Living Expenses", "Telecom", "telekom",
+     "FOLGELASTSCHRIFT", -45.0, "#Telecom"),
+    ("Beitragsservice ARD ZDF", "Rundfunk Beitrag", "Living Expenses", "Broadcast Fee", "rundfunk",
+     "FOLGELASTSCHRIFT", -18.36, "#Utilities"),
+    ("Netflix International", "Netflix Abo", "Leisure & Entertainment", "Streaming", "netflix",
+     "FOLGELASTSCHRIFT", -13.99, "#Entertainment"),
+    ("Spotify AB", "Spotify Premium", "Leisure & Entertainment", "Streaming", "spotify", "FOLGELASTSCHRIFT",
+     -10.99, "#Entertainment"),
+    ("FitX Deutschland", "FitX Mitgliedsbeitrag", "Health", "Gym", "fitx", "FOLGELASTSCHRIFT", -24.99, "#Health"),
+    ("Depot Sparplan", "ETF Sparplan", "Finance", "Saving & Investing", "etf", "DAUERAUFTRAG", -250.0,
+     "#Savings"),
+]
+
+ONE_TIME = [
+    ("Vacation", "#Travel", -1400.0),
+    ("Laptop", "#Electronics", -1200.0),
+    ("Car repair", "#Transport", -650.0),
+    ("Bonus", "#Income", 2000.0),
+    ("Furniture", "#Living", -800.0),
+    ("Tax refund", "#Income", 700.0),
+]
+
+# (type, unit, base price, price per unit, mean monthly consumption, seasonal amplitude)
+COUNTERS = [
+    ("electricity", "kWh", 11.5, 0.34, 230.0, 0.15),
+    ("gas", "m3", 14.0, 0.12, 90.0, 0.8),
+    ("water", "m3", 6.0, 2.1, 7.0, 0.05),
+]
+
+
+@dataclasses.dataclass
+class SyntheticTransaction(object):
+    booking_date: datetime.date
+    value_date: datetime.date
+    amount: float
+    counterparty: str
+    purpose: str
+    booking_text: str
+    category: str
+    subcategory: str
+    keyword: str
+    # A direct debit the bank returned, the only rows with the chargeback columns
+    returned: bool = False
+
+
+def month_starts(start: datetime.date, months: int) -> List[datetime.date]:
+    dates = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        dates.append(datetime.date(year, month, 1))
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return dates
+
+
+def random_day(rng: random.Random, month: datetime.date) -> datetime.date:
+    return month.replace(day=rng.randint(1, calendar.monthrange(month.year, month.month)[1]))
+
+
+def user_last_name(index: int) -> str:
+    # Names must not contain digits, the index is written in letters
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = string.ascii_lowercase[rest] + letters
+    return "User" + letters
+
+
+def generate_account_entries(rng: random.Random, start: datetime.date, years: int) -> List[dict]:
+    """
+    Recurring items as one entry per contract period, and some one-time items.
+    """
+    entries = []
+    end = start.replace(year=start.year + years) - datetime.timedelta(days=1)
+    salary = rng.uniform(2400, 4200)
+    rent = rng.uniform(700, 1300)
+    for year in range(years):
+        first = start.replace(year=start.year + year)
+        last = first.replace(year=first.year + 1) - datetime.timedelta(days=1)
+        entries.append({"name": "Salary", "tag": "#Income", "amount": round(salary, 2),
+                        "start_date": first, "end_date": last})
+        salary *= rng.uniform(1.01, 1.06)
+        # Rent changes every few years
+        if year % 3 == 0 and year:
+            rent *= rng.uniform(1.02, 1.1)
+        entries.append({"name": "Rent", "tag": "#Rent", "amount": -round(rent, 2),
+                        "start_date": first, "end_date": last})
+    for counterparty, purpose, _, _, _, _, amount, tag in RECURRING[2:]:
+        if rng.random() < 0.8:
+            entries.append({"name": counterparty, "tag": tag, "amount": round(amount * rng.uniform(0.9, 1.1), 2),
+                            "start_date": start, "end_date": end})
+    for _ in range(years * 2):
+        name, tag, amount = rng.choice(ONE_TIME)
+        month = rng.choice(month_starts(start, years * 12))
+        entries.append({"name": name, "tag": tag, "amount": round(amount * rng.uniform(0.5, 1.5), 2),
+                        "start_date": month, "end_date": month})
+    return entries
+
+
+def generate_transactions(rng: random.Random, start: datetime.date, months: int,
+                          transactions_per_month: int = 40) -> List[SyntheticTransaction]:
+    """
+    Monthly standing orders and direct debits plus card payments drawn from ``MERCHANTS``,
+    scaled so a month has about ``transactions_per_month`` transactions.
+    """
+    transactions = []
+    weights = [merchant[7] for merchant in MERCHANTS]
+    purchases = max(0, transactions_per_month - len(RECURRING))
+    for index, month in enumerate(month_starts(start, months)):
+        if index % 12 == 0:
+            day = month.replace(day=5)
+            transactions.append(SyntheticTransaction(day, day, 65.0, "Stadtwerke Energie",
+                                                     "Erstattung Abschlag Strom", "RUECKLASTSCHRIFT", "Income",
+                                                     "Refund", "erstattung", returned=True))
+        for counterparty, purpose, category, subcategory, keyword, text, amount, _ in RECURRING:
+            day = month.replace(day=rng.choice((1, 2, 3)) if amount < 0 else 28)
+            transactions.append(SyntheticTransaction(day, day, round(amount * rng.uniform(0.97, 1.03), 2),
+                                                     counterparty, purpose, text, category, subcategory, keyword))
+        for merchant in rng.choices(MERCHANTS, weights=weights, k=purchases):
+            counterparty, purpose, category, subcategory, keyword, text, amount, _ = merchant
+            booking_date = random_day(rng, month)
+            value = round(amount * rng.lognormvariate(0, 0.5), 2)
+            transactions.append(SyntheticTransaction(booking_date, booking_date, value, counterparty,
+                                                     purpose, text, category, subcategory, keyword))
+    transactions.sort(key=lambda t: t.booking_date, reverse=True)
+    return transactions
+
+
+def to_bank_csv(transactions: List[SyntheticTransaction], account: str = "DE02120300000000202051") -> bytes:
+    """
+    The transactions as the latin1 encoded CSV export of the bank.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter=";", quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    for t in transactions:
+        # Stable pseudo account data of the counterparty
+        number = int(uuid.uuid5(uuid.NAMESPACE_OID, t.counterparty).int % 10 ** 18)
+        debit = t.booking_text in ("FOLGELASTSCHRIFT", "RUECKLASTSCHRIFT")
+        amount = f"{t.amount:.2f}".replace(".", ",")
+        writer.writerow([account, t.booking_date.strftime("%d.%m.%y"), t.value_date.strftime("%d.%m.%y"),
+                         t.booking_text, t.purpose,
+                         f"DE{number % 100:02d}ZZZ{number % 10 ** 11:011d}" if debit else "",
+                         f"MR{number % 10 ** 8:08d}" if debit else "",
+                         "NOTPROVIDED" if t.booking_text != "KARTENZAHLUNG" else "",
+                         f"SR{number % 10 ** 6:06d}" if t.returned else "",
+                         amount if t.returned else "",
+                         "3,00" if t.returned else "",
+                         t.counterparty, f"DE{number:020d}", "COBADEFFXXX",
+                         amount, "EUR", "Umsatz gebucht"])
+    return out.getvalue().encode("latin1")
+
+
+def generate_energy(rng: random.Random, start: datetime.date, months: int) -> List[dict]:
+    """
+    Counters with one reading at the end of every month, the consumption follows the seasons.
+    """
+    counters = []
+    for counter_type, unit, base_price, price, mean, amplitude in COUNTERS:
+        reading = round(rng.uniform(1000, 20000), 1)
+        counter = {"counter_id": f"{counter_type[:2].upper()}-{rng.randint(100000, 999999)}",
+                   "counter_type": counter_type, "energy_unit": unit, "frequency": "monthly",
+                   "base_price": base_price, "price": price, "start_date": start,
+                   "end_date": month_starts(start, months + 1)[-1], "first_reading": reading,
+                   "readings": []}
+        for month in month_starts(start, months):
+            # Winter months consume more
+            season = 1 + amplitude * math.cos(2 * math.pi * (month.month - 1) / 12)
+            reading = round(reading + max(0.0, rng.gauss(mean * season, mean * 0.1)), 1)
+            counter["readings"].append({"reading": reading, "reading_date": month.replace(day=28)})
+        counters.append(counter)
+    return counters
+
+
+def seed_user(db_session, index: int, years: int = 3, transactions_per_month: int = 40, seed: int = 0,
+              end: datetime.date | None = None):
+    """
+    Creates (or recreates) the synthetic user ``index`` with all of its data, ending with the
+    month before ``end`` (default today). Returns the user.
+    """
+    rng = random.Random(f"{seed}:{index}")
+    end = (end or datetime.date.today()).replace(day=1)
+    start = end.replace(year=end.year - years)
+    months = diff_month(end, start)
+
+    user_manager = UserManager(db_session=db_session)
+    last_name = user_last_name(index)
+    user_manager.delete_user_by_email(f"{FIRST_NAME}.{last_name}@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name=FIRST_NAME, last_name=last_name)
+
+    for entry in generate_account_entries(rng, start, years):
+        months_count = diff_month(entry["end_date"], entry["start_date"]) + 1
+        db_session.add(AccountEntry(id=uuid.UUID(int=rng.getrandbits(128)), user_id=user.id,
+                                    months_count=months_count, total_amount=entry["amount"] * months_count,
+                                    **entry))
+    for t in generate_transactions(rng, start, months, transactions_per_month):
+        db_session.add(BankTransaction(id=uuid.UUID(int=rng.getrandbits(128)), user_id=user.id,
+                                       booking_date=t.booking_date, value_date=t.value_date, amount=t.amount,
+                                       currency="EUR", description=f"{t.booking_text} {t.purpose} {t.counterparty}",
+                                       category=t.category, subcategory=t.subcategory, keyword=t.keyword))
+    for counter in generate_energy(rng, start, months):
+        readings = counter.pop("readings")
+        energy_counter = EnergyCounter(id=uuid.UUID(int=rng.getrandbits(128)), user_id=user.id, **counter)
+        db_session.add(energy_counter)
+        db_session.flush()
+        for reading in readings:
+            db_session.add(EnergyCounterReading(id=uuid.UUID(int=rng.getrandbits(128)),
+                                                counter_id=energy_counter.id, **reading))
+    db_session.commit()
+    return user
+
+
+def seed_users(db_session, users: int, first: int = 0, **kwargs) -> list:
+    return [seed_user(db_session, index, **kwargs) for index in range(first, first + users)]
+
+
+def delete_users(db_session, users: int, first: int = 0):
+    user_manager = UserManager(db_session=db_session)
+    for index in range(first, first + users):
+        user_manager.delete_user_by_email(f"{FIRST_NAME}.{user_last_name(index)}@gmail.com")
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic data")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--transactions-per-month", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", type=str, default=None,
+                        help="Only write the bank statement of the first user to this file")
+    args = parser.parse_args()
+
+    if args.csv:
+        rng = random.Random(f"{args.seed}:0")
+        end = datetime.date.today().replace(day=1)
+        start = end.replace(year=end.year - args.years)
+        transactions = generate_transactions(rng, start, diff_month(end, start), args.transactions_per_month)
+        with open(args.csv, "wb") as f:
+            f.write(to_bank_csv(transactions))
+        print(f"Wrote {len(transactions)} transactions to {args.csv}")
+        return
+
+    from home_api.runtime import db_session, init_db
+
+    init_db()
+    for user in seed_users(db_session, args.users, years=args.years,
+                           transactions_per_month=args.transactions_per_month, seed=args.seed):
+        print(f"Seeded {user.email} (id={user.id})")
+
+
+if __name__ == "__main__":
+    run()
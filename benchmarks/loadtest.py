@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test of the whole API with concurrent users.
+
+Synthetic users are seeded (see datagen.py) and logged in, then ``--concurrency`` virtual users
+replay a weighted mix of traffic for ``--duration`` seconds:
+  - dashboard: the read endpoints of the dashboard page (dashboard, charts, analysis, energy),
+  - upload: a small bank statement CSV uploaded to ``/api/transactions/upload``,
+  - sse: connect to ``/api/events`` and wait for the first event.
+
+By default the ASGI app is driven in-process with httpx, pass ``--url`` to load a running
+server (e.g. uvicorn) instead. Throughput, latency percentiles and error rates are reported
+per route.
+
+Requires the database environment variables (DB_USER, ... or DATABASE_URL) and JWT_SECRET_KEY.
+
+Usage:
+    python3 benchmarks/loadtest.py --users 4 --concurrency 16 --duration 30 --mix dashboard=8 upload=1 sse=1
+    python3 benchmarks/loadtest.py --url http://127.0.0.1:5001 --concurrency 32 --output loadtest.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import urllib.parse
+
+import httpx
+from dateutil.relativedelta import relativedelta
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(PARENT_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# fmt: off
+from datagen import delete_users, generate_transactions, seed_users, to_bank_csv  # noqa: E402
+from home_api.db.utils import generate_password  # noqa: E402
+from home_api.runtime import db_session, init_db  # noqa: E402
+# fmt: on
+
+# Index of the first synthetic user, apart from the users of the other benchmarks
+FIRST_USER_INDEX = 2000
+SSE_ROUTE = "/api/events/{session_id}"
+UPLOAD_ROUTE = "/api/transactions/upload/{session_id}"
+
+
+def dashboard_routes(today: datetime.date) -> list:
+    start = today - relativedelta(years=1)
+    months = urllib.parse.urlencode({"start_month": start.month, "start_year": start.year,
+                                     "end_month": today.month, "end_year": today.year})
+    return [
+        ("/api/dashboard/{session_id}", ""),
+        ("/api/expenses/account_entries/{session_id}", ""),
+        ("/api/expenses/month_expenses_and_savings/{session_id}", f"month={today.month}&year={today.year}"),
+        ("/api/expenses/overview_chart/{session_id}", months),
+        ("/api/expenses/analysis_overview/{session_id}", months + "&frequency=monthly"),
+        ("/api/transactions/overview_chart/{session_id}", months),
+        ("/api/transactions/category_expenses_and_savings/{session_id}", ""),
+        ("/api/transactions/transactions_page/{session_id}", "limit=50"),
+        ("/api/energy/energy_consumption_overview/{session_id}", months),
+        ("/api/energy/energy_consumption_total/{session_id}", ""),
+    ]
+
+
+def parse_mix(values) -> dict:
+    mix = {}
+    for value in values:
+        kind, _, weight = value.partition("=")
+        if kind not in ("dashboard", "upload", "sse"):
+            raise argparse.ArgumentTypeError(f"Unknown traffic kind {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def percentile(samples: list, q: float) -> float:
+    # Nearest rank on the sorted samples
+    index = max(0, min(len(samples) - 1, int(round(q / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+class RouteStats(object):
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, latency: float, status):
+        self.latencies.append(latency)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        samples = sorted(self.latencies)
+        return {
+            "requests": len(samples),
+            "requests_per_second": len(samples) / elapsed,
+            "error_rate": self.errors / len(samples),
+            "statuses": self.statuses,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+async def asgi_first_event(app, path: str, headers: dict, timeout: float):
+    """
+    The httpx ASGI transport waits for the whole body, which never ends for server sent
+    events. The app is called directly and the client disconnects after the first event.
+    """
+    loop = asyncio.get_running_loop()
+    first = loop.create_future()
+    disconnected = asyncio.Event()
+    requested = False
+    buffer = b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+        "client": ("127.0.0.1", 0), "server": ("loadtest", 80),
+    }
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal buffer
+        if first.done():
+            return
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            first.set_result(message["status"])
+        elif message["type"] == "http.response.body":
+            buffer += message.get("body", b"")
+            if b"\r\n\r\n" in buffer or b"\n\n" in buffer or not message.get("more_body", False):
+                first.set_result(200)
+
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        return await asyncio.wait_for(first, timeout)
+    finally:
+        disconnected.set()
+        try:
+            await asyncio.wait_for(task, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            task.cancel()
+
+
+class LoadTest(object):
+
+    def __init__(self, client: httpx.AsyncClient, app, mix: dict, upload: bytes, timeout: float):
+        self.client = client
+        # Only set in-process, the server sent events are then read from the app directly
+        self.app = app
+        self.mix = mix
+        self.upload = upload
+        self.timeout = timeout
+        self.routes = dashboard_routes(datetime.date.today())
+        self.stats = {}
+
+    async def login(self, user) -> tuple:
+        response = await self.client.post("/api/user/authenticate",
+                                          data={"username": user.username, "password": generate_password(fixed=True)})
+        response.raise_for_status()
+        payload = response.json()
+        return {"cookie": f"access_token=\"Bearer {payload['token']}\""}, payload["session_id"]
+
+    async def dashboard(self, rng, headers, session_id):
+        route, query = rng.choice(self.routes)
+        url = route.format(session_id=session_id) + (f"?{query}" if query else "")
+        response = await self.client.get(url, headers=headers)
+        return route, response.status_code
+
+    async def upload_file(self, rng, headers, session_id):
+        files = {"file": ("statement.csv", self.upload, "text/csv")}
+        response = await self.client.post(UPLOAD_ROUTE.format(session_id=session_id), headers=headers,
+                                          files=files)
+        return UPLOAD_ROUTE, response.status_code
+
+    async def sse(self, rng, headers, session_id):
+        path = SSE_ROUTE.format(session_id=session_id)
+        if self.app is not None:
+            return SSE_ROUTE, await asgi_first_event(self.app, path, headers, self.timeout)
+        async with self.client.stream("GET", path, headers=headers) as response:
+            if response.status_code != 200:
+                return SSE_ROUTE, response.status_code
+            buffer = b""
+            async for chunk in response.aiter_raw():
+                buffer += chunk
+                if b"\r\n\r\n" in buffer or b"\n\n" in buffer:
+                    break
+        return SSE_ROUTE, response.status_code
+
+    async def virtual_user(self, index: int, user, deadline: float, measure_from: float):
+        rng = random.Random(index)
+        headers, session_id = await self.login(user)
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        handlers = {"dashboard": self.dashboard, "upload": self.upload_file, "sse": self.sse}
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights=weights)[0]
+            t0 = time.perf_counter()
+            try:
+                route, status = await asyncio.wait_for(handlers[kind](rng, headers, session_id), self.timeout)
+            except asyncio.TimeoutError:
+                route, status = kind, "timeout"
+            except httpx.HTTPError as e:
+                route, status = kind, type(e).__name__
+            if t0 >= measure_from:
+                self.stats.setdefault(route, RouteStats()).add(time.perf_counter() - t0, status)
+
+    async def run(self, users: list, concurrency: int, duration: float, warmup: float) -> float:
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+        await asyncio.gather(*[self.virtual_user(i, users[i % len(users)], deadline, measure_from)
+                               for i in range(concurrency)])
+        return time.perf_counter() - measure_from
+
+
+async def run_load(args, users, upload):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            load_test = LoadTest(client, None, args.mix, upload, args.timeout)
+            elapsed = await load_test.run(users, args.concurrency, args.duration, args.warmup)
+        return load_test, elapsed
+
+    from home_api.app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            load_test = LoadTest(client, app, args.mix, upload, args.timeout)
+            elapsed = await load_test.run(users, args.concurrency, args.duration, args.warmup)
+    return load_test, elapsed
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Load the API with a mix of concurrent traffic")
+    parser.add_argument("--url", type=str, default=None,
+                        help="Base url of a running server, by default the app is loaded in-process")
+    parser.add_argument("--users", type=int, default=4, help="Number of seeded users")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--transactions-per-month", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds not measured at the start")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout of a single request")
+    parser.add_argument("--mix", type=str, nargs="+", default=["dashboard=8", "upload=1", "sse=1"],
+                        help="Weights of the traffic kinds dashboard, upload and sse")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic users")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the results as json to this file")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    init_db()
+    t0 = time.perf_counter()
+    users = seed_users(db_session, args.users, first=FIRST_USER_INDEX, years=args.years,
+                       transactions_per_month=args.transactions_per_month, seed=args.seed)
+    print(f"Seeded {len(users)} users in {time.perf_counter() - t0:.1f}s")
+    # A statement of the last month, so repeated uploads mostly hit existing transactions
+    month = datetime.date.today().replace(day=1) - relativedelta(months=1)
+    upload = to_bank_csv(generate_transactions(random.Random(f"{args.seed}:upload"), month, 1,
+                                               args.transactions_per_month))
+    try:
+        load_test, elapsed = asyncio.run(run_load(args, users, upload))
+    finally:
+        if not args.keep:
+            delete_users(db_session, args.users, first=FIRST_USER_INDEX)
+
+    routes = {route: stats.summary(elapsed) for route, stats in sorted(load_test.stats.items())}
+    total = sum(route["requests"] for route in routes.values())
+    errors = sum(stats.errors for stats in load_test.stats.values())
+    for route, res in routes.items():
+        print(f"{route}: {res['requests_per_second']:.1f} req/s, p50 {res['p50_ms']:.1f} ms, "
+              f"p95 {res['p95_ms']:.1f} ms, p99 {res['p99_ms']:.1f} ms, errors {res['error_rate']:.1%}")
+    print(f"total: {total / elapsed:.1f} req/s, errors {errors / total if total else 0:.1%}")
+
+    res = {
+        "target": args.url or "in-process",
+        "created_at": datetime.datetime.now().isoformat(),
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "duration": elapsed,
+        "mix": args.mix,
+        "requests": total,
+        "requests_per_second": total / elapsed,
+        "error_rate": errors / total if total else 0,
+        "routes": routes,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=4)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Manager level benchmark suite on synthetic data (see datagen.py).
+
+For every scale ``name:years:transactions_per_month`` a synthetic user is seeded and every
+manager entry point is timed ``--repeat`` times with the result cache disabled, so each call
+does the full work. The results are written as json, including the git commit, so runs of
+different commits can be compared.
+
+Requires the database environment variables (DB_USER, ... or DATABASE_URL).
+
+Usage:
+    python3 benchmarks/managers.py --scales small:1:20 medium:3:40 large:10:80 --repeat 3 \
+        --output bench_managers.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from dateutil.relativedelta import relativedelta
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(PARENT_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# fmt: off
+from datagen import (FIRST_NAME, delete_users, generate_transactions, seed_user, to_bank_csv,  # noqa: E402
+                     user_last_name)
+from home_api.db.tables import BankTransaction  # noqa: E402
+from home_api.managers.cache import result_cache  # noqa: E402
+from home_api.managers.energy_manager import EnergyManager  # noqa: E402
+from home_api.managers.expense_manager import ExpenseManager  # noqa: E402
+from home_api.managers.transactions_manager import TransactionsManager  # noqa: E402
+from home_api.managers.user_manager import UserManager  # noqa: E402
+from home_api.runtime import db_session, init_db  # noqa: E402
+# fmt: on
+
+# Index of the synthetic user the uploads are parsed for, the seeded users start at 0
+UPLOAD_USER_INDEX = 1000
+
+
+def parse_scale(value):
+    name, years, transactions_per_month = value.split(":")
+    return {"name": name, "years": int(years), "transactions_per_month": int(transactions_per_month)}
+
+
+def measure(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        res = func()
+        samples.append(time.perf_counter() - t0)
+        if isinstance(res, dict) and res.get("error") is True:
+            raise RuntimeError(f"{res.get('message')}")
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def entry_points(user, years):
+    expense_manager = ExpenseManager(db_session=db_session)
+    transactions_manager = TransactionsManager(db_session=db_session)
+    energy_manager = EnergyManager(db_session=db_session)
+    user_manager = UserManager(db_session=db_session)
+    today = datetime.date.today().replace(day=1)
+    start = today - relativedelta(years=years)
+    chart_range = {"start_month": start.month, "start_year": start.year,
+                   "end_month": today.month, "end_year": today.year}
+    return {
+        "expenses.get_overview_chart": lambda: expense_manager.get_overview_chart(user_id=user.id, **chart_range),
+        "expenses.create_analysis_overview_monthly": lambda: expense_manager.create_analysis_overview(
+            user_id=user.id, start_date=start, end_date=today, month_freq=1),
+        "expenses.create_analysis_overview_quarterly": lambda: expense_manager.create_analysis_overview(
+            user_id=user.id, start_date=start, end_date=today, month_freq=3),
+        "expenses.get_month_expenses_and_savings": lambda: expense_manager.get_month_expenses_and_savings(
+            user_id=user.id, month=today.month, year=today.year),
+        "transactions.get_overview_chart": lambda: transactions_manager.get_overview_chart(
+            user_id=user.id, **chart_range),
+        "transactions.get_category_expenses_and_savings": lambda:
+            transactions_manager.get_category_expenses_and_savings(user_id=user.id),
+        "user.get_networth_development_percentage": lambda:
+            user_manager.get_networth_development_percentage(user_id=user.id),
+        "energy.get_energy_consumption_overview": lambda: energy_manager.get_energy_consumption_overview(
+            user_id=user.id, start_date=start, end_date=today),
+        "energy.get_total_consumption": lambda: energy_manager.get_total_consumption(user_id=user.id),
+    }
+
+
+def benchmark_parse_file(scale, repeat, seed):
+    rng = random.Random(f"{seed}:upload")
+    today = datetime.date.today().replace(day=1)
+    months = scale["years"] * 12
+    transactions = generate_transactions(rng, today - relativedelta(months=months), months,
+                                         scale["transactions_per_month"])
+    content = to_bank_csv(transactions)
+    user = UserManager(db_session=db_session).create_verified_dummy_user(
+        first_name=FIRST_NAME, last_name=user_last_name(UPLOAD_USER_INDEX))
+    transactions_manager = TransactionsManager(db_session=db_session)
+
+    def clear():
+        db_session.query(BankTransaction).filter(BankTransaction.user_id == user.id).delete()
+        db_session.commit()
+
+    res = measure(lambda: transactions_manager.parse_file(filename="statement.csv", filetype="text/csv",
+                                                          filesize=len(content), content=content,
+                                                          user_id=user.id),
+                  repeat, setup=clear)
+    res["rows"] = len(transactions)
+    clear()
+    return res
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PARENT_DIR,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Time the manager entry points on synthetic data")
+    parser.add_argument("--scales", type=parse_scale, nargs="+",
+                        default=[parse_scale("small:1:20"), parse_scale("medium:3:40")],
+                        help="name:years:transactions_per_month")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", type=str, nargs="*", default=None,
+                        help="Only run the entry points containing one of these strings")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic users")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the results as json to this file")
+    args = parser.parse_args()
+
+    init_db()
+    # Every call has to do the full work
+    result_cache.enabled = False
+    results = []
+    try:
+        for index, scale in enumerate(args.scales):
+            t0 = time.perf_counter()
+            user = seed_user(db_session, index, years=scale["years"],
+                             transactions_per_month=scale["transactions_per_month"], seed=args.seed)
+            print(f"[{scale['name']}] seeded in {time.perf_counter() - t0:.1f}s")
+            benchmarks = entry_points(user, scale["years"])
+            benchmarks["transactions.parse_file"] = None
+            for name, func in benchmarks.items():
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                if func is None:
+                    res = benchmark_parse_file(scale, args.repeat, args.seed)
+                else:
+                    res = measure(func, args.repeat)
+                res.update({"scale": scale["name"], "years": scale["years"],
+                            "transactions_per_month": scale["transactions_per_month"], "entry_point": name})
+                results.append(res)
+                print(f"[{scale['name']}] {name}: median {res['median'] * 1000:.1f} ms")
+    finally:
+        if not args.keep:
+            delete_users(db_session, len(args.scales))
+            UserManager(db_session=db_session).delete_user_by_email(
+                f"{FIRST_NAME}.{user_last_name(UPLOAD_USER_INDEX)}@gmail.com")
+
+    res = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=4)
+    else:
+        print(json.dumps(res, indent=4))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Payload build benchmark for the list endpoints.
+
+Compares for ``--rows`` synthetic bank transactions
+  - models: orm objects -> model_validate().model_dump() -> response_model validation -> json
+  - rows: column tuples -> dump_rows (orjson), which is what the endpoints do now
+and for a chart payload of ``--months`` months
+  - stdlib: json.dumps of the dict
+  - pydantic: validation against the response model and dump_json (FastAPI's path for typed routes)
+  - orjson: ORJSONResponse.render
+
+Usage:
+    python3 benchmarks/serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from typing import List
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(PARENT_DIR)
+
+# fmt: off
+from pydantic import TypeAdapter  # noqa: E402
+from home_api.db.tables import BankTransaction  # noqa: E402
+from home_api.pydantic_models.chart import OverviewChartModel  # noqa: E402
+from home_api.pydantic_models.transaction import BankTransactionModel  # noqa: E402
+from home_api.responses import ORJSONResponse, dump_rows  # noqa: E402
+# fmt: on
+
+COLUMNS = list(BankTransactionModel.model_fields)
+
+
+def make_rows(count):
+    start = datetime.date(2020, 1, 1)
+    rows = []
+    for i in range(count):
+        booking_date = start + datetime.timedelta(days=i % 1500)
+        rows.append((uuid.UUID(int=i), booking_date, booking_date, round((i % 200) - 150.25, 2),
+                     f"Transaction number {i}", "EUR", "Groceries", "Supermarket", "rewe"))
+    return rows
+
+
+def make_chart(months):
+    return {
+        "x_labels": [f"Jan {2000 + i}" for i in range(months)],
+        "cumulative_savings": [float(i) * 1.5 for i in range(months)],
+        "cumulative_expenses": [float(i) * 2.5 for i in range(months)],
+        "cumulative_income": [float(i) * 4.0 for i in range(months)],
+        "start_month": 1,
+        "start_year": 2000,
+        "end_month": 12,
+        "end_year": 2000 + months // 12,
+    }
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Measure payload build time")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--months", type=int, default=240)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the results as json to this file")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    objects = [BankTransaction(**dict(zip(COLUMNS, row))) for row in rows]
+    list_adapter = TypeAdapter(List[BankTransactionModel])
+
+    def models():
+        payload = [BankTransactionModel.model_validate(obj).model_dump() for obj in objects]
+        return list_adapter.dump_json(list_adapter.validate_python(payload))
+
+    chart = make_chart(args.months)
+    chart_adapter = TypeAdapter(OverviewChartModel)
+    orjson_response = ORJSONResponse(content=None)
+
+    res = {
+        "rows": args.rows,
+        "months": args.months,
+        "list": {
+            "models": measure(models, args.repeat),
+            "rows": measure(lambda: dump_rows(rows, COLUMNS), args.repeat),
+        },
+        "chart": {
+            "stdlib": measure(lambda: json.dumps(chart).encode("utf-8"), args.repeat),
+            "pydantic": measure(lambda: chart_adapter.dump_json(chart_adapter.validate_python(chart)),
+                                args.repeat),
+            "orjson": measure(lambda: orjson_response.render(chart), args.repeat),
+        },
+    }
+    print(json.dumps(res, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=4)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark for the API.
+
+Every sample runs in a fresh interpreter and reports
+  - the time needed to import ``home_api.app``
+  - the time from the start of the lifespan until the first request is answered
+  - whether pandas/numpy were pulled in by the import
+
+Usage:
+    python3 benchmarks/startup.py --runs 5 --max-import-time 1.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SAMPLE_CODE = """
+import json
+import sys
+import time
+
+t0 = time.perf_counter()
+from home_api.app import app
+t1 = time.perf_counter()
+heavy_modules = [name for name in ("pandas", "numpy") if name in sys.modules]
+
+from fastapi.testclient import TestClient
+
+t2 = time.perf_counter()
+with TestClient(app) as client:
+    response = client.get("/")
+    t3 = time.perf_counter()
+print(json.dumps({
+    "import_time": t1 - t0,
+    "first_request_time": t3 - t2,
+    "status_code": response.status_code,
+    "heavy_modules": heavy_modules,
+}))
+"""
+
+
+def run_sample():
+    out = subprocess.run([sys.executable, "-c", SAMPLE_CODE],
+                         cwd=PARENT_DIR,
+                         capture_output=True,
+                         text=True,
+                         check=True)
+    # The last line is the json result, everything before is log output
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples, key):
+    values = [sample[key] for sample in samples]
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Measure API cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-time", type=float, default=None,
+                        help="Fail if the median import time (s) exceeds this value")
+    parser.add_argument("--max-first-request-time", type=float, default=None,
+                        help="Fail if the median time to first request (s) exceeds this value")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the results as json to this file")
+    args = parser.parse_args()
+
+    samples = [run_sample() for _ in range(args.runs)]
+    res = {
+        "runs": args.runs,
+        "import_time": summarize(samples, "import_time"),
+        "first_request_time": summarize(samples, "first_request_time"),
+        "heavy_modules": sorted({name for sample in samples for name in sample["heavy_modules"]}),
+    }
+    print(json.dumps(res, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=4)
+
+    failed = False
+    if args.max_import_time is not None and res["import_time"]["median"] > args.max_import_time:
+        print(f"Import time regression: {res['import_time']['median']:.3f}s > {args.max_import_time}s")
+        failed = True
+    if (args.max_first_request_time is not None
+            and res["first_request_time"]["median"] > args.max_first_request_time):
+        print(f"Time to first request regression: "
+              f"{res['first_request_time']['median']:.3f}s > {args.max_first_request_time}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
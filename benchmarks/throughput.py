@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of the read endpoints for different numbers of worker processes.
+
+For every worker count the API is started with ``API_WORKERS=<n>`` through
+``home_dashboard_api.py``, a seeded benchmark user logs in and ``--concurrency``
+threads request the read endpoints for ``--duration`` seconds.
+The endpoints are not result cached, so every worker count does the same work per request
+(with several workers the in-memory result cache is disabled anyway, see CACHE_URL).
+
+Requires the database environment variables (DB_USER, ...) and JWT_SECRET_KEY.
+
+Usage:
+    python3 benchmarks/throughput.py --workers 1 2 4 --duration 10 --concurrency 16
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+
+import requests
+
+PARENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(PARENT_DIR)
+
+# fmt: off
+from home_api.db.utils import generate_password  # noqa: E402
+from home_api.managers.expense_manager import ExpenseManager  # noqa: E402
+from home_api.managers.user_manager import UserManager  # noqa: E402
+from home_api.runtime import db_session, init_db  # noqa: E402
+# fmt: on
+
+FIRST_NAME = "Throughput"
+LAST_NAME = "Benchmark"
+
+ENDPOINTS = [
+    "/api/expenses/account_entries/{session_id}",
+    "/api/expenses/month_expenses_and_savings/{session_id}?month={month}&year={year}",
+    "/api/transactions/transactions_page/{session_id}?limit=50",
+]
+
+
+def seed_user(entries):
+    init_db()
+    user_manager = UserManager(db_session=db_session)
+    expense_manager = ExpenseManager(db_session=db_session)
+    user = user_manager.create_verified_dummy_user(first_name=FIRST_NAME, last_name=LAST_NAME)
+    today = datetime.date.today().replace(day=1)
+    existing = len(expense_manager.get_account_entries(user_id=user.id))
+    for i in range(existing, entries):
+        amount = 2500.0 if i % 10 == 0 else -float(10 + i % 90)
+        expense_manager.add_account_entry(user_id=user.id,
+                                          entry_id=str(uuid.uuid4()),
+                                          start_date=today.replace(year=today.year - 1 - i % 3),
+                                          end_date=today.replace(year=today.year + 1),
+                                          amount=amount,
+                                          name=f"Entry {i}",
+                                          tag="#Income" if amount > 0 else f"#Tag{i % 8}")
+    return user
+
+
+def start_server(workers, port):
+    env = dict(os.environ, API_WORKERS=str(workers), ENDPOINT_PORT=str(port),
+               ENDPOINT="127.0.0.1", CACHE_URL="")
+    process = subprocess.Popen([sys.executable, "home_dashboard_api.py"], cwd=PARENT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=1).status_code == 200:
+                return process, base_url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"The API with {workers} workers didn't start")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def login(base_url, user):
+    http = requests.Session()
+    response = http.post(base_url + "/api/user/authenticate",
+                         data={"username": user.username, "password": generate_password(fixed=True)})
+    response.raise_for_status()
+    # The token is only returned as cookie, whose fractional Max-Age the cookie jar rejects
+    token = SimpleCookie(response.headers["set-cookie"])["access_token"].value
+    http.headers["cookie"] = f"access_token=\"{token}\""
+    return http, response.json()["session_id"]
+
+
+def load(base_url, user, duration, concurrency):
+    today = datetime.date.today()
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    stop = threading.Event()
+
+    def worker(index):
+        http, session_id = login(base_url, user)
+        urls = [base_url + endpoint.format(session_id=session_id, month=today.month, year=today.year)
+                for endpoint in ENDPOINTS]
+        i = 0
+        while not stop.is_set():
+            response = http.get(urls[i % len(urls)])
+            if response.status_code != 200:
+                errors[index] += 1
+            counts[index] += 1
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # Logins are not part of the measurement
+    time.sleep(1)
+    start_count = sum(counts)
+    t0 = time.perf_counter()
+    time.sleep(duration)
+    requests_done = sum(counts) - start_count
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "requests": requests_done,
+        "errors": sum(errors),
+        "requests_per_second": requests_done / elapsed,
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Measure read throughput per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--entries", type=int, default=200,
+                        help="Number of account entries of the benchmark user")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the results as json to this file")
+    args = parser.parse_args()
+
+    user = seed_user(args.entries)
+    results = []
+    for workers in args.workers:
+        process, base_url = start_server(workers, args.port)
+        try:
+            res = load(base_url, user, args.duration, args.concurrency)
+        finally:
+            stop_server(process)
+        res["workers"] = workers
+        results.append(res)
+        print(f"workers={workers}: {res['requests_per_second']:.1f} req/s, {res['errors']} errors")
+
+    baseline = results[0]["requests_per_second"]
+    for res in results:
+        res["scaling"] = res["requests_per_second"] / baseline if baseline else None
+    res = {
+        "cpu_count": os.cpu_count(),
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "endpoints": ENDPOINTS,
+        "results": results,
+    }
+    print(json.dumps(res, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=4)
+
+
+if __name__ == "__main__":
+    run()
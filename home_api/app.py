@@ -2,34 +2,65 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .logger import init_logger, logger
+from .logger import init_logger, logger, stop_logger
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette import status
 from starlette.requests import Request
 import datetime
+import os
 from .entrypoint import entry_point
+from .compression import CompressionMiddleware
+from .server_timing import ServerTimingMiddleware
+from .profiler import ProfilerMiddleware
+from .query_budget import QueryBudgetMiddleware
+from .slow_queries import configure_slow_query_log, stop_slow_query_log
+from .metrics import CONTENT_TYPE, MetricsMiddleware, collect_pool_stats, install_db_hooks, metrics
+from .runtime import init_worker, session
+from .db.engines import engine_registry
+from .managers.cache import configure_cache, result_cache
+from .managers.single_flight import single_flight_group
+from .managers.event_bus import configure_event_bus, event_bus
+from .managers.invalidation import configure_invalidation, invalidation_bus
 from .routers.user import router as user_router
 from .routers.expense import router as expense_router
 from .routers.events import router as events_router
 from .routers.energy import router as energy_router
 from .routers.transactions import router as transactions_router
+from .routers.dashboard import router as dashboard_router
+from .routers.profiles import router as profiles_router, profile_store
 
 
 @asynccontextmanager
 async def lifespan(app_in: FastAPI):
     # on_startup
-    init_logger()
-    missing = []
-    if entry_point.check_all(missing_res=missing):
+    init_logger(payload_sample_rate=entry_point.settings.log_payload_sample_rate)
+    missing = entry_point.settings.missing()
+    if not missing:
         logger.info("All environment variables are set.")
     else:
         logger.error("Some environment variables are not set.")
         logger.error(f"Missing: {missing}")
+    if init_worker():
+        logger.info(f"Database schema created/verified by worker {os.getpid()}.")
+    configure_cache(entry_point.settings)
+    configure_invalidation(entry_point.settings, session.engine)
+    configure_event_bus(entry_point.settings)
+    configure_slow_query_log(entry_point.settings)
 
     yield
     # on_shutdown
+    logger.info(f"Database pools: {engine_registry.pool_stats()}")
+    logger.info(f"Result cache: {result_cache.stats()}")
+    logger.info(f"Single flight: {single_flight_group.stats()}")
+    logger.info(f"Event bus: {event_bus.stats()}")
+    logger.info(f"Cache invalidation: {invalidation_bus.stats()}")
+    invalidation_bus.stop()
+    event_bus.close()
+    stop_slow_query_log()
+    engine_registry.dispose_all()
     logger.info(f"API stopped at {datetime.datetime.now()}")
+    stop_logger()
 
 
 app = FastAPI(title="Home Dashboard",
@@ -46,12 +77,23 @@ app = FastAPI(title="Home Dashboard",
               lifespan=lifespan,
               )
 
+install_db_hooks()
+metrics.add_collector(collect_pool_stats(engine_registry))
+
 origins = [
     "https://hussam-turjman.de",
-    f"http://{entry_point.host}:{entry_point.port}",
+    f"http://{entry_point.settings.host}:{entry_point.settings.port}",
     "http://localhost:3000",
     "http://localhost",
 ]
+if entry_point.settings.server_timing:
+    # Innermost, the header is added before the response is compressed
+    app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=entry_point.settings.compression_min_size,
+    cache=result_cache,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -59,6 +101,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if entry_point.settings.profiler_token:
+    app.add_middleware(ProfilerMiddleware, token=entry_point.settings.profiler_token, store=profile_store)
+if entry_point.settings.query_budget != "off":
+    app.add_middleware(QueryBudgetMiddleware, strict=entry_point.settings.query_budget == "strict")
+# Outermost, so the time spent in the other middlewares is measured too
+app.add_middleware(MetricsMiddleware)
 
 # Include routers here
 app.include_router(router=user_router)
@@ -66,6 +114,8 @@ app.include_router(router=expense_router)
 app.include_router(router=events_router)
 app.include_router(router=energy_router)
 app.include_router(router=transactions_router)
+app.include_router(router=dashboard_router)
+app.include_router(router=profiles_router)
 
 # Order matters
 
@@ -86,4 +136,12 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Metrics of the worker process serving the request, in the Prometheus text format.
+    """
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
 __all__ = ["app"]
@@ -0,0 +1,164 @@
+import gzip
+import typing
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .managers.cache import ResultCache
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def available_encodings() -> typing.Tuple[str, ...]:
+    # Order of preference if the client accepts several with the same quality
+    if brotli is not None:
+        return "br", "gzip"
+    return ("gzip",)
+
+
+def select_encoding(accept_encoding: str, encodings: typing.Sequence[str]) -> str | None:
+    """
+    Picks the encoding with the highest quality value from an ``Accept-Encoding`` header.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        name = parts[0].lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output deterministic for equal bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware(object):
+    """
+    Compresses complete responses of at least ``minimum_size`` bytes with the encoding negotiated
+    from ``Accept-Encoding``. Streamed responses (more than one body message, e.g. SSE or NDJSON)
+    are passed through untouched.
+
+    Responses with an ETag have a body determined by the ETag (user, data version and request),
+    so the compressed bytes are kept in the result cache next to the cached manager results.
+    A repeated request with the same ETag is served without compressing again.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 5, cache: ResultCache | None = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache
+        self.encodings = available_encodings()
+        self.compressed = 0
+        self.cache_hits = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        streaming = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                # Wait for the body to decide about the headers
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            if streaming:
+                await send(message)
+                return
+
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if more_body:
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if not self._should_compress(headers, body):
+                await send(start_message)
+                await send(message)
+                return
+
+            body = self._compressed_body(body, encoding, headers.get("etag"))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed representation is not byte identical anymore
+                headers["ETag"] = "W/" + etag
+            start_message["headers"] = headers.raw
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, headers: MutableHeaders, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compressed_body(self, body: bytes, encoding: str, etag: str | None) -> bytes:
+        key = None
+        if self.cache is not None and etag:
+            key = f"compressed:{encoding}:{etag}"
+            found, value = self.cache.backend.get(key)
+            if found:
+                self.cache_hits += 1
+                return value
+        value = compress(body, encoding, gzip_level=self.gzip_level, brotli_quality=self.brotli_quality)
+        self.compressed += 1
+        if key is not None:
+            self.cache.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "encodings": list(self.encodings),
+            "compressed": self.compressed,
+            "cache_hits": self.cache_hits,
+        }
+
+
+__all__ = ["CompressionMiddleware", "select_encoding", "compress", "available_encodings"]
@@ -0,0 +1,136 @@
+import atexit
+import os
+import threading
+from typing import Dict
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.session import Session as SQLSession
+
+
+def make_dsn(db_user, db_user_password, hostname: str, db_name: str, database_url: str | None = None) -> str:
+    if database_url:
+        return database_url
+    return f"postgresql+psycopg2://{db_user}:{db_user_password}@{hostname}/{db_name}"
+
+
+def engine_options(dsn: str) -> dict:
+    """
+    Default ``create_engine`` arguments of the dialect of ``dsn``.
+    """
+    url = sqlalchemy.engine.make_url(dsn)
+    if url.get_backend_name() != "sqlite":
+        return {}
+    # The sessions are used from the threadpool of the endpoints
+    options = {"connect_args": {"check_same_thread": False}}
+    if url.database in (None, "", ":memory:"):
+        # Every connection would open its own empty in-memory database
+        options["poolclass"] = sqlalchemy.pool.StaticPool
+    return options
+
+
+def _is_in_memory(engine) -> bool:
+    # An in-memory sqlite database only lives in its single connection, it can't reconnect
+    return isinstance(engine.pool, sqlalchemy.pool.StaticPool)
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class EngineRegistry(object):
+    """
+    Process wide registry of sqlalchemy engines keyed by DSN.
+    Every caller asking for the same DSN shares one engine and therefore one connection pool.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, sqlalchemy.engine.Engine] = {}
+        self._session_factories: Dict[str, sessionmaker] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Pooled connections inherited from the parent process must not be used by a worker
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+    def reset_after_fork(self):
+        """
+        Drop the pooled connections inherited from the parent without closing them,
+        closing would also close them for the parent. New connections are opened on demand.
+        """
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        for engine in list(self._engines.values()):
+            engine.dispose(close=False)
+
+    def get_engine(self, dsn: str, **engine_kwargs) -> sqlalchemy.engine.Engine:
+        self._check_fork()
+        engine = self._engines.get(dsn)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(dsn)
+            if engine is None:
+                engine = sqlalchemy.create_engine(dsn, **{**engine_options(dsn), **engine_kwargs})
+                if engine.dialect.name == "sqlite":
+                    event.listen(engine, "connect", _enable_sqlite_foreign_keys)
+                self._engines[dsn] = engine
+                self._session_factories[dsn] = sessionmaker(bind=engine)
+        return engine
+
+    def session(self, dsn: str) -> SQLSession:
+        """
+        Returns a new orm session bound to the shared engine of ``dsn``.
+        """
+        self.get_engine(dsn)
+        return self._session_factories[dsn]()
+
+    def dispose(self, dsn: str) -> bool:
+        engine = self._engines.get(dsn)
+        if engine is None or _is_in_memory(engine):
+            return False
+        engine.dispose()
+        return True
+
+    def dispose_all(self):
+        """
+        Close all pooled connections. The engines stay registered and reconnect on demand.
+        """
+        with self._lock:
+            engines = list(self._engines.values())
+        for engine in engines:
+            if not _is_in_memory(engine):
+                engine.dispose()
+
+    def pool_stats(self) -> Dict[str, dict]:
+        stats = {}
+        for dsn, engine in list(self._engines.items()):
+            pool = engine.pool
+            key = engine.url.render_as_string(hide_password=True)
+            stats[key] = {
+                "pool": type(pool).__name__,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            }
+        return stats
+
+    def __len__(self):
+        return len(self._engines)
+
+    def __contains__(self, dsn):
+        return dsn in self._engines
+
+
+engine_registry = EngineRegistry()
+atexit.register(engine_registry.dispose_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engine_registry.reset_after_fork)
+
+__all__ = ["EngineRegistry", "engine_registry", "make_dsn", "engine_options"]
@@ -1,6 +1,26 @@
 import sqlalchemy
-from sqlalchemy.orm import sessionmaker
 from ..entrypoint import entry_point
+from .engines import engine_registry, make_dsn
+
+# (url, metadata) pairs whose schema was already created in this process
+_bootstrapped_schemas = set()
+
+
+def bootstrap_schema(engine, d_Base, force=False) -> bool:
+    """
+    Create the tables of ``d_Base`` once per process and database.
+    Returns ``True`` if the schema was created/verified by this call.
+    """
+    key = (str(engine.url), id(d_Base.metadata))
+    if key in _bootstrapped_schemas and not force:
+        return False
+    d_Base.metadata.create_all(engine)
+    # create_all skips the tables which exist already, their indexes added later are created here
+    for table in d_Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    _bootstrapped_schemas.add(key)
+    return True
 
 
 class Session(object):
@@ -9,7 +29,7 @@ class Session(object):
 
     def __init__(self, db_user, db_user_password,
                  db_name: str, hostname: str,
-                 d_Base=None, auto_commit=True):
+                 d_Base=None, auto_commit=True, database_url: str | None = None):
         self.db_name = db_name
         self.hostname = hostname
         self.db_user = db_user
@@ -18,6 +38,12 @@ class Session(object):
         self.engine = None
         self.d_Base = d_Base
         self.auto_commit = auto_commit
+        self.database_url = database_url
+
+    @property
+    def dsn(self):
+        return make_dsn(db_user=self.db_user, db_user_password=self.db_user_password,
+                        hostname=self.hostname, db_name=self.db_name, database_url=self.database_url)
 
     @property
     def is_connected(self):
@@ -33,17 +59,19 @@ class Session(object):
             if self.auto_commit:
                 self.instance.commit()
             self.instance.close()
-            self.engine.dispose()
+            # The engine is shared through the registry and stays alive
             self.instance = None
             self.engine = None
         return self
 
     def drop_all(self):
         self.d_Base.metadata.drop_all(self.engine)
+        _bootstrapped_schemas.discard(
+            (str(self.engine.url), id(self.d_Base.metadata)))
         return self
 
     def create_all(self):
-        self.d_Base.metadata.create_all(self.engine)
+        bootstrap_schema(self.engine, self.d_Base, force=True)
         return self
 
     def drop_table(self, table):
@@ -56,23 +84,25 @@ class Session(object):
 
     @classmethod
     def create(cls, d_Base=None, auto_commit=True, **kwargs):
-        db_name = kwargs.get("db_name", entry_point.db_name)
-        hostname = kwargs.get("hostname", entry_point.db_hostname)
-        db_user = kwargs.get("db_user", entry_point.db_user)
+        settings = entry_point.settings
+        db_name = kwargs.get("db_name", settings.db_name)
+        hostname = kwargs.get("hostname", settings.db_hostname)
+        db_user = kwargs.get("db_user", settings.db_user)
         db_user_password = kwargs.get(
-            "db_user_password", entry_point.db_user_password)
+            "db_user_password", settings.db_user_password)
+        database_url = kwargs.get("database_url", settings.database_url)
         return cls(db_name=db_name, hostname=hostname,
                    db_user=db_user,
                    db_user_password=db_user_password,
                    d_Base=d_Base,
-                   auto_commit=auto_commit).init()
+                   auto_commit=auto_commit,
+                   database_url=database_url).init()
 
     def get_session(self):
-        self.engine = sqlalchemy.create_engine(
-            f"postgresql+psycopg2://{self.db_user}:{self.db_user_password}@{self.hostname}/{self.db_name}")
+        self.engine = engine_registry.get_engine(self.dsn)
         if self.d_Base:
-            self.d_Base.metadata.create_all(self.engine)
-        return sessionmaker(bind=self.engine)()
+            bootstrap_schema(self.engine, self.d_Base)
+        return engine_registry.session(self.dsn)
 
     def __enter__(self):
         self.init()
@@ -88,4 +118,4 @@ class Session(object):
         self.cleanup()
 
 
-__all__ = ["Session"]
+__all__ = ["Session", "bootstrap_schema"]
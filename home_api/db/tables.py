@@ -3,8 +3,8 @@ import uuid
 from typing import Callable
 
 from sqlalchemy import Boolean
-from sqlalchemy import Column, Float, Date, func, String, Integer, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Float, Date, func, String, Integer, DateTime, ForeignKey, Index
+from sqlalchemy import TypeDecorator, Uuid
 from sqlalchemy.orm import relationship
 
 from .checks import is_valid_email, is_strong_password, contains_whitespace, contains_numbers, \
@@ -15,8 +15,23 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 
+class UUIDType(TypeDecorator):
+    """
+    Native uuid on postgres, CHAR(32) on sqlite. Accepts the ids as strings too (e.g. from the path).
+    """
+    impl = Uuid
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return uuid.UUID(value)
+        return value
+
+
 class User(Base):
     __tablename__ = "user"
+    # sqlite would reuse the id of a deleted last user, the cached results are keyed by the user id
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True, name="id",
                 unique=True, autoincrement=True)
     username = Column(String, name="username", nullable=False, unique=True)
@@ -106,7 +121,7 @@ class User(Base):
 
 class UserSession(Base):
     __tablename__ = "user_session"
-    id = Column(UUID(as_uuid=True), primary_key=True,
+    id = Column(UUIDType(), primary_key=True,
                 name="id", unique=True, default=uuid.uuid4)
 
     token = Column(String, name="token", nullable=False)
@@ -149,7 +164,7 @@ class UserSession(Base):
 
 # class UserSettings(Base):
 #     __tablename__ = "user_settings"
-#     id = Column(UUID(as_uuid=True), primary_key=True,
+#     id = Column(UUIDType(), primary_key=True,
 #                 name="id", unique=True, default=uuid.uuid4)
 #
 #     time_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -170,7 +185,7 @@ class UserSession(Base):
 
 class AccountEntry(Base):
     __tablename__ = "account_entry"
-    id = Column(UUID(as_uuid=True), primary_key=True,
+    id = Column(UUIDType(), primary_key=True,
                 name="id", unique=True, default=uuid.uuid4)
 
     time_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -231,7 +246,11 @@ class AccountEntry(Base):
 
 class BankTransaction(Base):
     __tablename__ = "bank_transaction"
-    id = Column(UUID(as_uuid=True), primary_key=True,
+    # Keyset pagination of a user's transactions on (booking_date, id)
+    __table_args__ = (
+        Index("ix_bank_transaction_user_booking_date", "user_id", "booking_date", "id"),
+    )
+    id = Column(UUIDType(), primary_key=True,
                 name="id", unique=True, default=uuid.uuid4)
 
     time_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -292,7 +311,7 @@ class BankTransaction(Base):
 
 class EnergyCounter(Base):
     __tablename__ = "energy_counter"
-    id = Column(UUID(as_uuid=True), primary_key=True,
+    id = Column(UUIDType(), primary_key=True,
                 name="id", unique=True, default=uuid.uuid4)
 
     time_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -314,6 +333,8 @@ class EnergyCounter(Base):
                      name="user_id", nullable=False)
     counter_readings = relationship(
         "EnergyCounterReading", cascade="all, delete-orphan")
+    consumption_months = relationship(
+        "EnergyCounterMonth", cascade="all, delete-orphan")
 
     def __repr__(self):
         return (f"<EnergyCounter(id={self.id}, "
@@ -362,7 +383,7 @@ class EnergyCounter(Base):
 
 class EnergyCounterReading(Base):
     __tablename__ = "energy_counter_reading"
-    id = Column(UUID(as_uuid=True), primary_key=True,
+    id = Column(UUIDType(), primary_key=True,
                 name="id", unique=True, default=uuid.uuid4)
 
     time_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -373,7 +394,7 @@ class EnergyCounterReading(Base):
     reading = Column(Float, name="reading", nullable=False)
     reading_date = Column(Date, name="reading_date", nullable=False)
 
-    counter_id = Column(UUID(as_uuid=True), ForeignKey(
+    counter_id = Column(UUIDType(), ForeignKey(
         "energy_counter.id"), name="counter_id", nullable=False)
 
     def convert_to_dict(self, counter_id, counter_type):
@@ -408,6 +429,25 @@ class EnergyCounterReading(Base):
         )
 
 
+class EnergyCounterMonth(Base):
+    """
+    Consumption and cost of a counter in a month, derived from its readings (see EnergyManager).
+    Only the months with a reading are stored, the other months cost nothing.
+    """
+    __tablename__ = "energy_counter_month"
+    counter_id = Column(UUIDType(), ForeignKey("energy_counter.id"), name="counter_id", primary_key=True)
+    # first day of the month
+    month = Column(Date, name="month", primary_key=True)
+    consumption = Column(Float, name="consumption", nullable=False)
+    cost = Column(Float, name="cost", nullable=False)
+
+    def __repr__(self):
+        return (f"<EnergyCounterMonth(counter_id={self.counter_id}, "
+                f"month={self.month}, "
+                f"consumption={self.consumption}, "
+                f"cost={self.cost}>")
+
+
 __all__ = ["User", "UserSession", "AccountEntry",
-           "EnergyCounter", "EnergyCounterReading",
+           "EnergyCounter", "EnergyCounterReading", "EnergyCounterMonth",
            "Base", "BankTransaction"]
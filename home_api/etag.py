@@ -0,0 +1,51 @@
+import datetime
+import hashlib
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from .managers.cache import result_cache
+from .pydantic_models.session import UserSessionModel
+from .routers.user import validate_user
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(user_id: int, request: Request) -> str:
+    """
+    Strong ETag from the data version of the user and the request parameters.
+    The current day is part of it because several results depend on "today".
+    """
+    params = sorted(request.query_params.multi_items())
+    raw = (f"{result_cache.epoch}:{user_id}:{result_cache.get_version(user_id)}:"
+           f"{datetime.date.today()}:{request.url.path}:{params}")
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def parse_if_none_match(value: str | None) -> set:
+    if not value:
+        return set()
+    # Weak comparison, compressed responses carry the weak form of the ETag
+    return {tag.strip().removeprefix("W/") for tag in value.split(",") if tag.strip()}
+
+
+async def conditional_get(request: Request, response: Response,
+                          user: Annotated[UserSessionModel, Depends(validate_user)]) -> str | None:
+    """
+    Dependency answering ``If-None-Match`` with 304 before the endpoint
+    (and therefore any manager work or serialization) runs.
+    """
+    if not result_cache.enabled:
+        # Without shared data versions an ETag could outlive a write on another worker
+        return None
+    etag = compute_etag(user_id=user.user_id, request=request)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    candidates = parse_if_none_match(request.headers.get("if-none-match"))
+    if etag in candidates or "*" in candidates:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+    response.headers.update(headers)
+    return etag
+
+
+__all__ = ["compute_etag", "conditional_get"]
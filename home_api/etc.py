@@ -4,5 +4,14 @@ import datetime
 
 PARENT_DIR = os.path.join(pathlib.Path(__file__).parent.resolve(), '..')
 LOGS_DIR = os.path.join(PARENT_DIR, "logs")
+PROFILES_DIR = os.path.join(PARENT_DIR, "profiles")
 NOW = datetime.datetime.now()
 LOG_FILENAME = f"api_{NOW}.log"
+
+
+def worker_filename(filename: str) -> str:
+    """
+    Per process variant of ``filename``, the rotating file handlers are not safe across worker processes.
+    """
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{os.getpid()}{ext}"
@@ -1,17 +1,127 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-from .etc import LOGS_DIR, LOG_FILENAME, NOW
+import queue
+import random
+import reprlib
+from .etc import LOGS_DIR, LOG_FILENAME, NOW, worker_filename
 
 logger = logging.getLogger("uvicorn.error")
 
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
 
-def init_logger():
+# Payloads (chart results, data frames) are cut to a few items per container
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlist = 10
+_payload_repr.maxdict = 10
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 500
+_payload_repr.maxlevel = 4
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.handlers.QueueHandler | None = None
+_payload_sample_rate = 1.0
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One json object per line. Key/value pairs passed with ``extra={"fields": {...}}``
+    are added to the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class Truncated(object):
+    """
+    Formats the payload only when the record is written, cut by ``reprlib``.
+    """
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return _payload_repr.repr(self.payload)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the records unformatted: ``QueueHandler.prepare`` would format the message (and the
+    ``Truncated`` payloads) on the calling thread and move the traceback into the message.
+    The listener thread formats them with the exception kept as its own field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def init_logger(payload_sample_rate: float = 1.0):
+    """
+    Records are put on a queue and written to the rotating log file by a background thread,
+    so logging on the event loop doesn't wait for the disk.
+    """
+    global _listener, _queue_handler, _payload_sample_rate
+    _payload_sample_rate = payload_sample_rate
+    if _listener is not None:
+        return
     if not os.path.exists(LOGS_DIR):
         os.makedirs(LOGS_DIR, exist_ok=True)
-    filepath = os.path.join(LOGS_DIR, LOG_FILENAME)
-    file_handler = logging.FileHandler(filepath)
-    logger.addHandler(file_handler)
+    filepath = os.path.join(LOGS_DIR, worker_filename(LOG_FILENAME))
+    file_handler = logging.handlers.RotatingFileHandler(filepath, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(StructuredFormatter())
+    _queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, file_handler,
+                                               respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(_queue_handler)
     logger.info(f"API started at {NOW}")
 
 
-__all__ = ["init_logger", "logger"]
+def stop_logger():
+    """
+    Writes the queued records and stops the background thread.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logger.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+
+def log_payload(message: str, payload, level: int = logging.DEBUG):
+    """
+    Logs a (large) result. Nothing is formatted unless the level is enabled and the record
+    is sampled (``LOG_PAYLOAD_SAMPLE_RATE``), and then only a truncated representation.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if _payload_sample_rate < 1.0 and random.random() >= _payload_sample_rate:
+        return
+    logger.log(level, "%s: %s", message, Truncated(payload))
+
+
+atexit.register(stop_logger)
+
+__all__ = ["init_logger", "stop_logger", "log_payload", "logger", "StructuredFormatter", "Truncated",
+           "DeferredQueueHandler"]
@@ -0,0 +1,297 @@
+import datetime
+import functools
+import inspect
+import pickle
+import threading
+import typing
+import uuid
+from collections import OrderedDict
+
+from .errors import ManagerErrors
+from ..logger import logger
+
+
+class CacheBackend(object):
+    """
+    Storage for cached manager results and per-user data versions.
+    ``epoch`` changes whenever the versions are reset (e.g. a restart of an in-memory backend).
+    """
+    epoch: str = ""
+
+    def get(self, key: str) -> typing.Tuple[bool, typing.Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: typing.Any):
+        raise NotImplementedError
+
+    def get_version(self, user_id: int, domain: str | None = None) -> int:
+        raise NotImplementedError
+
+    def bump_version(self, user_id: int, domain: str | None = None) -> int:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process cache with bounded LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex[:8]
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, user_id, domain=None):
+        return self._versions.get((user_id, domain), 0)
+
+    def bump_version(self, user_id, domain=None):
+        with self._lock:
+            version = self._versions.get((user_id, domain), 0) + 1
+            self._versions[(user_id, domain)] = version
+        return version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.epoch = uuid.uuid4().hex[:8]
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared by all workers. Entries expire after ``ttl`` seconds and redis
+    is expected to run with an LRU ``maxmemory-policy``.
+    """
+
+    def __init__(self, url: str, ttl: int = 3600, prefix: str = "home_api"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "The redis package is required for a shared cache backend") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        # versions live in redis and survive restarts of the workers
+        self.epoch = "redis"
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}:result:{key}")
+        if value is None:
+            return False, None
+        return True, pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.set(f"{self.prefix}:result:{key}",
+                        pickle.dumps(value), ex=self.ttl)
+
+    def _version_key(self, user_id, domain):
+        if domain is None:
+            return f"{self.prefix}:version:{user_id}"
+        return f"{self.prefix}:version:{user_id}:{domain}"
+
+    def get_version(self, user_id, domain=None):
+        version = self.client.get(self._version_key(user_id, domain))
+        return 0 if version is None else int(version)
+
+    def bump_version(self, user_id, domain=None):
+        return int(self.client.incr(self._version_key(user_id, domain)))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}:*"):
+            self.client.delete(key)
+
+    def stats(self):
+        return {"backend": "redis", "ttl": self.ttl}
+
+
+class ResultCache(object):
+    def __init__(self, backend: CacheBackend | None = None):
+        self.backend = backend or MemoryCacheBackend()
+        # Disabled when the data versions can't be shared between the worker processes
+        self.enabled = True
+        # Called with (user_id, domain) for every local invalidation, e.g. to notify the other workers
+        self.publisher: typing.Callable[[int, str | None], None] | None = None
+
+    def set_backend(self, backend: CacheBackend):
+        self.backend = backend
+
+    @property
+    def epoch(self) -> str:
+        return self.backend.epoch
+
+    def get_version(self, user_id, domain: str | None = None) -> int:
+        """
+        Without a domain the version changes on every write of the user (used by the ETags),
+        with a domain only on writes of that domain.
+        """
+        return self.backend.get_version(user_id, domain)
+
+    def invalidate_user(self, user_id, domain: str | None = None, propagate: bool = True) -> int:
+        if domain is not None:
+            self.backend.bump_version(user_id, domain)
+        version = self.backend.bump_version(user_id)
+        if propagate and self.publisher is not None:
+            try:
+                self.publisher(user_id, domain)
+            except Exception as e:
+                logger.error(f"Propagating the invalidation of user {user_id} ({domain}) failed: {e}")
+        return version
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "enabled": self.enabled}
+
+
+result_cache = ResultCache()
+
+
+def configure_cache(settings):
+    """
+    Select the cache backend from the settings. Called once at startup.
+    """
+    if settings.cache_url:
+        result_cache.set_backend(RedisCacheBackend(url=settings.cache_url))
+        result_cache.enabled = True
+    else:
+        result_cache.set_backend(MemoryCacheBackend(
+            max_entries=settings.cache_max_entries))
+        # A write handled by one worker would not invalidate the results
+        # (and ETags) of the others, unless the invalidations are sent to them
+        result_cache.enabled = settings.workers <= 1 or settings.cache_invalidation != "none"
+        if not result_cache.enabled:
+            logger.warning(f"Result cache disabled, {settings.workers} workers need a shared "
+                           f"cache backend (CACHE_URL) or CACHE_INVALIDATION=postgres")
+    logger.info(f"Result cache: {result_cache.stats()}")
+    return result_cache
+
+
+def bind_call_arguments(signature, args, kwargs):
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop("self", None)
+    return arguments
+
+
+def make_call_key(name: str, arguments: dict, domains: typing.Sequence[str] = ()) -> str:
+    """
+    Key of a manager call for the current data version of the user,
+    or only of the given domains the call reads. The epoch changes when the versions
+    are reset, so results computed before a reset can't become reachable again.
+    """
+    user_id = arguments["user_id"]
+    if domains:
+        version = ",".join(str(result_cache.get_version(user_id, domain)) for domain in domains)
+    else:
+        version = result_cache.get_version(user_id)
+    params = sorted(arguments.items())
+    return f"{name}:{result_cache.epoch}:{user_id}:{version}:{datetime.date.today()}:{params!r}"
+
+
+def is_error_result(res) -> bool:
+    if isinstance(res, ManagerErrors):
+        return True
+    return isinstance(res, dict) and res.get("error") is True
+
+
+def cached_result(domains: typing.Sequence[str] = ()) -> typing.Callable:
+    """
+    Decorator caching the result of a manager method per user.
+    The key consists of the method, the user id, the arguments, the current
+    data version of the user and today's date (results depend on "now").
+    With ``domains`` only writes to these domains (see ``invalidates_cache``)
+    invalidate the result.
+    Cached values are shared between callers and must not be modified.
+    """
+
+    def wrapper(func) -> typing.Callable:
+        signature = inspect.signature(func)
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            if not result_cache.enabled:
+                return func(*args, **kwargs)
+            key = make_call_key(name, bind_call_arguments(signature, args, kwargs), domains)
+            found, value = result_cache.backend.get(key)
+            if found:
+                return value
+            res = func(*args, **kwargs)
+            if not is_error_result(res):
+                result_cache.backend.set(key, res)
+            return res
+
+        return wrapped
+
+    return wrapper
+
+
+def invalidates_cache(domain: str | None = None) -> typing.Callable:
+    """
+    Decorator for write paths. Bumps the data version of the user (and of ``domain``)
+    after the call, which makes the cached results of that user depending on it unreachable.
+    """
+
+    def wrapper(func) -> typing.Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            arguments = bind_call_arguments(signature, args, kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                result_cache.invalidate_user(arguments["user_id"], domain)
+
+        return wrapped
+
+    return wrapper
+
+
+__all__ = ["CacheBackend", "MemoryCacheBackend", "RedisCacheBackend",
+           "ResultCache", "result_cache", "configure_cache",
+           "cached_result", "invalidates_cache", "make_call_key",
+           "bind_call_arguments", "is_error_result"]
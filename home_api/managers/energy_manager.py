@@ -2,14 +2,56 @@ from dateutil.relativedelta import relativedelta
 from sqlalchemy.orm.session import Session as SQLSession
 
 from .errors import ManagerErrors, translate_manager_error
-from ..db.tables import EnergyCounter, EnergyCounterReading, User
+from ..db.tables import EnergyCounter, EnergyCounterMonth, EnergyCounterReading, User
 import datetime
-from ..db.utils import diff_day, create_dates_labels, to_month_year_str, diff_month
-from sqlalchemy import func
-from calendar import monthrange
-import numpy as np
-from ..logger import logger
+from typing import Sequence
+from ..db.utils import create_dates_labels, to_month_year_str, diff_month
+from sqlalchemy import and_, exists, func, insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from ..logger import logger, log_payload
 from .return_wrapper import return_wrapper
+from .cache import cached_result, invalidates_cache
+from .single_flight import single_flight
+from .event_bus import publishes_event, ENERGY_READING_ADDED
+
+
+def _month_ordinal(date: datetime.date) -> int:
+    return date.year * 12 + date.month - 1
+
+
+def _month_date(month_ordinal: int) -> datetime.date:
+    return datetime.date(month_ordinal // 12, month_ordinal % 12 + 1, 1)
+
+
+def _month_consumption(reading_months, readings):
+    """
+    The month ordinals with a reading (besides the first one) and their consumption, the difference of
+    the last reading of the month to the reading before. The readings are sorted by date.
+    """
+    import numpy as np
+
+    if len(readings) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    # Every reading after the first closes the consumption since the previous one
+    consumption_months = np.asarray(reading_months[1:], dtype=np.int64)
+    consumption = np.diff(np.asarray(readings, dtype=np.float64))
+    last_of_month = np.append(consumption_months[1:] != consumption_months[:-1], True)
+    return consumption_months[last_of_month], consumption[last_of_month]
+
+
+def _monthly_costs(reading_months, readings, base_price: float, price: float, first_month: int, months: int):
+    """
+    The costs ``base_price + price * consumption`` of ``months`` months starting with the month ordinal
+    ``first_month``, months without a reading cost 0.
+    """
+    import numpy as np
+
+    costs = np.zeros(months)
+    consumption_months, consumption = _month_consumption(reading_months, readings)
+    consumption_months = consumption_months - first_month
+    keep = (consumption_months >= 0) & (consumption_months < months)
+    costs[consumption_months[keep]] = base_price + price * consumption[keep]
+    return np.round(costs, 2)
 
 
 class EnergyManager(object):
@@ -35,8 +77,13 @@ class EnergyManager(object):
 
         counter = (self.db_session.query(EnergyCounter).
                    filter(EnergyCounter.user_id == user_id).
-                   filter(EnergyCounter.id == counter_id_db)).first()
+                   filter(EnergyCounter.id == counter_id_db).
+                   populate_existing().
+                   with_for_update()).first()
         if counter:
+            # The stored consumption months depend on the prices and the first reading
+            rebuild = ((counter.base_price, counter.price, counter.first_reading, counter.start_date) !=
+                       (base_price, price, first_reading, start_date))
             counter.counter_id = counter_id
             counter.counter_type = counter_type
             counter.energy_unit = energy_unit
@@ -46,6 +93,9 @@ class EnergyManager(object):
             counter.start_date = start_date
             counter.end_date = end_date
             counter.first_reading = first_reading
+            if rebuild:
+                self.db_session.flush()
+                self._rebuild_consumption_months([counter])
         else:
             counter = EnergyCounter(user_id=user_id,
                                     counter_id=counter_id,
@@ -62,19 +112,21 @@ class EnergyManager(object):
         return counter.to_dict()
 
     @return_wrapper()
+    @invalidates_cache("energy")
     def add_energy_counter(self, user_id, counter_id_db, counter_id, counter_type, energy_unit,
                            frequency, base_price, price, start_date, end_date, first_reading):
-        res = self._add_energy_counter(user_id=user_id,
-                                       counter_id=counter_id,
-                                       counter_id_db=counter_id_db,
-                                       counter_type=counter_type,
-                                       energy_unit=energy_unit,
-                                       frequency=frequency,
-                                       base_price=base_price,
-                                       price=price,
-                                       start_date=start_date,
-                                       end_date=end_date,
-                                       first_reading=first_reading)
+        res = self._write_consumption(self._add_energy_counter,
+                                      user_id=user_id,
+                                      counter_id=counter_id,
+                                      counter_id_db=counter_id_db,
+                                      counter_type=counter_type,
+                                      energy_unit=energy_unit,
+                                      frequency=frequency,
+                                      base_price=base_price,
+                                      price=price,
+                                      start_date=start_date,
+                                      end_date=end_date,
+                                      first_reading=first_reading)
         return res
 
     def _delete_energy_counter(self, user_id, counter_id_db):
@@ -88,6 +140,7 @@ class EnergyManager(object):
         return counter.to_dict()
 
     @return_wrapper()
+    @invalidates_cache("energy")
     def delete_energy_counter(self, user_id, counter_id_db):
         res = self._delete_energy_counter(user_id=user_id,
                                           counter_id_db=counter_id_db)
@@ -117,15 +170,42 @@ class EnergyManager(object):
         readings = tmp
         return readings
 
+    def get_energy_counter_rows(self, user_id, columns: Sequence[str]):
+        rows = (self.db_session.query(*[getattr(EnergyCounter, column) for column in columns]).
+                filter(EnergyCounter.user_id == user_id).
+                all())
+        return rows
+
+    def get_energy_counter_reading_rows(self, user_id, columns: Sequence[str]):
+        # counter_id and counter_type come from the counter, like in get_energy_counter_readings
+        sources = {
+            "counter_id": EnergyCounter.counter_id,
+            "counter_type": EnergyCounter.counter_type,
+        }
+        rows = (self.db_session.query(*[sources.get(column) or getattr(EnergyCounterReading, column)
+                                        for column in columns])
+                .select_from(EnergyCounterReading)
+                .join(EnergyCounter, EnergyCounterReading.counter_id == EnergyCounter.id)
+                .filter(EnergyCounter.user_id == user_id)
+                .order_by(EnergyCounterReading.reading_date)
+                .all())
+        return rows
+
     @return_wrapper()
+    @publishes_event(ENERGY_READING_ADDED, payload=lambda arguments, res: {
+        "reading_id": str(res["id"]),
+        "counter_id": arguments["counter_id"],
+    })
+    @invalidates_cache("energy")
     def add_energy_counter_reading(self, user_id, entry_id: str, counter_id, counter_type,
                                    reading, reading_date):
-        res = self._add_energy_counter_reading(user_id=user_id,
-                                               entry_id=entry_id,
-                                               counter_id=counter_id,
-                                               counter_type=counter_type,
-                                               reading=reading,
-                                               reading_date=reading_date)
+        res = self._write_consumption(self._add_energy_counter_reading,
+                                      user_id=user_id,
+                                      entry_id=entry_id,
+                                      counter_id=counter_id,
+                                      counter_type=counter_type,
+                                      reading=reading,
+                                      reading_date=reading_date)
         return res
 
     def _add_energy_counter_reading(self, user_id: int, entry_id: str, counter_id: str,
@@ -140,6 +220,16 @@ class EnergyManager(object):
         if len(counter) > 1:
             return ManagerErrors.MULTIPLE_ENTRIES_FOUND
         counter = counter[0]
+        entry = (self.db_session.query(EnergyCounterReading).
+                 filter(EnergyCounterReading.id == entry_id)
+                 ).first()
+        # The counter the reading is moved from is locked as well
+        self._lock_counters([counter.id] + ([entry.counter_id] if entry else []))
+        if entry:
+            # read again after the lock, a concurrent write may have changed it
+            entry = (self.db_session.query(EnergyCounterReading).
+                     filter(EnergyCounterReading.id == entry_id).
+                     populate_existing()).first()
         if reading_date > counter.end_date:
             return ManagerErrors.ENERGY_COUNTER_INVALID_READING_DATE
         if reading_date < counter.start_date:
@@ -154,8 +244,7 @@ class EnergyManager(object):
         else:
             previous_reading = previous_reading_object.reading
             previous_reading_date = previous_reading_object.reading_date
-        logger.info(
-            f"previous_reading: {previous_reading}, previous_reading_date: {previous_reading_date}")
+        logger.debug("previous_reading: %s, previous_reading_date: %s", previous_reading, previous_reading_date)
 
         if previous_reading_object is not None and str(previous_reading_object.id) != str(entry_id):
             # print(f"entry_id: {entry_id}, previous_reading_object.id: {previous_reading_object.id}")
@@ -164,10 +253,13 @@ class EnergyManager(object):
             if reading < previous_reading:
                 return ManagerErrors.ENERGY_COUNTER_INVALID_READING
 
-        entry = (self.db_session.query(EnergyCounterReading).
-                 filter(EnergyCounterReading.id == entry_id)
-                 ).first()
+        changed_dates = [reading_date]
+        moved_from = None
         if entry:
+            if entry.counter_id == counter.id:
+                changed_dates.append(entry.reading_date)
+            else:
+                moved_from = (entry.counter_id, entry.reading_date)
             entry.reading = reading
             entry.reading_date = reading_date
             entry.counter_id = counter.id
@@ -177,13 +269,21 @@ class EnergyManager(object):
                                          reading=reading,
                                          reading_date=reading_date)
             self.db_session.add(entry)
+        self.db_session.flush()
+        self._update_consumption_months(counter, changed_dates)
+        if moved_from is not None:
+            previous_counter = (self.db_session.query(EnergyCounter).
+                                filter(EnergyCounter.id == moved_from[0]).first())
+            self._update_consumption_months(previous_counter, [moved_from[1]])
         self.db_session.commit()
         return entry.convert_to_dict(counter_id=counter_id, counter_type=counter_type)
 
     @return_wrapper()
+    @invalidates_cache("energy")
     def delete_energy_counter_reading(self, user_id, reading_id):
-        res = self._delete_energy_counter_reading(user_id=user_id,
-                                                  reading_id=reading_id)
+        res = self._write_consumption(self._delete_energy_counter_reading,
+                                      user_id=user_id,
+                                      reading_id=reading_id)
         return res
 
     def _delete_energy_counter_reading(self, user_id, reading_id):
@@ -193,15 +293,17 @@ class EnergyManager(object):
                    filter(EnergyCounterReading.id == reading_id)).first()
         if not reading:
             return ManagerErrors.ENTRY_NOT_FOUND
-        counter = (self.db_session.query(EnergyCounter).
-                   filter(EnergyCounter.id == reading.counter_id).
-                   first())
+        counter, = self._lock_counters([reading.counter_id])
         self.db_session.delete(reading)
+        self.db_session.flush()
+        self._update_consumption_months(counter, [reading.reading_date])
         self.db_session.commit()
         return reading.convert_to_dict(counter_id=counter.counter_id,
                                        counter_type=counter.counter_type)
 
     @return_wrapper()
+    @cached_result(domains=("energy",))
+    @single_flight()
     def get_energy_consumption_overview(self, user_id, start_date,
                                         end_date, include_last_month=True):
         res = self._get_energy_consumption_overview(user_id=user_id,
@@ -210,15 +312,169 @@ class EnergyManager(object):
                                                     include_last_month=include_last_month)
         return res
 
+    def _get_readings_by_counter(self, counters, start_date: datetime.date, end_date: datetime.date) -> dict:
+        """
+        The month ordinals and readings of every counter from ``start_date`` to ``end_date`` (inclusive)
+        sorted by date, preceded by the last reading before ``start_date``, or else the first reading of
+        the counter. All counters are fetched with a single query.
+        """
+        counter_ids = [counter.id for counter in counters]
+        previous = (select(EnergyCounterReading.counter_id, func.max(EnergyCounterReading.reading_date)).
+                    where(EnergyCounterReading.counter_id.in_(counter_ids)).
+                    where(EnergyCounterReading.reading_date < start_date).
+                    group_by(EnergyCounterReading.counter_id))
+        rows = (self.db_session.query(EnergyCounterReading.counter_id,
+                                      EnergyCounterReading.reading_date,
+                                      EnergyCounterReading.reading).
+                filter(EnergyCounterReading.counter_id.in_(counter_ids)).
+                filter(or_(and_(EnergyCounterReading.reading_date >= start_date,
+                                EnergyCounterReading.reading_date <= end_date),
+                           tuple_(EnergyCounterReading.counter_id,
+                                  EnergyCounterReading.reading_date).in_(previous))).
+                order_by(EnergyCounterReading.reading_date).all())
+        readings = {counter.id: ([], []) for counter in counters}
+        for counter_id, reading_date, reading in rows:
+            reading_months, values = readings[counter_id]
+            reading_months.append(_month_ordinal(reading_date))
+            values.append(reading)
+        first_month = _month_ordinal(start_date)
+        for counter in counters:
+            reading_months, values = readings[counter.id]
+            if not reading_months or reading_months[0] >= first_month:
+                reading_months.insert(0, _month_ordinal(counter.start_date))
+                values.insert(0, counter.first_reading)
+        return readings
+
+    def _lock_counters(self, counter_ids):
+        """
+        Locks the counters until the commit (in the order of their ids), so concurrent writes of a
+        counter recompute its stored consumption months one after the other from all its readings.
+        """
+        return (self.db_session.query(EnergyCounter).
+                filter(EnergyCounter.id.in_(counter_ids)).
+                order_by(EnergyCounter.id).
+                populate_existing().
+                with_for_update().all())
+
+    def _write_consumption(self, write, **kwargs):
+        """
+        Runs a write which updates stored consumption months. It is retried once if the months were
+        inserted concurrently (a backfill), and a failed write releases the locks of the counters.
+        """
+        try:
+            res = write(**kwargs)
+        except IntegrityError:
+            self.db_session.rollback()
+            res = write(**kwargs)
+        if isinstance(res, ManagerErrors):
+            self.db_session.rollback()
+        return res
+
+    def _consumption_month_rows(self, counter, reading_months, readings, first_month: int, last_month: int):
+        import numpy as np
+
+        consumption_months, consumption = _month_consumption(reading_months, readings)
+        costs = np.round(counter.base_price + counter.price * consumption, 2)
+        return [{"counter_id": counter.id, "month": _month_date(month), "consumption": month_consumption,
+                 "cost": cost}
+                for month, month_consumption, cost in zip(consumption_months.tolist(), consumption.tolist(),
+                                                          costs.tolist())
+                if first_month <= month <= last_month]
+
+    def _rebuild_consumption_months(self, counters):
+        """
+        Recomputes all stored consumption months of ``counters`` from their readings.
+        """
+        (self.db_session.query(EnergyCounterMonth).
+         filter(EnergyCounterMonth.counter_id.in_([counter.id for counter in counters])).
+         delete())
+        readings = self._get_readings_by_counter(counters, start_date=datetime.date.min,
+                                                 end_date=datetime.date.max)
+        rows = []
+        for counter in counters:
+            reading_months, values = readings[counter.id]
+            rows += self._consumption_month_rows(counter, reading_months, values, first_month=0,
+                                                 last_month=_month_ordinal(datetime.date.max))
+        if rows:
+            self.db_session.execute(insert(EnergyCounterMonth), rows)
+
+    def _update_consumption_months(self, counter, changed_dates):
+        """
+        Recomputes the stored consumption months of ``counter`` after readings on ``changed_dates`` were
+        added, changed or deleted: only their months up to the month of the next reading are affected.
+        The caller holds the lock of the counter (``_lock_counters``).
+        """
+        built = (self.db_session.query(EnergyCounterMonth.month).
+                 filter(EnergyCounterMonth.counter_id == counter.id).first())
+        if built is None:
+            # Readings from before the table existed
+            self._rebuild_consumption_months([counter])
+            return
+        first_month = _month_ordinal(min(changed_dates))
+        next_reading_date = (self.db_session.query(func.min(EnergyCounterReading.reading_date)).
+                             filter(EnergyCounterReading.counter_id == counter.id).
+                             filter(EnergyCounterReading.reading_date > max(changed_dates)).scalar())
+        last_month = _month_ordinal(next_reading_date or max(changed_dates))
+        (self.db_session.query(EnergyCounterMonth).
+         filter(EnergyCounterMonth.counter_id == counter.id).
+         filter(EnergyCounterMonth.month >= _month_date(first_month)).
+         filter(EnergyCounterMonth.month <= _month_date(last_month)).
+         delete())
+        readings = self._get_readings_by_counter([counter], start_date=_month_date(first_month),
+                                                 end_date=_month_date(last_month + 1) - datetime.timedelta(days=1))
+        reading_months, values = readings[counter.id]
+        rows = self._consumption_month_rows(counter, reading_months, values, first_month=first_month,
+                                            last_month=last_month)
+        if rows:
+            self.db_session.execute(insert(EnergyCounterMonth), rows)
+
+    def _get_counters_consumption(self, counters, start_date: datetime.date, end_date: datetime.date,
+                                  include_last_month=True):
+        """
+        The monthly consumption costs of every counter, computed from one fetch of the readings.
+        The cost of a month is ``base_price + price * (reading - previous reading)`` of the last
+        reading in that month.
+        """
+        for counter in counters:
+            if counter.frequency not in ["daily", "monthly", "yearly"]:
+                return ManagerErrors.ENERGY_COUNTER_INVALID_FREQUENCY
+            if counter.frequency != "monthly":
+                return ManagerErrors.FEATURE_NOT_IMPLEMENTED
+
+        readings = self._get_readings_by_counter(counters, start_date=start_date, end_date=end_date)
+        dates = create_dates_labels(
+            start_date=start_date,
+            end_date=end_date,
+            include_last_month=include_last_month,
+            to_dates=False
+        )
+        first_month = _month_ordinal(start_date)
+        counters_consumption = []
+        for counter in counters:
+            reading_months, values = readings[counter.id]
+            costs = _monthly_costs(reading_months, values, base_price=counter.base_price, price=counter.price,
+                                   first_month=first_month, months=len(dates))
+            counters_consumption.append({
+                "label": f"{counter.counter_type[:3]}-{counter.counter_id[:3]}",
+                "counter_id": counter.counter_id,
+                "counter_type": counter.counter_type,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "x_labels": dates,
+                "data": costs.tolist(),
+            })
+        return counters_consumption
+
     def _get_energy_consumption_overview(self, user_id, start_date,
                                          end_date, include_last_month=True):
+        import numpy as np
+
         start_date = datetime.date(start_date.year, start_date.month, 1)
         end_date = datetime.date(end_date.year, end_date.month, 1)
         if start_date >= end_date:
             return ManagerErrors.INVALID_DATE
         counters = (self.db_session.query(EnergyCounter).
                     filter(EnergyCounter.user_id == user_id).
-                    # filter(EnergyCounter.start_date <= start_date).
                     all())
         if len(counters) == 0:
             return {
@@ -230,52 +486,29 @@ class EnergyManager(object):
                 "end_year": end_date.year
             }
 
-        counters_overview = []
-        x_labels = None
-        all_data = []
-        for counter in counters:
-            counter_overview = self._get_energy_consumption_overview_for_counter(
-                user_id=user_id,
-                start_date=start_date,
-                end_date=end_date,
-                counter_db_id=counter.id,
-                include_last_month=include_last_month
-            )
-            if isinstance(counter_overview, dict):
-                label = counter_overview["label"]
-                data = counter_overview["data"]
-                counters_overview.append({
-                    "label": label,
-                    "data": data,
-                })
-                all_data.append(data)
-                if x_labels is None:
-                    x_labels = counter_overview["x_labels"]
-            else:
-                return counter_overview
-
-        # compute the sum of all counters for each month
-        total = np.array(all_data)
-        total = np.sum(total, axis=0)
-        # convert to list
-        total = total.tolist()
-        # round to 2 decimal places
-        total = [round(x, 2) for x in total]
-        # convert to dict
+        counters_consumption = self._get_counters_consumption(counters, start_date=start_date,
+                                                              end_date=end_date,
+                                                              include_last_month=include_last_month)
+        if isinstance(counters_consumption, ManagerErrors):
+            return counters_consumption
+        counters_overview = [{"label": counter_consumption["label"], "data": counter_consumption["data"]}
+                             for counter_consumption in counters_consumption]
+        # sum of all counters for each month
+        total = np.round(np.sum([overview["data"] for overview in counters_overview], axis=0), 2).tolist()
         counters_overview.append({
             "label": "Total",
             "data": total,
         })
 
         res = {
-            "x_labels": x_labels,
+            "x_labels": counters_consumption[0]["x_labels"],
             "consumption": counters_overview,
             "start_month": start_date.month,
             "start_year": start_date.year,
             "end_month": end_date.month,
             "end_year": end_date.year
         }
-        logger.info(res)
+        log_payload("Energy consumption overview", res)
         return res
 
     @return_wrapper()
@@ -294,14 +527,24 @@ class EnergyManager(object):
         return res
 
     @return_wrapper()
-    def get_total_consumption(self, user_id: int):
-        today = datetime.date.today()
+    @cached_result(domains=("energy",))
+    @single_flight()
+    def get_total_consumption(self, user_id: int, date: datetime.date = None):
+        """
+        Cost of the month before ``date`` and the average of the months before, summed from the stored
+        consumption months. Counters with readings but no stored months yet are backfilled and committed
+        here, so this read can write to the database (once per counter).
+        """
+        today = date or datetime.date.today()
         start_date = datetime.date(
             today.year, today.month, 1) - relativedelta(months=1)
         end_date = start_date + relativedelta(months=1)
-        counters = (self.db_session.query(EnergyCounter).
-                    filter(EnergyCounter.user_id == user_id).
-                    all())
+        rows = (self.db_session.query(EnergyCounter,
+                                      exists().where(EnergyCounterMonth.counter_id == EnergyCounter.id),
+                                      exists().where(EnergyCounterReading.counter_id == EnergyCounter.id)).
+                filter(EnergyCounter.user_id == user_id).
+                all())
+        counters = [counter for counter, _, _ in rows]
         if len(counters) == 0:
             return {
                 "total": 0.0,
@@ -316,50 +559,44 @@ class EnergyManager(object):
                 "end_month": end_date.month,
                 "end_year": end_date.year
             }
-        current_month_total = 0.0
         for counter in counters:
-            counter_overview = self._get_energy_consumption_overview_for_counter(
-                user_id=user_id,
-                start_date=start_date,
-                end_date=end_date,
-                counter_db_id=counter.id,
-                include_last_month=False
-            )
-            if isinstance(counter_overview, dict):
-                data = counter_overview["data"]
-                if len(data) != 1:
-                    logger.error(
-                        f"Invalid data length. start_date={start_date}, end_date={end_date}, data={data}")
-                    return ManagerErrors.ENERGY_COUNTER_INVALID_READING_DATE
-                current_month_total += sum(data)
-            else:
-                logger.error(
-                    f"Invalid data length. start_date={start_date}, end_date={end_date}, return={counter_overview}")
-                return counter_overview
-
-        min_start_date = (self.db_session.query(func.min(EnergyCounter.start_date)).
-                          filter(EnergyCounter.user_id == user_id)).first()[0]
-
+            if counter.frequency not in ["daily", "monthly", "yearly"]:
+                return ManagerErrors.ENERGY_COUNTER_INVALID_FREQUENCY
+            if counter.frequency != "monthly":
+                return ManagerErrors.FEATURE_NOT_IMPLEMENTED
+        min_start_date = min(counter.start_date for counter in counters)
         max_end_date = start_date - relativedelta(months=1)
         month_diff = diff_month(max_end_date, min_start_date)
 
+        # Readings from before the table existed
+        unbuilt = [counter for counter, built, has_readings in rows if has_readings and not built]
+        if unbuilt:
+            try:
+                self._lock_counters([counter.id for counter in unbuilt])
+                self._rebuild_consumption_months(unbuilt)
+                self.db_session.commit()
+            except IntegrityError:
+                # Built by a concurrent request
+                self.db_session.rollback()
+
+        # The costs of all counters per month, from the stored consumption months
+        first_month = min(datetime.date(min_start_date.year, min_start_date.month, 1), start_date)
+        month_costs = dict(self.db_session.query(EnergyCounterMonth.month, func.sum(EnergyCounterMonth.cost)).
+                           join(EnergyCounter, EnergyCounterMonth.counter_id == EnergyCounter.id).
+                           filter(EnergyCounter.user_id == user_id).
+                           filter(EnergyCounterMonth.month >= first_month).
+                           filter(EnergyCounterMonth.month <= start_date).
+                           group_by(EnergyCounterMonth.month).
+                           order_by(EnergyCounterMonth.month).all())
+        current_month_total = round(month_costs.get(start_date, 0.0), 2)
+
         average_consumption_price = 0.0
         if month_diff <= 1:
             average_consumption_price = 0.0
         else:
-            consumption_overview = self._get_energy_consumption_overview(
-                user_id=user_id,
-                start_date=min_start_date,
-                end_date=max_end_date,
-                include_last_month=False
-            )
-            consumption = consumption_overview["consumption"]
-
-            for sample in consumption:
-                if sample["label"].lower() == "total":
-                    data = sample["data"]
-                    average_consumption_price = sum(data) / len(data)
-                    break
+            # the months without a reading cost nothing
+            average_consumption_price = sum(round(cost, 2) for month, cost in month_costs.items()
+                                            if month < max_end_date) / month_diff
         if average_consumption_price == 0.0:
             consumption_development_percentage = 0.0
         else:
@@ -389,7 +626,7 @@ class EnergyManager(object):
             "end_month": max_end_date.month,
             "end_year": max_end_date.year
         }
-        logger.info(res)
+        log_payload("Energy total consumption", res)
         return res
 
     def _get_energy_consumption_overview_for_counter(self, user_id: int,
@@ -409,86 +646,8 @@ class EnergyManager(object):
 
         if not counter:
             return ManagerErrors.ENERGY_COUNTER_NOT_FOUND
-
-        frequency = counter.frequency
-        if frequency not in ["daily", "monthly", "yearly"]:
-            return ManagerErrors.ENERGY_COUNTER_INVALID_FREQUENCY
-        if frequency != "monthly":
-            return ManagerErrors.FEATURE_NOT_IMPLEMENTED
-
-        first_reading = EnergyCounterReading(
-            counter_id=counter.id,
-            reading=counter.first_reading,
-            reading_date=counter.start_date
-        )
-        base_price = counter.base_price
-        price = counter.price
-        previous_reading = (self.db_session.query(EnergyCounterReading).
-                            filter(EnergyCounterReading.counter_id == counter.id).
-                            filter(EnergyCounterReading.reading_date < start_date).order_by(
-            EnergyCounterReading.reading_date.desc()).first()
-        )
-        if not previous_reading:
-            previous_reading = first_reading
-        readings = (self.db_session.query(EnergyCounterReading).
-                    filter(EnergyCounterReading.counter_id == counter.id).
-                    filter(EnergyCounterReading.reading_date >= start_date).
-                    filter(EnergyCounterReading.reading_date <= end_date).
-                    order_by(EnergyCounterReading.reading_date).all())
-        # set reading_date to last day of month
-        # for reading in readings:
-        #     reading.reading_date = datetime.date(
-        #         reading.reading_date.year, reading.reading_date.month, monthrange(reading.reading_date.year,
-        #                                                                            reading.reading_date.month)[1])
-        # return
-
-        # add previous reading to readings
-        readings = [previous_reading] + readings
-        dates = create_dates_labels(
-            start_date=start_date,
-            end_date=end_date,
-            include_last_month=include_last_month,
-            to_dates=False
-        )
-        consumption_map = {date: 0.0 for date in dates}
-
-        for idx in range(len(readings) - 1):
-            current_reading = readings[idx]
-            next_reading = readings[idx + 1]
-            current_reading_date = datetime.date(
-                current_reading.reading_date.year,
-                current_reading.reading_date.month,
-                1
-            )
-            next_reading_date = datetime.date(
-                next_reading.reading_date.year,
-                next_reading.reading_date.month,
-                monthrange(next_reading.reading_date.year,
-                           next_reading.reading_date.month)[
-                    1] if next_reading.reading_date.year == current_reading.reading_date.year and next_reading.reading_date.month == current_reading.reading_date.month else 1
-            )
-            diff_days = diff_day(next_reading_date,
-                                 current_reading_date)
-            if frequency == "monthly":
-                if diff_days not in [28, 29, 30, 31]:
-                    print(
-                        f"Should skip reading "
-                        f"{current_reading_date}"
-                        f" to {next_reading_date}"
-                        f" due to invalid diff_days: {diff_days}")
-                    # continue
-            current_month = to_month_year_str(next_reading.reading_date)
-            consumption = base_price + \
-                (price * (next_reading.reading - current_reading.reading))
-            consumption_map[current_month] = round(consumption, 2)
-
-        res = {
-            "label": f"{counter.counter_type[:3]}-{counter.counter_id[:3]}",
-            "counter_id": counter.counter_id,
-            "counter_type": counter.counter_type,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "x_labels": dates,
-            "data": [consumption_map[date] for date in dates],
-        }
-        return res
+        res = self._get_counters_consumption([counter], start_date=start_date, end_date=end_date,
+                                             include_last_month=include_last_month)
+        if isinstance(res, ManagerErrors):
+            return res
+        return res[0]
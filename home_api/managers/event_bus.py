@@ -0,0 +1,255 @@
+import asyncio
+import dataclasses
+import datetime
+import functools
+import inspect
+import json
+import threading
+import typing
+import uuid
+
+from .cache import bind_call_arguments, is_error_result
+from ..logger import logger
+
+UPLOAD_FINISHED = "upload_finished"
+ACCOUNT_ENTRY_ADDED = "account_entry_added"
+ENERGY_READING_ADDED = "energy_reading_added"
+SESSION_REVOKED = "session_revoked"
+
+
+@dataclasses.dataclass(frozen=True)
+class Event(object):
+    user_id: int
+    kind: str
+    payload: dict
+    id: str = dataclasses.field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: str = dataclasses.field(
+        default_factory=lambda: datetime.datetime.now().isoformat())
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "Event":
+        return cls(**json.loads(raw))
+
+
+class EventBackend(object):
+    """
+    Transport of the published events. ``deliver`` is called for every event which has
+    to be fanned out to the subscribers of this process.
+    """
+
+    def start(self, deliver: typing.Callable[[Event], None]):
+        raise NotImplementedError
+
+    def publish(self, event: Event):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class LocalEventBackend(EventBackend):
+    """
+    Events stay in the process, enough for a single worker.
+    """
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, event):
+        if self._deliver is not None:
+            self._deliver(event)
+
+
+class RedisEventBackend(EventBackend):
+    """
+    Events are published on a redis channel, every worker listens on it with one thread
+    and fans the events out to its own subscribers.
+    """
+
+    def __init__(self, url: str, channel: str = "home_api:events"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "The redis package is required for a shared event backend") from e
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._pubsub = None
+        self._thread = None
+
+    def start(self, deliver):
+        def handler(message):
+            try:
+                deliver(Event.from_json(message["data"]))
+            except Exception as e:
+                logger.error(f"Invalid event on {self.channel}: {e}")
+
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: handler})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, event):
+        self.client.publish(self.channel, event.to_json())
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+
+class Subscription(object):
+    """
+    Bounded queue of the events of one user, consumed by one connection.
+    When the consumer falls behind the oldest events are dropped.
+    """
+
+    def __init__(self, user_id: int, max_size: int = 100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def _put(self, event: Event):
+        # Runs in the event loop of the consumer
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def push(self, event: Event):
+        # May be called from any thread (managers run in the thread pool too)
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: float | None = None) -> Event | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus(object):
+    """
+    Per-user publish/subscribe. Publishing only touches the subscriptions of that user,
+    idle connections cost nothing but their queue.
+    """
+
+    def __init__(self, backend: EventBackend | None = None):
+        self._subscriptions: typing.Dict[int, typing.Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.backend = None
+        self.set_backend(backend or LocalEventBackend())
+
+    def set_backend(self, backend: EventBackend):
+        if self.backend is not None:
+            self.backend.stop()
+        self.backend = backend
+        self.backend.start(self.deliver)
+
+    def subscribe(self, user_id: int, max_size: int = 100) -> Subscription:
+        subscription = Subscription(user_id=user_id, max_size=max_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, kind: str, payload: dict | None = None) -> Event:
+        event = Event(user_id=user_id, kind=kind, payload=payload or {})
+        self.published += 1
+        try:
+            self.backend.publish(event)
+        except Exception as e:
+            # A lost notification must not fail the write which triggered it
+            logger.error(f"Publishing {kind} for user {user_id} failed: {e}")
+        return event
+
+    def deliver(self, event: Event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event.user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.push(event)
+            except RuntimeError:
+                # The loop of the subscriber is closed
+                self.unsubscribe(subscription)
+                continue
+            self.delivered += 1
+
+    def close(self):
+        self.backend.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            users = len(self._subscriptions)
+            subscriptions = sum(len(s) for s in self._subscriptions.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "users": users,
+            "subscriptions": subscriptions,
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+event_bus = EventBus()
+
+
+def configure_event_bus(settings):
+    """
+    Select the event backend from the settings. Called once at startup.
+    """
+    if settings.events_url:
+        event_bus.set_backend(RedisEventBackend(url=settings.events_url))
+    else:
+        event_bus.set_backend(LocalEventBackend())
+    logger.info(f"Event bus: {event_bus.stats()}")
+    return event_bus
+
+
+def publishes_event(kind: str,
+                    payload: typing.Callable[[dict, typing.Any], dict] | None = None) -> typing.Callable:
+    """
+    Decorator for write paths. Publishes ``kind`` to the user of the call once it succeeded.
+    ``payload`` builds the event payload from the bound arguments and the result.
+    Place it above ``invalidates_cache`` so subscribers refetching on the event
+    don't hit stale cached results.
+    """
+
+    def wrapper(func) -> typing.Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            res = func(*args, **kwargs)
+            if not is_error_result(res):
+                arguments = bind_call_arguments(signature, args, kwargs)
+                event_bus.publish(arguments["user_id"], kind,
+                                  payload(arguments, res) if payload else None)
+            return res
+
+        return wrapped
+
+    return wrapper
+
+
+__all__ = ["Event", "EventBackend", "LocalEventBackend", "RedisEventBackend",
+           "Subscription", "EventBus", "event_bus", "configure_event_bus", "publishes_event",
+           "UPLOAD_FINISHED", "ACCOUNT_ENTRY_ADDED", "ENERGY_READING_ADDED", "SESSION_REVOKED"]
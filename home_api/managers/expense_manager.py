@@ -1,5 +1,5 @@
 import datetime
-from typing import List
+from typing import List, Sequence
 
 from sqlalchemy.orm.session import Session as SQLSession
 
@@ -9,9 +9,11 @@ from sqlalchemy import func
 from ..pydantic_models.account import MonthExpensesTagModel
 from ..db.utils import diff_month, create_dates_labels, get_freq, to_month_year_str
 from dateutil.relativedelta import relativedelta
-import numpy as np
 from .return_wrapper import return_wrapper
-import pandas as pd
+from .cache import cached_result, invalidates_cache
+from .single_flight import single_flight
+from .event_bus import publishes_event, ACCOUNT_ENTRY_ADDED
+from ..logger import logger
 
 
 class ExpenseManager(object):
@@ -79,6 +81,8 @@ class ExpenseManager(object):
         return entry
 
     @return_wrapper()
+    @publishes_event(ACCOUNT_ENTRY_ADDED, payload=lambda arguments, res: {"entry_id": str(res.id)})
+    @invalidates_cache("expenses")
     def add_account_entry(self, user_id, entry_id, start_date: datetime.date,
                           end_date: datetime.date, amount: float, name: str,
                           tag: str) -> dict:
@@ -92,6 +96,7 @@ class ExpenseManager(object):
         return account_entry
 
     @return_wrapper()
+    @invalidates_cache("expenses")
     def delete_account_entry(self, user_id, entry_id) -> dict:
         res = self._delete_account_entry(user_id=user_id, entry_id=entry_id)
         return res
@@ -115,6 +120,12 @@ class ExpenseManager(object):
                    all())
         return entries
 
+    def get_account_entry_rows(self, user_id, columns: Sequence[str]):
+        rows = (self.db_session.query(*[getattr(AccountEntry, column) for column in columns]).
+                filter(AccountEntry.user_id == user_id).
+                all())
+        return rows
+
     def get_month_expenses(self, user_id, month, year):
         results = []
         date = datetime.date(year, month, 1)
@@ -172,7 +183,36 @@ class ExpenseManager(object):
             results = [result for result in results if result.value != 0]
         return results
 
+    def _get_months_income_and_expenses(self, user_id, dates: Sequence[datetime.date]):
+        """
+        Income and expenses of every month in ``dates`` as ``get_month_expenses_and_savings``
+        computes them, from the entries of the user fetched with a single query.
+        """
+        import numpy as np
+
+        entries = (self.db_session.query(AccountEntry.tag, AccountEntry.amount,
+                                         AccountEntry.start_date, AccountEntry.end_date).
+                   filter(AccountEntry.user_id == user_id).
+                   all())
+        months = np.array([date.toordinal() for date in dates])
+        income = np.zeros(len(dates))
+        expenses = np.zeros(len(dates))
+        by_tag = {}
+        for tag, amount, start_date, end_date in entries:
+            by_tag.setdefault(tag, []).append((amount, start_date.toordinal(), end_date.toordinal()))
+        for tag_entries in by_tag.values():
+            amounts, starts, ends = (np.array(column) for column in zip(*tag_entries))
+            # entries x months
+            active = (starts[:, None] <= months) & (ends[:, None] >= months)
+            tag_sums = (amounts[:, None] * active).sum(axis=0)
+            # Only tags with a negative sum in the month are expenses
+            expenses += np.where(tag_sums < 0, -tag_sums, 0)
+            income += (np.where(amounts > 0, amounts, 0)[:, None] * active).sum(axis=0)
+        return income, expenses
+
     @return_wrapper()
+    @cached_result(domains=("expenses",))
+    @single_flight()
     def get_overview_chart(self, user_id,
                            start_month=None,
                            start_year=None,
@@ -204,6 +244,8 @@ class ExpenseManager(object):
                             apply_cumulative_on_expenses=True,
                             apply_cumulative_on_income=True,
                             apply_cumulative_on_savings=True):
+        import numpy as np
+
         min_start_date = self.db_session.query(func.min(AccountEntry.start_date)).filter(
             AccountEntry.user_id == user_id).first()[0]
         if min_start_date is None:
@@ -237,29 +279,15 @@ class ExpenseManager(object):
         # convert labels to dates
         x_labels_dates = [datetime.datetime.strptime(
             label, "%b %Y").date() for label in x_labels]
-        cumulative_savings = []
-        cumulative_expenses = []
-        cumulative_income = []
         to_remove_idxes = []
         for idx, date in enumerate(x_labels_dates):
             current_date = datetime.date(date.year, date.month, 1)
             if current_date < start_date:
                 to_remove_idxes.append(idx)
-            res = self.get_month_expenses_and_savings(user_id=user_id,
-                                                      month=date.month,
-                                                      year=date.year,
-                                                      ignore_invalid_income=True)
-            if len(res) == 0:
-                cumulative_savings.append(0)
-                cumulative_expenses.append(0)
-                cumulative_income.append(0)
-            for item in res:
-                if item.label == "Savings":
-                    cumulative_savings.append(item.value)
-                elif item.label == "Expenses":
-                    cumulative_expenses.append(item.value)
-                elif item.label == "Income":
-                    cumulative_income.append(item.value)
+        income, expenses = self._get_months_income_and_expenses(user_id=user_id, dates=x_labels_dates)
+        cumulative_savings = (income - expenses).tolist()
+        cumulative_expenses = expenses.tolist()
+        cumulative_income = income.tolist()
 
         if apply_cumulative_on_savings:
             cumulative_savings = np.cumsum(cumulative_savings).tolist()
@@ -288,19 +316,9 @@ class ExpenseManager(object):
 
         }
 
-    def _create_tag_analysis(self, user_id, start_date, end_date, include_last_month=False):
-        # unique tags
-        tags = [tag[0]
-                for tag in self.db_session.query(AccountEntry.tag).distinct()]
-        all_dates = create_dates_labels(
-            start_date=start_date,
-            end_date=end_date,
-            include_last_month=include_last_month,
-            to_dates=False
-        )
-
+    def _get_tag_entries_data(self, user_id):
         # sum by tags from start_date to end_date for all entries
-        entries_data = self.db_session.query(
+        return self.db_session.query(
             AccountEntry.tag,
             func.sum(AccountEntry.amount),
             AccountEntry.start_date,
@@ -315,6 +333,27 @@ class ExpenseManager(object):
             AccountEntry.end_date
         ).all()
 
+    def _create_tag_analysis(self, user_id, start_date, end_date, include_last_month=False,
+                             tags=None, entries_data=None):
+        import numpy as np
+        import pandas as pd
+
+        # The tags and entries are passed in when analysing several periods,
+        # so they are queried once instead of once per period
+        if tags is None:
+            # unique tags
+            tags = [tag[0]
+                    for tag in self.db_session.query(AccountEntry.tag).distinct()]
+        all_dates = create_dates_labels(
+            start_date=start_date,
+            end_date=end_date,
+            include_last_month=include_last_month,
+            to_dates=False
+        )
+
+        if entries_data is None:
+            entries_data = self._get_tag_entries_data(user_id=user_id)
+
         tags_map = {tag: {"amount": np.zeros(
             len(all_dates)).tolist(), "date": all_dates.copy()} for tag in tags}
 
@@ -345,10 +384,14 @@ class ExpenseManager(object):
         return df_sum
 
     @return_wrapper()
+    @cached_result(domains=("expenses",))
+    @single_flight()
     def create_analysis_overview(self, user_id,
                                  start_date: datetime.date,
                                  end_date: datetime.date,
                                  month_freq: int = 3):
+        import pandas as pd
+
         if month_freq < 1:
             return ManagerErrors.INVALID_MONTH_FREQUENCY
         tags = [tag[0]
@@ -367,14 +410,17 @@ class ExpenseManager(object):
         frequency, period = get_freq(months=month_freq)
         monthly_range = pd.date_range(
             start_date, end_date, freq=frequency).to_period(period)
+        entries_data = self._get_tag_entries_data(user_id=user_id)
         for date_range in monthly_range:
             first_date = date_range.start_time.date()
             last_date = (date_range.end_time + pd.DateOffset(days=1)).date()
-            print(f"Computing from {first_date} to {last_date}")
+            logger.debug("Computing from %s to %s", first_date, last_date)
             df_sum = self._create_tag_analysis(user_id=user_id,
                                                start_date=first_date,
                                                end_date=last_date,
-                                               include_last_month=False)
+                                               include_last_month=False,
+                                               tags=tags,
+                                               entries_data=entries_data)
             monthly_data.append([first_date, last_date, df_sum])
 
         df_overview = pd.DataFrame(
@@ -0,0 +1,216 @@
+import json
+import select
+import threading
+import typing
+import uuid
+
+from .cache import ResultCache, result_cache
+from ..logger import logger
+
+CHANNEL = "home_api_invalidation"
+
+
+class InvalidationBackend(object):
+    """
+    Transport of ``(user_id, domain)`` invalidations between the worker processes.
+    ``receive`` is called with the decoded message of every other worker, ``reset`` whenever
+    messages may have been missed (e.g. before the backend was (re)connected).
+    """
+
+    def start(self, receive: typing.Callable[[dict], None], reset: typing.Callable[[], None] | None = None):
+        raise NotImplementedError
+
+    def publish(self, message: dict):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class MemoryInvalidationChannel(object):
+    """
+    In-process stand-in for the postgres channel, every attached backend plays one worker.
+    """
+
+    def __init__(self):
+        self.backends: typing.List["MemoryInvalidationBackend"] = []
+
+    def notify(self, message: dict):
+        for backend in list(self.backends):
+            if backend.receive is not None:
+                backend.receive(message)
+
+
+class MemoryInvalidationBackend(InvalidationBackend):
+    def __init__(self, channel: MemoryInvalidationChannel):
+        self.channel = channel
+        self.receive = None
+
+    def start(self, receive, reset=None):
+        self.receive = receive
+        self.channel.backends.append(self)
+
+    def publish(self, message):
+        self.channel.notify(message)
+
+    def stop(self):
+        if self in self.channel.backends:
+            self.channel.backends.remove(self)
+        self.receive = None
+
+
+class PostgresInvalidationBackend(InvalidationBackend):
+    """
+    Invalidations are sent with ``pg_notify`` over the pool of the shared engine. Every worker
+    listens with one dedicated connection in a daemon thread and reconnects if it is lost.
+    The invalidations sent while it wasn't listening are lost, so every (re)connect resets the cache.
+    """
+
+    def __init__(self, engine, channel: str = CHANNEL, poll_timeout: float = 5.0):
+        self.engine = engine
+        self.channel = channel
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+        self._thread = None
+        self._connection = None
+
+    def _connect(self):
+        import psycopg2
+
+        url = self.engine.url
+        # The query holds the other libpq options of the url, e.g. sslmode
+        connection = psycopg2.connect(**url.translate_connect_args(username="user", database="dbname"),
+                                      **url.query)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _listen(self, receive, reset):
+        while not self._stop.is_set():
+            try:
+                if self._connection is None:
+                    self._connection = self._connect()
+                    if reset is not None:
+                        reset()
+                if select.select([self._connection], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                self._connection.poll()
+                while self._connection.notifies:
+                    notify = self._connection.notifies.pop(0)
+                    try:
+                        receive(json.loads(notify.payload))
+                    except Exception as e:
+                        logger.error(f"Invalid invalidation on {self.channel}: {e}")
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.error(f"Invalidation listener lost its connection: {e}")
+                self._close_connection()
+                self._stop.wait(self.poll_timeout)
+        self._close_connection()
+
+    def _close_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def start(self, receive, reset=None):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(receive, reset),
+                                        name="invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def publish(self, message):
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("SELECT pg_notify(%(channel)s, %(payload)s)",
+                                       {"channel": self.channel, "payload": json.dumps(message)})
+            connection.commit()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_timeout + 1)
+            self._thread = None
+
+
+class InvalidationBus(object):
+    """
+    Sends the local invalidations of ``cache`` to the other workers and applies theirs.
+    Messages of this worker are recognized by the origin and skipped.
+    """
+
+    def __init__(self, cache: ResultCache = result_cache):
+        self.cache = cache
+        self.origin = uuid.uuid4().hex
+        self.backend: InvalidationBackend | None = None
+        self.sent = 0
+        self.received = 0
+        self.resets = 0
+
+    def start(self, backend: InvalidationBackend):
+        self.stop()
+        self.backend = backend
+        self.backend.start(self.receive, self.reset)
+        self.cache.publisher = self.publish
+
+    def stop(self):
+        if self.backend is not None:
+            self.cache.publisher = None
+            self.backend.stop()
+            self.backend = None
+
+    @property
+    def active(self) -> bool:
+        return self.backend is not None
+
+    def publish(self, user_id: int, domain: str | None = None):
+        if self.backend is None:
+            return
+        self.backend.publish({"origin": self.origin, "user_id": user_id, "domain": domain})
+        self.sent += 1
+
+    def receive(self, message: dict):
+        if message.get("origin") == self.origin:
+            return
+        self.received += 1
+        self.cache.invalidate_user(message["user_id"], message.get("domain"), propagate=False)
+
+    def reset(self):
+        # Every cached result may be stale, clearing also changes the epoch of the ETags
+        self.resets += 1
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": None if self.backend is None else type(self.backend).__name__,
+            "sent": self.sent,
+            "received": self.received,
+            "resets": self.resets,
+        }
+
+
+invalidation_bus = InvalidationBus()
+
+
+def configure_invalidation(settings, engine):
+    """
+    Start listening for the invalidations of the other workers. Called once per worker at startup.
+    """
+    if settings.cache_invalidation == "postgres" and not settings.cache_url:
+        if engine.dialect.name != "postgresql":
+            raise ValueError(f"CACHE_INVALIDATION=postgres needs a postgres database, not {engine.dialect.name}")
+        invalidation_bus.start(PostgresInvalidationBackend(engine=engine))
+    else:
+        # A shared cache backend sees the version bumps of all workers anyway
+        invalidation_bus.stop()
+    logger.info(f"Cache invalidation: {invalidation_bus.stats()}")
+    return invalidation_bus
+
+
+__all__ = ["InvalidationBackend", "MemoryInvalidationChannel", "MemoryInvalidationBackend",
+           "PostgresInvalidationBackend", "InvalidationBus", "invalidation_bus",
+           "configure_invalidation"]
@@ -1,4 +1,5 @@
 from .errors import ManagerErrors, translate_manager_error
+import functools
 import typing
 
 
@@ -10,6 +11,7 @@ def return_wrapper() -> typing.Callable:
 
     """
     def wrapper(func) -> typing.Callable:
+        @functools.wraps(func)
         def wrapped(*args, **kwargs) -> dict:
             res = func(*args, **kwargs)
             if isinstance(res, ManagerErrors):
@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import inspect
+import threading
+import typing
+from concurrent.futures import Future
+
+from .cache import make_call_key, bind_call_arguments
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class SingleFlight(object):
+    """
+    Runs at most one computation per key at a time. Callers arriving while
+    the computation is in flight wait for it and share its result (or exception).
+    Calls from an event loop thread are not coalesced (``bypassed``), waiting would block the
+    loop: the routers run the shared computations in worker threads instead.
+    """
+
+    def __init__(self):
+        self._calls: typing.Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def do(self, key: str, func: typing.Callable, *args, **kwargs):
+        if _on_event_loop():
+            with self._lock:
+                self.bypassed += 1
+            return func(*args, **kwargs)
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            res = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(res)
+            return res
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "in_flight": self.in_flight,
+        }
+
+
+single_flight_group = SingleFlight()
+
+
+def single_flight() -> typing.Callable:
+    """
+    Decorator coalescing concurrent identical calls of a manager method
+    (same method, user, arguments and data version) into one computation.
+    """
+
+    def wrapper(func) -> typing.Callable:
+        signature = inspect.signature(func)
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            key = make_call_key(name, bind_call_arguments(signature, args, kwargs))
+            return single_flight_group.do(key, func, *args, **kwargs)
+
+        return wrapped
+
+    return wrapper
+
+
+__all__ = ["SingleFlight", "single_flight_group", "single_flight"]
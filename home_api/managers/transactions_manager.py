@@ -1,23 +1,26 @@
 import calendar
 import datetime
-import json
-import os
+import io
 import re
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Sequence, Tuple, TYPE_CHECKING
 
-import numpy as np
-import pandas as pd
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm.session import Session as SQLSession
 
 from .errors import ManagerErrors
 from .return_wrapper import return_wrapper
+from .cache import cached_result, invalidates_cache
+from .single_flight import single_flight
+from .event_bus import publishes_event, UPLOAD_FINISHED
 from ..db.tables import BankTransaction
 from ..db.utils import dates_to_labels
-from ..logger import logger
+from ..logger import logger, log_payload
 from ..pydantic_models.account import MonthExpensesTagModel
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 categories = {
     "Shopping": {
         "Supermarket": ["rewe", "edeka", "aldi", "lidl", "penny", "kaufland"],
@@ -111,6 +114,8 @@ umlaut_map = {
 
 
 def create_summary(df_in):
+    import pandas as pd
+
     summary_out = df_in.groupby(['Category', 'Subcategory']).agg(
         Total_Amount=('Amount', 'sum'),
         Transaction_Count=('Amount', 'count'),
@@ -142,6 +147,8 @@ def create_summary(df_in):
 
 
 def categorize(description, amount):
+    import pandas as pd
+
     desc = description.lower()
     for category, subcats in categories.items():
         for subcat, keywords in subcats.items():
@@ -163,16 +170,15 @@ def categorize(description, amount):
     return pd.Series(["Other", "Uncategorized", None])
 
 
-def convert_to_utf8(filepath: str, output_filepath: str) -> pd.DataFrame:
-    with open(filepath, "r", encoding="latin1") as f:
-        content = f.read()
-        # Replace umlauts with their replacements
-        for umlaut, replacement in umlaut_map.items():
-            content = content.replace(umlaut, replacement)
+def convert_to_utf8(content: bytes) -> "pd.DataFrame":
+    import pandas as pd
+
+    text = content.decode("latin1")
+    # Replace umlauts with their replacements
+    for umlaut, replacement in umlaut_map.items():
+        text = text.replace(umlaut, replacement)
 
-    with open(output_filepath, "w", encoding="utf-8") as f:
-        f.write(content)
-    df = pd.read_csv(output_filepath, sep=";", encoding="utf-8")
+    df = pd.read_csv(io.StringIO(text), sep=";")
     # remove Auftragskonto
     df = df.drop(columns=["Auftragskonto"])
     df["Buchungstag"] = pd.to_datetime(df["Buchungstag"], format="%d.%m.%y")
@@ -242,8 +248,6 @@ def convert_to_utf8(filepath: str, output_filepath: str) -> pd.DataFrame:
     df["Description"] = df["Description"].str.replace("Umsatz gebucht", "")
 
     df["Description"] = df["Description"].str.split().str.join(' ')
-
-    df.to_csv(output_filepath, encoding="utf-8", index=False, sep=";")
     return df
 
 
@@ -252,105 +256,53 @@ class TransactionsManager(object):
 
     def __init__(self, db_session: SQLSession):
         self.db_session = db_session
-        self.uploaded_files_dir = os.path.join(
-            f"tmp", "home_dashboard_api", "uploaded_files")
-        self.create_uploaded_files_dir()
-
-    def create_uploaded_files_dir(self):
-        """
-        Create the uploaded files directory if it doesn't exist.
-        """
-        if not os.path.exists(self.uploaded_files_dir):
-            os.makedirs(self.uploaded_files_dir)
 
+    @publishes_event(UPLOAD_FINISHED, payload=lambda arguments, res: {"filename": arguments["filename"]})
+    @invalidates_cache("transactions")
     def parse_file(self, filename: str, filetype: str, filesize: int, content: bytes, user_id: int) -> dict:
         """
         Parse a file and return the contents.
         """
-        self.create_uploaded_files_dir()
-        base_dir = os.path.join(self.uploaded_files_dir, filename)
-
-        if not os.path.exists(base_dir):
-            os.makedirs(base_dir)
-
-        filepath = os.path.join(base_dir, filename)
-        output_filepath_utf8 = os.path.join(base_dir, f"{filename}.utf8.csv")
-        output_filepath_categorized = os.path.join(
-            base_dir, f"{filename}.categorized.csv")
-        output_filepath_summary = os.path.join(
-            base_dir, f"{filename}.summary.csv")
-        metadata_filepath = os.path.join(base_dir, f"{filename}.metadata.json")
-
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        if os.path.exists(output_filepath_utf8):
-            os.remove(output_filepath_utf8)
-        if os.path.exists(output_filepath_categorized):
-            os.remove(output_filepath_categorized)
-        if os.path.exists(output_filepath_summary):
-            os.remove(output_filepath_summary)
-        if os.path.exists(metadata_filepath):
-            os.remove(metadata_filepath)
-
-        with open(filepath, "wb") as f:
-            f.write(content)
-
-        # create utf8 file
-        df = convert_to_utf8(filepath, output_filepath_utf8)
+        import pandas as pd
+
+        # The file is parsed in memory, nothing is written to the disk
+        df = convert_to_utf8(content)
 
         # Apply categorization
         df[['Category', 'Subcategory', "Keyword"]] = df.apply(
             lambda x: categorize(x['Description'], x['Amount']), axis=1)
 
-        df.to_csv(output_filepath_categorized, sep=";", index=False)
-
-        summary = create_summary(df)
-        summary.to_csv(output_filepath_summary, sep=";", index=False)
-
-        metadata = {
-            "filename": filename,
-            "filetype": filetype,
-            "filesize": filesize,
-            "filepath": filepath,
-            "output_filepath_utf8": output_filepath_utf8,
-            "output_filepath_categorized": output_filepath_categorized,
-            "output_filepath_summary": output_filepath_summary,
-            "created_at": datetime.datetime.now().isoformat(),
-        }
-        # save metadata to file
-        with open(metadata_filepath, "w") as f:
-            json.dump(metadata, f, indent=4)
-
         logger.info(
             f"Creating bank transactions for user {user_id} from file {filename}")
         # save to db. Only entries which don't exist in the db
-        # get all entries in the db
+        # get all entries in the db of the booked period of the file, in one query
+        key_columns = (BankTransaction.booking_date, BankTransaction.value_date, BankTransaction.amount,
+                       BankTransaction.currency, BankTransaction.description, BankTransaction.category,
+                       BankTransaction.subcategory, BankTransaction.keyword)
+        existing = set()
+        if len(df) > 0:
+            existing = set(self.db_session.query(*key_columns).filter(
+                BankTransaction.user_id == user_id,
+                BankTransaction.booking_date >= df["Booking Date"].min().date(),
+                BankTransaction.booking_date <= df["Booking Date"].max().date(),
+            ).all())
         for index, row in df.iterrows():
             booking_date = row["Booking Date"].date()
             value_date = row["Value Date"].date()
-            amount = row["Amount"]
+            amount = float(row["Amount"])
             currency = row["Currency"]
             description = row["Description"]
             category = row["Category"]
             subcategory = row["Subcategory"]
-            keyword = "" if row["Keyword"] is None else row["Keyword"]
-
-            # check if entry exists in the db
-            transaction = self.db_session.query(BankTransaction).filter(
-
-                BankTransaction.booking_date == booking_date,
-                BankTransaction.value_date == value_date,
-                BankTransaction.amount == amount,
-                BankTransaction.currency == currency,
-                BankTransaction.description == description,
-                BankTransaction.category == category,
-                BankTransaction.subcategory == subcategory,
-                BankTransaction.keyword == keyword,
-                BankTransaction.user_id == user_id
-            ).first()
-            if transaction is None:
+            # Uncategorized rows have no keyword, which pandas turns into nan
+            keyword = "" if pd.isna(row["Keyword"]) else row["Keyword"]
+
+            # check if entry exists in the db (or earlier in the file)
+            key = (booking_date, value_date, amount, currency, description, category, subcategory, keyword)
+            if key not in existing:
+                existing.add(key)
                 transaction = BankTransaction(
-                    id=str(uuid.uuid4()),
+                    id=uuid.uuid4(),
                     booking_date=booking_date,
                     value_date=value_date,
                     amount=amount,
@@ -382,6 +334,79 @@ class TransactionsManager(object):
         ).all()
         return transactions
 
+    def get_bank_transaction_rows(self, user_id: int, columns: Sequence[str]):
+        """
+        Get the bank transactions of a user as plain tuples of the given columns.
+        Skips the orm object creation, used by the list endpoint.
+        """
+        rows = self.db_session.query(
+            *[getattr(BankTransaction, column) for column in columns]
+        ).filter(
+            BankTransaction.user_id == user_id
+        ).all()
+        return rows
+
+    def _query_bank_transaction_rows(self, user_id: int, columns: Sequence[str],
+                                     start_date: datetime.date | None = None,
+                                     end_date: datetime.date | None = None,
+                                     category: str | None = None,
+                                     amount_sign: str | None = None):
+        query = self.db_session.query(
+            *[getattr(BankTransaction, column) for column in columns]
+        ).filter(BankTransaction.user_id == user_id)
+        if start_date is not None:
+            query = query.filter(BankTransaction.booking_date >= start_date)
+        if end_date is not None:
+            query = query.filter(BankTransaction.booking_date <= end_date)
+        if category is not None:
+            query = query.filter(BankTransaction.category == category)
+        if amount_sign == "positive":
+            query = query.filter(BankTransaction.amount >= 0)
+        elif amount_sign == "negative":
+            query = query.filter(BankTransaction.amount < 0)
+        elif amount_sign is not None:
+            raise ValueError(f"Invalid amount sign {amount_sign}, expected positive or negative")
+        # Newest first, id breaks ties between transactions booked on the same day
+        return query.order_by(BankTransaction.booking_date.desc(), BankTransaction.id.desc())
+
+    def get_bank_transaction_page(self, user_id: int, columns: Sequence[str], limit: int,
+                                  after: Tuple[datetime.date, uuid.UUID] | None = None,
+                                  **filters):
+        """
+        Keyset pagination on (booking_date, id). ``after`` is the key of the last row
+        of the previous page. Returns the rows and the key of the last returned row,
+        or None if there are no more rows.
+        """
+        if "booking_date" not in columns or "id" not in columns:
+            raise ValueError("The columns booking_date and id are required for pagination")
+        query = self._query_bank_transaction_rows(user_id=user_id, columns=columns, **filters)
+        if after is not None:
+            query = query.filter(
+                tuple_(BankTransaction.booking_date, BankTransaction.id) < tuple_(*after))
+        # One extra row tells if there is a next page
+        rows = query.limit(limit + 1).all()
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, (last[columns.index("booking_date")], last[columns.index("id")])
+
+    def iter_bank_transaction_rows(self, user_id: int, columns: Sequence[str],
+                                   batch_size: int = 1000, **filters):
+        """
+        Yields lists of at most ``batch_size`` rows. The rows are fetched through a
+        server side cursor, so only one batch is held in memory.
+        """
+        query = self._query_bank_transaction_rows(user_id=user_id, columns=columns, **filters)
+        batch = []
+        for row in query.execution_options(stream_results=True).yield_per(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     def get_month_expenses(self, user_id, month, year):
         results = []
         date = datetime.date(year, month, 1)
@@ -449,6 +474,8 @@ class TransactionsManager(object):
                             apply_cumulative_on_expenses=True,
                             apply_cumulative_on_income=True,
                             apply_cumulative_on_savings=True):
+        import numpy as np
+        import pandas as pd
 
         amount_booking_date_entries = self.db_session.query(
             BankTransaction.booking_date,
@@ -534,7 +561,7 @@ class TransactionsManager(object):
         summary["Income"] = cumulative_income
         summary = summary[(summary["Start_Date"] >= start_date.date()) & (
             summary["Start_Date"] <= end_date.date())]
-        logger.info(f"\n{summary}")
+        log_payload("Transactions overview summary", summary)
         x_labels = dates_to_labels(summary["Start_Date"])
         cumulative_savings = summary["Savings"].tolist()
         cumulative_expenses = summary["Expenses"].tolist()
@@ -552,6 +579,8 @@ class TransactionsManager(object):
         }
 
     @return_wrapper()
+    @cached_result(domains=("transactions",))
+    @single_flight()
     def get_overview_chart(self, user_id,
                            start_month=None,
                            start_year=None,
@@ -572,9 +601,10 @@ class TransactionsManager(object):
                                        apply_cumulative_on_income=apply_cumulative_on_income,
                                        apply_cumulative_on_savings=apply_cumulative_on_savings
                                        )
-        logger.info(f"Transactions overview chart: {res}")
+        log_payload("Transactions overview chart", res)
         return res
 
+    @cached_result(domains=("transactions",))
     def get_total_expenses_and_savings(self, user_id) -> List[
             MonthExpensesTagModel]:
         total_expenses = self.db_session.query(
@@ -605,62 +635,45 @@ class TransactionsManager(object):
 
         return results
 
+    @cached_result(domains=("transactions",))
     def get_category_expenses_and_savings(self, user_id) -> List[
             MonthExpensesTagModel]:
         results = []
-        # Get all categories
-        all_categories = self.db_session.query(BankTransaction.category).filter(
-            BankTransaction.user_id == user_id).distinct().all()
-        all_categories = [category[0] for category in all_categories]
         # sum all amount for each category
-        for idx, category in enumerate(all_categories):
-            category_sum = self.db_session.query(
-                func.sum(BankTransaction.amount).label("category_sum")) \
-                .filter(BankTransaction.user_id == user_id,
-                        BankTransaction.category == category).first()
-            if category_sum and category_sum[0] is not None:
-                category_sum = category_sum[0]
-            else:
-                category_sum = 0
-
+        category_sums = self.db_session.query(
+            BankTransaction.category,
+            func.sum(BankTransaction.amount).label("category_sum")) \
+            .filter(BankTransaction.user_id == user_id) \
+            .group_by(BankTransaction.category) \
+            .order_by(BankTransaction.category).all()
+        for idx, (category, category_sum) in enumerate(category_sums):
             results.append(
                 MonthExpensesTagModel(
-                    id=idx, value=category_sum, label=str(category))
+                    id=idx, value=category_sum or 0, label=str(category))
             )
         return results
 
+    @cached_result(domains=("transactions",))
     def get_subcategory_expenses_and_savings(self, user_id) -> List[Dict[str, List[MonthExpensesTagModel]]]:
-        results = []
-        # Get all categories
-        all_categories = self.db_session.query(BankTransaction.category).filter(
-            BankTransaction.user_id == user_id).distinct().all()
-        all_categories = [category[0] for category in all_categories]
         # sum all amount for each subcategory
-        for category in all_categories:
-            subcategory_results = []
-            all_subcategories = self.db_session.query(BankTransaction.subcategory).filter(
-                BankTransaction.user_id == user_id,
-                BankTransaction.category == category).distinct().all()
-            all_subcategories = [subcategory[0]
-                                 for subcategory in all_subcategories]
-            for idx, subcategory in enumerate(all_subcategories):
-                subcategory_sum = self.db_session.query(
-                    func.sum(BankTransaction.amount).label("subcategory_sum")) \
-                    .filter(BankTransaction.user_id == user_id,
-                            BankTransaction.category == category,
-                            BankTransaction.subcategory == subcategory).first()
-                if subcategory_sum and subcategory_sum[0] is not None:
-                    subcategory_sum = subcategory_sum[0]
-                else:
-                    subcategory_sum = 0
-                subcategory_results.append(
-                    MonthExpensesTagModel(
-                        id=idx, value=subcategory_sum, label=str(subcategory))
-                )
-            results.append({
-                "category": category,
-                "subcategories": subcategory_results
-            })
+        subcategory_sums = self.db_session.query(
+            BankTransaction.category,
+            BankTransaction.subcategory,
+            func.sum(BankTransaction.amount).label("subcategory_sum")) \
+            .filter(BankTransaction.user_id == user_id) \
+            .group_by(BankTransaction.category, BankTransaction.subcategory) \
+            .order_by(BankTransaction.category, BankTransaction.subcategory).all()
+        by_category = {}
+        for category, subcategory, subcategory_sum in subcategory_sums:
+            subcategory_results = by_category.setdefault(category, [])
+            subcategory_results.append(
+                MonthExpensesTagModel(
+                    id=len(subcategory_results), value=subcategory_sum or 0, label=str(subcategory))
+            )
+        results = [{
+            "category": category,
+            "subcategories": subcategory_results
+        } for category, subcategory_results in by_category.items()]
         return results
 
 
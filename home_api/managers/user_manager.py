@@ -4,6 +4,7 @@ from ..db.tables import User, UserSession, AccountEntry
 
 from sqlalchemy.orm.session import Session as SQLSession
 from ..entrypoint import entry_point
+from ..settings import Settings
 from .errors import ManagerErrors, translate_manager_error
 from ..db.checks import is_valid_ip_address
 import datetime
@@ -12,15 +13,28 @@ import jwt
 from ..db.utils import generate_password
 from ..db.utils import diff_month, create_dates_labels
 from dateutil.relativedelta import relativedelta
+from .cache import cached_result
+from .single_flight import single_flight
+from .event_bus import event_bus, SESSION_REVOKED
 
 
 class UserManager(object):
     db_session: SQLSession
-    pwd_context: CryptContext
 
-    def __init__(self, db_session: SQLSession):
+    def __init__(self, db_session: SQLSession, settings: Settings | None = None):
         self.db_session = db_session
-        self.pwd_context = entry_point.pwd_context
+        # Without explicit settings the current snapshot is used, so reloads are picked up
+        self._settings = settings
+
+    @property
+    def settings(self) -> Settings:
+        if self._settings is not None:
+            return self._settings
+        return entry_point.settings
+
+    @property
+    def pwd_context(self) -> CryptContext:
+        return entry_point.pwd_context
 
     def _verify_user(self, email: str, username: str):
         user = self.db_session.query(User).filter_by(
@@ -189,7 +203,7 @@ class UserManager(object):
             input_type = "username"
 
         created_at = datetime.datetime.now()
-        expires_at = created_at + entry_point.access_token_expiration
+        expires_at = created_at + self.settings.access_token_expiration
         payload = {
             "sub": login_input,
             "exp": expires_at,
@@ -197,7 +211,7 @@ class UserManager(object):
 
         }
         access_token = jwt.encode(
-            payload, entry_point.secret_key, algorithm=entry_point.jwt_algorithm)
+            payload, self.settings.secret_key, algorithm=self.settings.jwt_algorithm)
 
         session_or_error = self._create_user_session(
             password=password,
@@ -231,7 +245,10 @@ class UserManager(object):
         res = self.verify_token(token=token, session_id=session_id)
         if res["error"]:
             return res
+        user_id = res["payload"].user_id
         res = self._logout(session_id=session_id, token=token)
+        if res is ManagerErrors.SUCCESS:
+            event_bus.publish(user_id, SESSION_REVOKED, {"session_id": str(session_id)})
         return {
             "error": True if res is not ManagerErrors.SUCCESS else False,
             "message": translate_manager_error(res),
@@ -240,8 +257,8 @@ class UserManager(object):
 
     def verify_token(self, token, session_id) -> dict:
         try:
-            payload = jwt.decode(token, entry_point.secret_key, algorithms=[
-                entry_point.jwt_algorithm])
+            payload = jwt.decode(token, self.settings.secret_key, algorithms=[
+                self.settings.jwt_algorithm])
             input_type = payload["type"]
             sub = payload["sub"]
             if input_type == "email":
@@ -336,23 +353,21 @@ class UserManager(object):
             today = datetime.datetime.now().date().replace(day=1)
         else:
             today = date.replace(day=1)
-        # Get income
-        income = (self.db_session.query(AccountEntry).
-                  filter(AccountEntry.user_id == user_id).
-                  filter(AccountEntry.start_date <= today).
-                  filter(AccountEntry.amount > 0).
-                  order_by(AccountEntry.start_date).
-                  all())
+        return self._networth_from_entries(self._get_account_entries_by_start(user_id=user_id), today)
 
+    def _get_account_entries_by_start(self, user_id: int):
+        return (self.db_session.query(AccountEntry).
+                filter(AccountEntry.user_id == user_id).
+                order_by(AccountEntry.start_date).
+                all())
+
+    def _networth_from_entries(self, account_entries, today: datetime.date):
+        # Get income
+        income = [entry for entry in account_entries if entry.start_date <= today and entry.amount > 0]
         income = self.sum_amount_until_date(income, today)
 
         # Get expenses ordered by start date
-        expenses = (self.db_session.query(AccountEntry).
-                    filter(AccountEntry.user_id == user_id).
-                    filter(AccountEntry.start_date <= today).
-                    filter(AccountEntry.amount < 0).
-                    order_by(AccountEntry.start_date).
-                    all())
+        expenses = [entry for entry in account_entries if entry.start_date <= today and entry.amount < 0]
         expenses = self.sum_amount_until_date(expenses, today)
 
         for key in expenses.keys():
@@ -396,16 +411,23 @@ class UserManager(object):
             return datetime.date(first_entry.start_date.year, first_entry.start_date.month, first_entry.start_date.day)
         return None
 
-    def get_networth_development_percentage(self, user_id):
-        today = datetime.datetime.now().date().replace(day=1)
+    @cached_result(domains=("expenses",))
+    @single_flight()
+    def get_networth_development_percentage(self, user_id, date: datetime.date = None):
+        if date is None:
+            today = datetime.datetime.now().date().replace(day=1)
+        else:
+            today = date.replace(day=1)
         # today = datetime.date(2024, 10, 1)
         previous_month = today - relativedelta(months=1)
         # print(f"previous month: {previous_month}")
         # print(f"today: {today}")
-        first_date = self.first_account_entry_date(user_id=user_id)
+        # All months are computed from the same entries, fetched once
+        account_entries = self._get_account_entries_by_start(user_id=user_id)
         average_networth = 0.0
-        if first_date is None:
+        if not account_entries:
             return 0.0
+        first_date = account_entries[0].start_date
         dates = create_dates_labels(
             start_date=first_date,
             end_date=previous_month,
@@ -413,19 +435,13 @@ class UserManager(object):
             to_dates=True
         )
         for date in dates:
-            month_networth = self.get_networth(
-                user_id=user_id,
-                date=date
-            )
+            month_networth = self._networth_from_entries(account_entries, date.replace(day=1))
             # print(date,month_networth)
             average_networth += month_networth
 
         average_networth = average_networth / len(dates)
         # print(f"average networth: {average_networth}")
-        current_networth = self.get_networth(
-            user_id=user_id,
-            date=today
-        )
+        current_networth = self._networth_from_entries(account_entries, today)
         # print(f"current networth: {current_networth}")
         # calculate percentage change
         if average_networth == 0:
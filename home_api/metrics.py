@@ -0,0 +1,374 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+import typing
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: typing.Sequence[str], values: typing.Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(object):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> typing.Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: typing.Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, labels: tuple = ()):
+        self.inc(-amount, labels)
+
+    def set(self, value: float, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: typing.Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._values: typing.Dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            values[0][index] += 1
+            values[1] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        values = self._values.get(labels)
+        return 0 if values is None else sum(values[0])
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            label_string = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_string} {_format_value(total)}"
+            yield f"{self.name}_count{label_string} {cumulative}"
+
+
+class MetricsRegistry(object):
+    """
+    Metrics of this process in the Prometheus text format. Collectors are called on every
+    scrape to refresh gauges which are cheaper to read than to track (e.g. pool stats).
+    """
+
+    def __init__(self):
+        self._metrics: typing.Dict[str, Metric] = {}
+        self._collectors: typing.List[typing.Callable[[], None]] = []
+
+    def _register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: typing.Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter("http_requests_total", "Finished requests.",
+                                ("method", "route", "status"))
+http_request_duration = metrics.histogram("http_request_duration_seconds",
+                                          "Request latency per route template.", ("method", "route"))
+http_requests_in_flight = metrics.gauge("http_requests_in_flight", "Requests being processed.")
+db_query_duration = metrics.histogram("db_query_duration_seconds", "Latency of the sql statements.",
+                                      buckets=QUERY_BUCKETS)
+db_queries_per_request = metrics.histogram("db_queries_per_request",
+                                           "Sql statements executed per request.", ("route",),
+                                           buckets=COUNT_BUCKETS)
+db_query_duration_per_request = metrics.histogram("db_query_duration_per_request_seconds",
+                                                  "Time spent in sql statements per request.", ("route",))
+db_pool_connections = metrics.gauge("db_pool_connections", "Connections of the database pools.",
+                                    ("pool", "state"))
+upload_bytes = metrics.counter("upload_bytes_total", "Bytes of the uploaded files.")
+upload_duration = metrics.histogram("upload_duration_seconds",
+                                    "Time to read and parse an uploaded file.")
+
+
+class RequestStats(object):
+    """
+    Statements and phases of one request. Updated from every thread the request runs code in
+    (e.g. the dashboard components), so the updates are locked.
+    """
+    __slots__ = ("queries", "query_time", "phases", "statements", "_lock")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.query_time = 0.0
+        # Wall time per phase, only recorded if a dict is set (see ServerTimingMiddleware)
+        self.phases: typing.Dict[str, float] | None = None
+        # The executed statements, only recorded if a list is set (see count_queries)
+        self.statements: typing.List[str] | None = None
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_query(self, statement: str, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.query_time += seconds
+            if self.statements is not None:
+                self.statements.append(statement)
+
+
+# Set per request by the middleware. The object is shared with the threads the request runs
+# code in (contexts are copied), so their statements are counted too.
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None)
+
+
+def current_request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+def bind_request_stats(stats: RequestStats) -> contextvars.Token:
+    return _request_stats.set(stats)
+
+
+def unbind_request_stats(token: contextvars.Token):
+    _request_stats.reset(token)
+
+
+@contextlib.contextmanager
+def timed_phase(name: str):
+    """
+    Adds the wall time of the block to the phase ``name`` of the current request.
+    A no-op unless the phases of the request are recorded.
+    """
+    stats = _request_stats.get()
+    if stats is None or stats.phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def count_queries(record_statements: bool = False):
+    """
+    Counts the sql statements executed in the block, e.g. by a manager call in a test.
+    Yields the ``RequestStats`` of the block.
+    """
+    stats = RequestStats()
+    if record_statements:
+        stats.statements = []
+    token = bind_request_stats(stats)
+    try:
+        yield stats
+    finally:
+        unbind_request_stats(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start is kept on the execution context, a failing statement doesn't reach the after event
+    if context is not None:
+        context.query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "query_start", None)
+    elapsed = 0.0 if start is None else time.perf_counter() - start
+    db_query_duration.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_query(statement, elapsed)
+
+
+def timed(name: str) -> typing.Callable:
+    """
+    Decorator version of ``timed_phase`` for sync and async functions (e.g. dependencies).
+    """
+
+    def wrapper(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapped(*args, **kwargs):
+                with timed_phase(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapped(*args, **kwargs):
+                with timed_phase(name):
+                    return func(*args, **kwargs)
+        return wrapped
+
+    return wrapper
+
+
+def install_db_hooks():
+    """
+    Time every statement of every engine. Safe to call more than once.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def collect_pool_stats(registry):
+    def collector():
+        db_pool_connections.clear()
+        for pool, stats in registry.pool_stats().items():
+            for state in ("size", "checked_in", "checked_out", "overflow"):
+                if stats[state] is not None:
+                    db_pool_connections.set(stats[state], (pool, state))
+
+    return collector
+
+
+def record_upload(size: int, seconds: float):
+    upload_bytes.inc(size)
+    upload_duration.observe(seconds)
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency, status and sql statements of every request, labeled with the
+    route template (``/api/expenses/account_entries/{session_id}``) instead of the path,
+    so the number of series stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = None
+        stats = current_request_stats()
+        if stats is None:
+            stats = RequestStats()
+            token = bind_request_stats(stats)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            if token is not None:
+                unbind_request_stats(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(labels=(method, route, str(status_code)))
+            http_request_duration.observe(elapsed, (method, route))
+            db_queries_per_request.observe(stats.queries, (route,))
+            db_query_duration_per_request.observe(stats.query_time, (route,))
+
+
+__all__ = ["CONTENT_TYPE", "Counter", "Gauge", "Histogram", "MetricsRegistry", "metrics",
+           "RequestStats", "current_request_stats", "bind_request_stats", "unbind_request_stats",
+           "timed_phase", "timed", "count_queries", "install_db_hooks", "collect_pool_stats",
+           "record_upload", "MetricsMiddleware"]
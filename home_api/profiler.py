@@ -0,0 +1,164 @@
+import collections
+import datetime
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import typing
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .logger import logger
+
+PROFILE_HEADER = "x-profile"
+PROFILE_URL = "/api/profiles"
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _frame_name(code, lineno: int) -> str:
+    filename = code.co_filename
+    if filename.startswith(PACKAGE_DIR):
+        filename = "home_api" + filename[len(PACKAGE_DIR):]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_qualname} ({filename}:{lineno})"
+
+
+class SamplingProfiler(object):
+    """
+    Samples the python stacks every ``interval`` seconds from a separate thread and counts them
+    in the collapsed format of flamegraph.pl / speedscope (``frame;frame;frame count``).
+
+    The event loop thread (``main_thread_id``) is always sampled, the other threads only while
+    they run code of this package, e.g. a manager called in the thread pool.
+    """
+
+    def __init__(self, main_thread_id: int, interval: float = 0.002):
+        self.main_thread_id = main_thread_id
+        self.interval = interval
+        self.stacks: typing.Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            frames = []
+            in_package = False
+            while frame is not None:
+                frames.append(_frame_name(frame.f_code, frame.f_lineno))
+                in_package = in_package or frame.f_code.co_filename.startswith(PACKAGE_DIR)
+                frame = frame.f_back
+            if thread_id != self.main_thread_id and not in_package:
+                continue
+            frames.append(names.get(thread_id, str(thread_id)).replace(" ", "_"))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore(object):
+    """
+    Directory of the written profiles, only the newest ``max_profiles`` are kept.
+    """
+
+    NAME = re.compile(r"^[\w.-]+\.folded$")
+
+    def __init__(self, directory: str, max_profiles: int = 20):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def new_name(self, path: str) -> str:
+        slug = re.sub(r"[^\w]+", "_", path).strip("_")[:60] or "root"
+        # Sorting the names sorts the profiles by time
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"{now}_{slug}_{uuid.uuid4().hex[:8]}.folded"
+
+    def path(self, name: str) -> str | None:
+        if not self.NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def save(self, name: str, content: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w") as f:
+            f.write(content)
+        self._apply_retention()
+
+    def _apply_retention(self):
+        names = sorted(name for name in os.listdir(self.directory) if self.NAME.match(name))
+        for name in names[:max(0, len(names) - self.max_profiles)]:
+            os.remove(os.path.join(self.directory, name))
+
+
+class ProfilerMiddleware(object):
+    """
+    Profiles single requests sent with the header ``X-Profile: <PROFILER_TOKEN>``.
+    The response carries the link to the profile in the ``X-Profile-Url`` header,
+    the profile is written once the request has finished.
+    """
+
+    def __init__(self, app: ASGIApp, token: str, store: ProfileStore, interval: float = 0.002):
+        self.app = app
+        self.token = token
+        self.store = store
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not is_authorized(Headers(scope=scope), self.token):
+            await self.app(scope, receive, send)
+            return
+
+        name = self.store.new_name(scope["path"])
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Url", f"{PROFILE_URL}/{name}")
+            await send(message)
+
+        profiler = SamplingProfiler(main_thread_id=threading.get_ident(), interval=self.interval)
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - start
+            self.store.save(name, profiler.collapsed())
+            logger.info(f"Profiled {scope['method']} {scope['path']} in {elapsed:.3f}s "
+                        f"({profiler.samples} samples): {name}")
+
+
+def is_authorized(headers: Headers, token: str | None) -> bool:
+    value = headers.get(PROFILE_HEADER)
+    return bool(token) and value is not None and hmac.compare_digest(value.encode(), token.encode())
+
+
+__all__ = ["PROFILE_HEADER", "PROFILE_URL", "SamplingProfiler", "ProfileStore", "ProfilerMiddleware",
+           "is_authorized"]
@@ -0,0 +1,87 @@
+from typing import List, Dict
+
+from pydantic import BaseModel
+
+from .account import MonthExpensesTagModel
+
+
+class OverviewChartModel(BaseModel):
+    x_labels: List[str]
+    cumulative_savings: List[float]
+    cumulative_expenses: List[float]
+    cumulative_income: List[float]
+    start_month: int | None = None
+    start_year: int | None = None
+    end_month: int | None = None
+    end_year: int | None = None
+
+
+class LabeledSeriesModel(BaseModel):
+    label: str | None
+    data: List[float]
+
+
+class AnalysisOverviewModel(BaseModel):
+    x_labels: List[str]
+    tags_details: List[LabeledSeriesModel]
+    analysis_overview: List[LabeledSeriesModel]
+    start_year: int
+    start_month: int
+    end_year: int
+    end_month: int
+    frequency: str
+    period: str
+
+
+class EnergyConsumptionOverviewModel(BaseModel):
+    x_labels: List[str]
+    consumption: List[LabeledSeriesModel]
+    start_month: int
+    start_year: int
+    end_month: int
+    end_year: int
+
+
+class EnergyTotalConsumptionModel(BaseModel):
+    total: float
+    current_month_str: str
+    current_month: int
+    current_year: int
+    message: str
+    average_consumption_until_previous_month: float
+    consumption_development_percentage: float
+    start_month: int
+    start_year: int
+    end_month: int
+    end_year: int
+
+
+class SubcategoryExpensesModel(BaseModel):
+    category: str
+    subcategories: List[MonthExpensesTagModel]
+
+
+class NetworthModel(BaseModel):
+    networth: float
+    networth_development_percentage: float
+
+
+class DashboardComponentsModel(BaseModel):
+    networth: NetworthModel | None = None
+    expense_overview_chart: OverviewChartModel | None = None
+    month_expenses: List[MonthExpensesTagModel] | None = None
+    transactions_totals: List[MonthExpensesTagModel] | None = None
+    category_breakdown: List[MonthExpensesTagModel] | None = None
+    energy_total: EnergyTotalConsumptionModel | None = None
+    energy_overview: EnergyConsumptionOverviewModel | None = None
+
+
+class DashboardModel(BaseModel):
+    components: DashboardComponentsModel
+    errors: Dict[str, str]
+
+
+__all__ = ["OverviewChartModel", "LabeledSeriesModel", "AnalysisOverviewModel",
+           "EnergyConsumptionOverviewModel", "EnergyTotalConsumptionModel",
+           "SubcategoryExpensesModel", "NetworthModel",
+           "DashboardComponentsModel", "DashboardModel"]
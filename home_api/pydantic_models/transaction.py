@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 import datetime
 from uuid import UUID
@@ -18,4 +20,10 @@ class BankTransactionModel(BaseModel):
         from_attributes = True
 
 
-__all__ = ['BankTransactionModel']
+class BankTransactionPageModel(BaseModel):
+    items: List[BankTransactionModel]
+    # Pass as ``after`` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+__all__ = ['BankTransactionModel', 'BankTransactionPageModel']
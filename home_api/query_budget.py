@@ -0,0 +1,89 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .logger import logger
+from .metrics import RequestStats, bind_request_stats, current_request_stats, unbind_request_stats
+
+# Maximum number of sql statements per request, including the authentication.
+# The budgets don't depend on the amount of data: a request which needs more statements
+# for more rows or months (a query per item) is an N+1 regression. The energy total includes
+# the one-time backfill of the stored consumption months (4 statements for all counters).
+QUERY_BUDGETS = {
+    "/api/user/authenticate": 4,
+    "/api/user/is_session_active/{session_id}": 2,
+    "/api/user/{session_id}": 4,
+    "/api/dashboard/{session_id}": 19,
+    "/api/expenses/account_entries/{session_id}": 3,
+    "/api/expenses/month_expenses/{session_id}": 3,
+    "/api/expenses/month_expenses_and_savings/{session_id}": 4,
+    "/api/expenses/overview_chart/{session_id}": 4,
+    "/api/expenses/analysis_overview/{session_id}": 4,
+    "/api/transactions/upload/{session_id}": 4,
+    "/api/transactions/transactions/{session_id}": 3,
+    "/api/transactions/transactions_page/{session_id}": 3,
+    "/api/transactions/transactions_stream/{session_id}": 3,
+    "/api/transactions/overview_chart/{session_id}": 3,
+    "/api/transactions/total_expenses_and_savings/{session_id}": 4,
+    "/api/transactions/category_expenses_and_savings/{session_id}": 3,
+    "/api/transactions/subcategory_expenses_and_savings/{session_id}": 3,
+    "/api/energy/energy_counters/{session_id}": 3,
+    "/api/energy/energy_counter_readings/{session_id}": 3,
+    "/api/energy/energy_consumption_overview/{session_id}": 4,
+    "/api/energy/energy_consumption_total/{session_id}": 8,
+}
+
+
+class QueryBudgetExceeded(Exception):
+
+    def __init__(self, route: str, queries: int, budget: int):
+        super().__init__(f"{route} executed {queries} sql statements, the budget is {budget}")
+        self.route = route
+        self.queries = queries
+        self.budget = budget
+
+
+def check_query_budget(route: str, queries: int, budgets: dict = QUERY_BUDGETS):
+    """
+    Raises ``QueryBudgetExceeded`` if the route has a budget and ``queries`` exceeds it.
+    """
+    budget = budgets.get(route)
+    if budget is not None and queries > budget:
+        raise QueryBudgetExceeded(route, queries, budget)
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Checks the number of sql statements of every request against ``QUERY_BUDGETS``.
+    Exceeded budgets are logged, with ``strict`` (tests) the request raises
+    ``QueryBudgetExceeded`` after the response.
+    """
+
+    def __init__(self, app: ASGIApp, strict: bool = False, budgets: dict = QUERY_BUDGETS):
+        self.app = app
+        self.strict = strict
+        self.budgets = budgets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        stats = current_request_stats()
+        if stats is None:
+            stats = RequestStats()
+            token = bind_request_stats(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                unbind_request_stats(token)
+        route = getattr(scope.get("route"), "path", None)
+        try:
+            check_query_budget(route, stats.queries, self.budgets)
+        except QueryBudgetExceeded as e:
+            if self.strict:
+                raise
+            logger.warning(str(e))
+
+
+__all__ = ["QUERY_BUDGETS", "QueryBudgetExceeded", "check_query_budget", "QueryBudgetMiddleware"]
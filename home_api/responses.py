@@ -0,0 +1,48 @@
+import typing
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+from .metrics import timed_phase
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Dates, UUIDs, numpy values
+    and dataclasses are serialized natively.
+    """
+    media_type = "application/json"
+
+    def render(self, content: typing.Any) -> bytes:
+        with timed_phase("serialize"):
+            return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def dump_rows(rows: typing.Iterable, columns: typing.Sequence[str]) -> bytes:
+    """
+    Serialize sqlalchemy result rows (tuples of plain column values) to a json array of objects
+    without creating orm objects or pydantic models.
+    """
+    with timed_phase("serialize"):
+        return orjson.dumps([dict(zip(columns, row)) for row in rows], option=ORJSON_OPTIONS)
+
+
+def dump_ndjson(rows: typing.Iterable, columns: typing.Sequence[str]) -> bytes:
+    """
+    Serialize result rows as newline delimited json, one object per line.
+    """
+    return b"".join(orjson.dumps(dict(zip(columns, row)), option=ORJSON_OPTIONS) + b"\n" for row in rows)
+
+
+def rows_response(rows: typing.Iterable, columns: typing.Sequence[str],
+                  headers: typing.Mapping[str, str] | None = None) -> Response:
+    """
+    Returning a response directly skips the response_model validation. Headers set by
+    dependencies (e.g. the ETag) are not merged in that case, so they are passed explicitly.
+    """
+    return Response(content=dump_rows(rows, columns), media_type="application/json", headers=headers)
+
+
+__all__ = ["ORJSONResponse", "dump_rows", "dump_ndjson", "rows_response"]
@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+from typing import Annotated, Callable, Dict
+
+from dateutil.relativedelta import relativedelta
+from fastapi import Depends, HTTPException, status, APIRouter, Response
+
+from .user import validate_user
+from ..etag import conditional_get
+from ..logger import logger
+from ..managers.energy_manager import EnergyManager
+from ..managers.expense_manager import ExpenseManager
+from ..managers.transactions_manager import TransactionsManager
+from ..managers.user_manager import UserManager
+from ..pydantic_models.chart import DashboardModel
+from ..pydantic_models.session import UserSessionModel
+from ..runtime import create_db_session
+from ..server_timing import TimedRoute
+
+URL_BASE = "/api/dashboard"
+router = APIRouter(
+    prefix=URL_BASE,
+    tags=["dashboard"],
+    dependencies=[Depends(validate_user)],
+    route_class=TimedRoute,
+)
+
+
+def _unwrap(res):
+    # Manager methods decorated with return_wrapper return a dict
+    if isinstance(res, dict) and "error" in res and "exception" in res:
+        if res["error"]:
+            raise ValueError(res["message"])
+        return res["payload"]
+    return res
+
+
+def networth(db_session, user_id, today):
+    user_manager = UserManager(db_session=db_session)
+    return {
+        "networth": user_manager.get_networth(user_id=user_id, date=today),
+        "networth_development_percentage": user_manager.get_networth_development_percentage(
+            user_id=user_id, date=today),
+    }
+
+
+def expense_overview_chart(db_session, user_id, today):
+    end_date = today + relativedelta(years=1)
+    return ExpenseManager(db_session=db_session).get_overview_chart(user_id=user_id,
+                                                                    start_month=today.month,
+                                                                    start_year=today.year,
+                                                                    end_month=end_date.month,
+                                                                    end_year=end_date.year,
+                                                                    include_last_month=True,
+                                                                    apply_cumulative_on_expenses=False,
+                                                                    apply_cumulative_on_income=False,
+                                                                    apply_cumulative_on_savings=True)
+
+
+def month_expenses(db_session, user_id, today):
+    return ExpenseManager(db_session=db_session).get_month_expenses_and_savings(user_id=user_id,
+                                                                                month=today.month,
+                                                                                year=today.year,
+                                                                                allow_all_zeros=False)
+
+
+# The transaction totals are over all transactions, independent of the date
+def transactions_totals(db_session, user_id, _today):
+    return TransactionsManager(db_session=db_session).get_total_expenses_and_savings(user_id=user_id)
+
+
+def category_breakdown(db_session, user_id, _today):
+    return TransactionsManager(db_session=db_session).get_category_expenses_and_savings(user_id=user_id)
+
+
+def energy_total(db_session, user_id, today):
+    return EnergyManager(db_session=db_session).get_total_consumption(user_id=user_id, date=today)
+
+
+def energy_overview(db_session, user_id, today):
+    start_date = datetime.date(today.year, today.month, 1)
+    end_date = start_date + relativedelta(years=1)
+    return EnergyManager(db_session=db_session).get_energy_consumption_overview(user_id=user_id,
+                                                                                start_date=start_date,
+                                                                                end_date=end_date,
+                                                                                include_last_month=True)
+
+
+COMPONENTS: Dict[str, Callable] = {
+    "networth": networth,
+    "expense_overview_chart": expense_overview_chart,
+    "month_expenses": month_expenses,
+    "transactions_totals": transactions_totals,
+    "category_breakdown": category_breakdown,
+    "energy_total": energy_total,
+    "energy_overview": energy_overview,
+}
+
+
+def _run_component(component: Callable, user_id: int, today: datetime.date):
+    # Every component gets its own session from the shared pool and computes for the same date
+    db_session = create_db_session()
+    try:
+        return _unwrap(component(db_session, user_id, today))
+    finally:
+        db_session.close()
+
+
+@router.get("/{session_id}", response_model=DashboardModel,
+            # components which were not requested are left out
+            response_model_exclude_unset=True,
+            dependencies=[Depends(conditional_get)])
+async def get_dashboard(user: Annotated[UserSessionModel, Depends(validate_user)],
+                        response: Response,
+                        components: str | None = None):
+    """
+    Computes the dashboard components concurrently. ``components`` is an optional
+    comma separated selection, by default all components are returned.
+    """
+    if components:
+        names = [name.strip() for name in components.split(",") if name.strip()]
+    else:
+        names = list(COMPONENTS.keys())
+    unknown = [name for name in names if name not in COMPONENTS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown dashboard components: {unknown}. Valid values are {list(COMPONENTS.keys())}",
+        )
+
+    today = datetime.date.today()
+    results = await asyncio.gather(
+        *[asyncio.to_thread(_run_component, COMPONENTS[name], user.user_id, today) for name in names],
+        return_exceptions=True)
+
+    payload = {}
+    errors = {}
+    for name, res in zip(names, results):
+        if isinstance(res, Exception):
+            logger.error(f"Dashboard component {name} failed: {res}")
+            errors[name] = str(res)
+        else:
+            payload[name] = res
+    if errors:
+        # Partial results must not be revalidated as up to date
+        del response.headers["etag"]
+    return {
+        "components": payload,
+        "errors": errors,
+    }
+
+
+__all__ = ["router"]
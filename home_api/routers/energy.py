@@ -1,14 +1,18 @@
 import datetime
 
-from fastapi import Depends, HTTPException, status, APIRouter, Body, Request
+from fastapi import Depends, HTTPException, status, APIRouter, Body, Request, Response
 
 from .user import validate_user
+from ..etag import conditional_get
 from ..managers.energy_manager import EnergyManager
+from ..pydantic_models.chart import EnergyConsumptionOverviewModel, EnergyTotalConsumptionModel
 from ..pydantic_models.energy import EnergyCounterModel, EnergyCounterReadingModel
 from ..pydantic_models.session import UserSessionModel
-from ..runtime import db_session
+from ..responses import rows_response
+from ..runtime import db_session, run_in_session
 from typing import Annotated, List
 from ..logger import logger
+from ..server_timing import TimedRoute
 from dateutil.relativedelta import relativedelta
 
 energy_manager = EnergyManager(db_session=db_session)
@@ -17,24 +21,27 @@ URL_BASE = "/api/energy"
 router = APIRouter(
     prefix=URL_BASE,
     tags=["energy"],
-    dependencies=[Depends(validate_user)]
+    dependencies=[Depends(validate_user)],
+    route_class=TimedRoute,
 )
 
 
-@router.get("/energy_counters/{session_id}", response_model=List[EnergyCounterModel])
-async def energy_counters(user: Annotated[UserSessionModel, Depends(validate_user)]):
-    counters = energy_manager.get_energy_counters(user_id=user.user_id)
-    counters = [EnergyCounterModel.model_validate(
-        counter).model_dump() for counter in counters]
-    return counters
+@router.get("/energy_counters/{session_id}", response_model=List[EnergyCounterModel],
+            dependencies=[Depends(conditional_get)])
+async def energy_counters(user: Annotated[UserSessionModel, Depends(validate_user)],
+                          response: Response):
+    columns = list(EnergyCounterModel.model_fields)
+    rows = energy_manager.get_energy_counter_rows(user_id=user.user_id, columns=columns)
+    return rows_response(rows, columns, headers=response.headers)
 
 
-@router.get("/energy_counter_readings/{session_id}", response_model=List[EnergyCounterReadingModel])
-async def energy_counter_readings(user: Annotated[UserSessionModel, Depends(validate_user)]):
-    readings = energy_manager.get_energy_counter_readings(user_id=user.user_id)
-    readings = [EnergyCounterReadingModel.model_validate(
-        reading).model_dump() for reading in readings]
-    return readings
+@router.get("/energy_counter_readings/{session_id}", response_model=List[EnergyCounterReadingModel],
+            dependencies=[Depends(conditional_get)])
+async def energy_counter_readings(user: Annotated[UserSessionModel, Depends(validate_user)],
+                                  response: Response):
+    columns = list(EnergyCounterReadingModel.model_fields)
+    rows = energy_manager.get_energy_counter_reading_rows(user_id=user.user_id, columns=columns)
+    return rows_response(rows, columns, headers=response.headers)
 
 
 @router.put("/add_energy_counter/{session_id}", response_model=EnergyCounterModel)
@@ -116,7 +123,8 @@ async def delete_energy_counter_reading(user: Annotated[UserSessionModel, Depend
     return EnergyCounterReadingModel.model_validate(payload).model_dump()
 
 
-@router.get("/energy_consumption_overview/{session_id}", response_model=dict)
+@router.get("/energy_consumption_overview/{session_id}", response_model=EnergyConsumptionOverviewModel,
+            dependencies=[Depends(conditional_get)])
 async def get_energy_consumption_overview(user: Annotated[UserSessionModel, Depends(validate_user)],
                                           start_month: int, start_year: int,
                                           end_month: int, end_year: int, request: Request
@@ -132,10 +140,11 @@ async def get_energy_consumption_overview(user: Annotated[UserSessionModel, Depe
     else:
         start_date = datetime.date(start_year, start_month, 1)
         end_date = datetime.date(end_year, end_month, 1)
-    res = energy_manager.get_energy_consumption_overview(user_id=user.user_id,
-                                                         start_date=start_date,
-                                                         end_date=end_date,
-                                                         include_last_month=True)
+    res = await run_in_session(lambda session: EnergyManager(db_session=session).get_energy_consumption_overview(
+        user_id=user.user_id,
+        start_date=start_date,
+        end_date=end_date,
+        include_last_month=True))
     if res["error"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -146,9 +155,11 @@ async def get_energy_consumption_overview(user: Annotated[UserSessionModel, Depe
     return payload
 
 
-@router.get("/energy_consumption_total/{session_id}", response_model=dict)
+@router.get("/energy_consumption_total/{session_id}", response_model=EnergyTotalConsumptionModel,
+            dependencies=[Depends(conditional_get)])
 async def get_total_energy_consumption(user: Annotated[UserSessionModel, Depends(validate_user)]):
-    res = energy_manager.get_total_consumption(user_id=user.user_id)
+    res = await run_in_session(lambda session: EnergyManager(db_session=session).get_total_consumption(
+        user_id=user.user_id))
     if res["error"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,46 +1,54 @@
-import datetime
-
-from fastapi import Depends, HTTPException, status, APIRouter, Body, Request
+from fastapi import Depends, APIRouter
 
 from .user import validate_user
-from ..managers.expense_manager import ExpenseManager
-from ..pydantic_models.account import AccountEntryModel
+from ..managers.event_bus import event_bus, SESSION_REVOKED
 from ..pydantic_models.session import UserSessionModel
-from ..runtime import db_session
+from ..server_timing import TimedRoute
 from typing import Annotated
 from sse_starlette.sse import EventSourceResponse
 import json
-import asyncio
 
 MESSAGE_STREAM_RETRY_TIMEOUT = 15000  # millisecond
-MESSAGE_STREAM_DELAY = 60  # second
+MESSAGE_STREAM_PING = 30  # second
+MESSAGE_STREAM_QUEUE_SIZE = 100
 
 URL_BASE = "/api/events"
 router = APIRouter(
     prefix=URL_BASE,
     tags=["events"],
-    dependencies=[Depends(validate_user)]
+    dependencies=[Depends(validate_user)],
+    route_class=TimedRoute,
 )
 
 
 @router.get("/{session_id}", response_class=EventSourceResponse)
-async def get_events(request: Request, user: Annotated[UserSessionModel, Depends(validate_user)]):
+async def get_events(user: Annotated[UserSessionModel, Depends(validate_user)]):
+    """
+    Server sent events of the user. The session is sent once on connect, afterwards
+    only the events published by the managers for this user (uploads, new entries and
+    readings, revoked sessions) are sent. Idle connections only receive keep-alive pings.
+    """
     async def event_generator():
-        counter = 0
-        while True:
-            if await request.is_disconnected():
-                break
-            user_data = UserSessionModel.model_validate(user).model_dump()
-            user_data = json.dumps(user_data)
-            message = {
+        # Subscribed inside the generator, so the finally block always runs for it
+        subscription = event_bus.subscribe(user.user_id, max_size=MESSAGE_STREAM_QUEUE_SIZE)
+        try:
+            yield {
                 "event": "new_message",
-                "id": f"message_id_{counter}",
+                "id": "message_id_0",
                 "retry": MESSAGE_STREAM_RETRY_TIMEOUT,
-                "data": user_data,
+                "data": json.dumps(UserSessionModel.model_validate(user).model_dump()),
             }
-
-            yield message
-            await asyncio.sleep(delay=MESSAGE_STREAM_DELAY)
-            counter += 1
-
-    return EventSourceResponse(event_generator())
+            while True:
+                event = await subscription.get()
+                yield {
+                    "event": event.kind,
+                    "id": event.id,
+                    "retry": MESSAGE_STREAM_RETRY_TIMEOUT,
+                    "data": json.dumps(event.payload),
+                }
+                if event.kind == SESSION_REVOKED and event.payload.get("session_id") == user.session_id:
+                    break
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return EventSourceResponse(event_generator(), ping=MESSAGE_STREAM_PING)
@@ -1,12 +1,16 @@
 import datetime
 
-from fastapi import Depends, HTTPException, status, APIRouter, Body, Request
+from fastapi import Depends, HTTPException, status, APIRouter, Body, Request, Response
 
 from .user import validate_user
+from ..etag import conditional_get
 from ..managers.expense_manager import ExpenseManager
 from ..pydantic_models.account import AccountEntryModel, MonthExpensesTagModel
+from ..pydantic_models.chart import AnalysisOverviewModel, OverviewChartModel
 from ..pydantic_models.session import UserSessionModel
-from ..runtime import db_session
+from ..responses import ORJSONResponse
+from ..runtime import db_session, run_in_session
+from ..server_timing import TimedRoute
 from typing import Annotated, List
 
 expense_manager = ExpenseManager(db_session=db_session)
@@ -15,7 +19,8 @@ URL_BASE = "/api/expenses"
 router = APIRouter(
     prefix=URL_BASE,
     tags=["expenses"],
-    dependencies=[Depends(validate_user)]
+    dependencies=[Depends(validate_user)],
+    route_class=TimedRoute,
 )
 
 
@@ -58,19 +63,23 @@ async def delete_account_entry(user: Annotated[UserSessionModel, Depends(validat
     return AccountEntryModel.model_validate(payload).model_dump()
 
 
-@router.get("/account_entries/{session_id}", response_model=List[AccountEntryModel])
-async def account_entries(user: Annotated[UserSessionModel, Depends(validate_user)]):
-    entries = [AccountEntryModel.model_validate(entry).model_dump() for entry in
-               expense_manager.get_account_entries(user_id=user.user_id)]
+@router.get("/account_entries/{session_id}", response_model=List[AccountEntryModel],
+            dependencies=[Depends(conditional_get)])
+async def account_entries(user: Annotated[UserSessionModel, Depends(validate_user)],
+                          response: Response):
+    columns = list(AccountEntryModel.model_fields)
+    entries = [dict(zip(columns, row)) for row in
+               expense_manager.get_account_entry_rows(user_id=user.user_id, columns=columns)]
 
     # Set floating point precision to 2
     for entry in entries:
         entry["amount"] = round(entry["amount"], 2)
         entry["total_amount"] = round(entry["total_amount"], 2)
-    return entries
+    return ORJSONResponse(content=entries, headers=response.headers)
 
 
-@router.get("/month_expenses/{session_id}", response_model=List[MonthExpensesTagModel])
+@router.get("/month_expenses/{session_id}", response_model=List[MonthExpensesTagModel],
+            dependencies=[Depends(conditional_get)])
 async def get_month_expenses(user: Annotated[UserSessionModel, Depends(validate_user)],
                              month: int, year: int):
     res = expense_manager.get_month_expenses(
@@ -79,7 +88,8 @@ async def get_month_expenses(user: Annotated[UserSessionModel, Depends(validate_
     return res
 
 
-@router.get("/month_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel])
+@router.get("/month_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel],
+            dependencies=[Depends(conditional_get)])
 async def get_month_expenses_and_savings(user: Annotated[UserSessionModel, Depends(validate_user)],
                                          month: int, year: int):
     res = expense_manager.get_month_expenses_and_savings(user_id=user.user_id,
@@ -89,7 +99,8 @@ async def get_month_expenses_and_savings(user: Annotated[UserSessionModel, Depen
     return res
 
 
-@router.get("/overview_chart/{session_id}", response_model=dict)
+@router.get("/overview_chart/{session_id}", response_model=OverviewChartModel,
+            dependencies=[Depends(conditional_get)])
 async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_user)],
                              start_month: int, start_year: int,
                              end_month: int, end_year: int, request: Request):
@@ -98,16 +109,17 @@ async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_
         start_year = None
         end_month = None
         end_year = None
-    res = expense_manager.get_overview_chart(user_id=user.user_id,
-                                             start_month=start_month,
-                                             start_year=start_year,
-                                             end_month=end_month,
-                                             end_year=end_year,
-                                             include_last_month=True,
-                                             apply_cumulative_on_expenses=False,
-                                             apply_cumulative_on_income=False,
-                                             apply_cumulative_on_savings=True
-                                             )
+    res = await run_in_session(lambda session: ExpenseManager(db_session=session).get_overview_chart(
+        user_id=user.user_id,
+        start_month=start_month,
+        start_year=start_year,
+        end_month=end_month,
+        end_year=end_year,
+        include_last_month=True,
+        apply_cumulative_on_expenses=False,
+        apply_cumulative_on_income=False,
+        apply_cumulative_on_savings=True
+    ))
     if res["error"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -118,7 +130,8 @@ async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_
     return payload
 
 
-@router.get("/analysis_overview/{session_id}", response_model=dict)
+@router.get("/analysis_overview/{session_id}", response_model=AnalysisOverviewModel,
+            dependencies=[Depends(conditional_get)])
 async def get_analysis_overview(user: Annotated[UserSessionModel, Depends(validate_user)],
                                 start_month: int, start_year: int,
                                 end_month: int, end_year: int, frequency: str, request: Request):
@@ -140,12 +153,12 @@ async def get_analysis_overview(user: Annotated[UserSessionModel, Depends(valida
     elif frequency.lower() == "annually":
         month_freq = 12
 
-    res = expense_manager.create_analysis_overview(
+    res = await run_in_session(lambda session: ExpenseManager(db_session=session).create_analysis_overview(
         user_id=user.user_id,
         start_date=start_date,
         end_date=end_date,
         month_freq=month_freq,
-    )
+    ))
     if res["error"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
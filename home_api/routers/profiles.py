@@ -0,0 +1,42 @@
+from fastapi import Depends, HTTPException, status, APIRouter, Request
+from fastapi.responses import FileResponse
+
+from ..entrypoint import entry_point
+from ..etc import PROFILES_DIR
+from ..profiler import PROFILE_URL, ProfileStore, is_authorized
+
+profile_store = ProfileStore(directory=PROFILES_DIR, max_profiles=entry_point.settings.profiles_max)
+
+
+def validate_profiler_token(request: Request):
+    # Profiles show the code and timings of the server, only for holders of the profiler token
+    if not is_authorized(request.headers, entry_point.settings.profiler_token):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found",
+        )
+
+
+router = APIRouter(
+    prefix=PROFILE_URL,
+    tags=["profiles"],
+    dependencies=[Depends(validate_profiler_token)],
+    include_in_schema=False,
+)
+
+
+@router.get("/{name}", response_class=FileResponse)
+async def get_profile(name: str):
+    """
+    Collapsed stacks of a profiled request, load them into speedscope or flamegraph.pl.
+    """
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+    return FileResponse(path, media_type="text/plain")
+
+
+__all__ = ["router", "profile_store"]
@@ -1,14 +1,25 @@
-from typing import Annotated, List, Dict
+import base64
+import binascii
+import datetime
+import time
+import uuid
+from typing import Annotated, List, Dict, Literal
 
-from fastapi import Depends, HTTPException, status, APIRouter, Request, UploadFile
+from fastapi import Depends, HTTPException, status, APIRouter, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 
 from .user import validate_user
+from ..etag import conditional_get
 from ..logger import logger
+from ..metrics import record_upload
 from ..managers.transactions_manager import TransactionsManager
 from ..pydantic_models.account import MonthExpensesTagModel
+from ..pydantic_models.chart import OverviewChartModel, SubcategoryExpensesModel
 from ..pydantic_models.session import UserSessionModel
-from ..pydantic_models.transaction import BankTransactionModel
-from ..runtime import db_session
+from ..pydantic_models.transaction import BankTransactionModel, BankTransactionPageModel
+from ..responses import ORJSONResponse, dump_ndjson, rows_response
+from ..runtime import db_session, create_db_session, run_in_session
+from ..server_timing import TimedRoute
 
 transactions_manager = TransactionsManager(
     db_session=db_session
@@ -17,10 +28,41 @@ URL_BASE = "/api/transactions"
 router = APIRouter(
     prefix=URL_BASE,
     tags=["transactions"],
-    dependencies=[Depends(validate_user)]
+    dependencies=[Depends(validate_user)],
+    route_class=TimedRoute,
 )
 
 
+def transaction_filters(start_date: datetime.date | None = None,
+                        end_date: datetime.date | None = None,
+                        category: str | None = None,
+                        amount_sign: Literal["positive", "negative"] | None = None) -> dict:
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "category": category,
+        "amount_sign": amount_sign,
+    }
+
+
+def encode_cursor(key) -> str:
+    booking_date, transaction_id = key
+    raw = f"{booking_date.isoformat()}_{transaction_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        booking_date, transaction_id = raw.split("_", 1)
+        return datetime.date.fromisoformat(booking_date), uuid.UUID(transaction_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor.",
+        )
+
+
 # add endpoint to upload transactions file
 @router.post("/upload/{session_id}", response_model=dict)
 async def upload_transactions_file(
@@ -32,7 +74,6 @@ async def upload_transactions_file(
     filetype = file.content_type
     # filesize in mb
     filesize = file.size
-    logger.info(f"filesize={file.size} Bytes")
     if filesize == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -48,6 +89,7 @@ async def upload_transactions_file(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File size exceeds 100 MB.",
         )
+    start = time.perf_counter()
     content = await file.read()
     try:
         transactions_manager.parse_file(
@@ -63,23 +105,84 @@ async def upload_transactions_file(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error parsing file: {e}",
         )
-    logger.info(
-        f"Filename: {file.filename}, filetype: {file.content_type}, filesize: {file.size}")
+    elapsed = time.perf_counter() - start
+    record_upload(len(content), elapsed)
+    logger.info("File uploaded", extra={"fields": {
+        "user_id": user.user_id, "filename": file.filename, "filetype": filetype,
+        "filesize": filesize, "duration": round(elapsed, 3)}})
     return {"message": "File uploaded successfully", "filename": file.filename}
 
 
-@router.get("/transactions/{session_id}", response_model=List[BankTransactionModel])
+@router.get("/transactions/{session_id}", response_model=List[BankTransactionModel],
+            dependencies=[Depends(conditional_get)])
 async def get_transactions(
         user: Annotated[UserSessionModel, Depends(validate_user)],
+        response: Response,
 ):
-    all_bank_transactions = transactions_manager.get_bank_transactions(
-        user_id=user.user_id)
-    all_bank_transactions = [BankTransactionModel.model_validate(
-        transaction).model_dump() for transaction in all_bank_transactions]
-    return all_bank_transactions
+    # The columns are serialized straight from the result rows, the
+    # response model only documents the schema
+    columns = list(BankTransactionModel.model_fields)
+    rows = transactions_manager.get_bank_transaction_rows(
+        user_id=user.user_id, columns=columns)
+    return rows_response(rows, columns, headers=response.headers)
+
+
+@router.get("/transactions_page/{session_id}", response_model=BankTransactionPageModel,
+            dependencies=[Depends(conditional_get)])
+async def get_transactions_page(
+        user: Annotated[UserSessionModel, Depends(validate_user)],
+        response: Response,
+        filters: Annotated[dict, Depends(transaction_filters)],
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+        after: str | None = None,
+):
+    """
+    Transactions ordered by booking date, newest first. Pass ``next_cursor`` of a page
+    as ``after`` to get the next one.
+    """
+    columns = list(BankTransactionModel.model_fields)
+    rows, last_key = transactions_manager.get_bank_transaction_page(
+        user_id=user.user_id,
+        columns=columns,
+        limit=limit,
+        after=None if after is None else decode_cursor(after),
+        **filters)
+    return ORJSONResponse(content={
+        "items": [dict(zip(columns, row)) for row in rows],
+        "next_cursor": None if last_key is None else encode_cursor(last_key),
+    }, headers=response.headers)
+
+
+def _stream_transactions(user_id: int, columns: List[str], filters: dict):
+    # The server side cursor holds a connection until the stream ends,
+    # so it gets its own session instead of the shared one
+    stream_session = create_db_session()
+    try:
+        manager = TransactionsManager(db_session=stream_session)
+        for batch in manager.iter_bank_transaction_rows(user_id=user_id, columns=columns, **filters):
+            yield dump_ndjson(batch, columns)
+    finally:
+        stream_session.close()
+
+
+@router.get("/transactions_stream/{session_id}", response_class=StreamingResponse,
+            dependencies=[Depends(conditional_get)])
+async def stream_transactions(
+        user: Annotated[UserSessionModel, Depends(validate_user)],
+        response: Response,
+        filters: Annotated[dict, Depends(transaction_filters)],
+):
+    """
+    All matching transactions as newline delimited json, newest first.
+    """
+    columns = list(BankTransactionModel.model_fields)
+    return StreamingResponse(_stream_transactions(user.user_id, columns, filters),
+                             media_type="application/x-ndjson",
+                             headers=response.headers)
 
 
-@router.get("/overview_chart/{session_id}", response_model=dict)
+@router.get("/overview_chart/{session_id}", response_model=OverviewChartModel,
+            dependencies=[Depends(conditional_get)])
 async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_user)],
                              start_month: int, start_year: int,
                              end_month: int, end_year: int, request: Request):
@@ -88,16 +191,17 @@ async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_
         start_year = None
         end_month = None
         end_year = None
-    res = transactions_manager.get_overview_chart(user_id=user.user_id,
-                                                  start_month=start_month,
-                                                  start_year=start_year,
-                                                  end_month=end_month,
-                                                  end_year=end_year,
-                                                  include_last_month=True,
-                                                  apply_cumulative_on_expenses=False,
-                                                  apply_cumulative_on_income=False,
-                                                  apply_cumulative_on_savings=False
-                                                  )
+    res = await run_in_session(lambda session: TransactionsManager(db_session=session).get_overview_chart(
+        user_id=user.user_id,
+        start_month=start_month,
+        start_year=start_year,
+        end_month=end_month,
+        end_year=end_year,
+        include_last_month=True,
+        apply_cumulative_on_expenses=False,
+        apply_cumulative_on_income=False,
+        apply_cumulative_on_savings=False
+    ))
     if res["error"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -108,7 +212,8 @@ async def get_overview_chart(user: Annotated[UserSessionModel, Depends(validate_
     return payload
 
 
-@router.get("/total_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel])
+@router.get("/total_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel],
+            dependencies=[Depends(conditional_get)])
 async def get_total_expenses_and_savings(user: Annotated[UserSessionModel, Depends(validate_user)]):
     res = transactions_manager.get_total_expenses_and_savings(
         user_id=user.user_id)
@@ -116,7 +221,8 @@ async def get_total_expenses_and_savings(user: Annotated[UserSessionModel, Depen
     return res
 
 
-@router.get("/category_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel])
+@router.get("/category_expenses_and_savings/{session_id}", response_model=List[MonthExpensesTagModel],
+            dependencies=[Depends(conditional_get)])
 async def get_category_expenses_and_savings(user: Annotated[UserSessionModel, Depends(validate_user)]):
     res = transactions_manager.get_category_expenses_and_savings(
         user_id=user.user_id)
@@ -124,7 +230,8 @@ async def get_category_expenses_and_savings(user: Annotated[UserSessionModel, De
     return res
 
 
-@router.get("/subcategory_expenses_and_savings/{session_id}", response_model=List[dict])
+@router.get("/subcategory_expenses_and_savings/{session_id}", response_model=List[SubcategoryExpensesModel],
+            dependencies=[Depends(conditional_get)])
 async def get_subcategory_expenses_and_savings(user: Annotated[UserSessionModel, Depends(validate_user)]):
     res = transactions_manager.get_subcategory_expenses_and_savings(
         user_id=user.user_id)
@@ -8,9 +8,11 @@ from ..auth import OAuth2PasswordBearerWithCookie
 from ..db.checks import is_valid_uuid
 from ..debug import DEBUG_MODE
 from ..entrypoint import entry_point
+from ..metrics import timed
 from ..managers.user_manager import UserManager
 from ..pydantic_models.session import UserSessionModel, SessionPayloadModel
-from ..runtime import db_session
+from ..runtime import db_session, run_in_session
+from ..server_timing import TimedRoute
 
 URL_BASE = "/api/user"
 TOKEN_URL = "/authenticate"
@@ -20,9 +22,11 @@ oauth2_scheme = OAuth2PasswordBearerWithCookie(
 user_manager = UserManager(db_session=db_session)
 router = APIRouter(
     prefix=URL_BASE,
+    route_class=TimedRoute,
 )
 
 
+@timed("auth")
 async def validate_user(session_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
     if not is_valid_uuid(session_id):
         raise HTTPException(
@@ -77,7 +81,7 @@ async def authenticate_user(response: JSONResponse, form_data: Annotated[OAuth2P
         response.set_cookie(key="access_token",
                             value=f"Bearer {session.token}",
                             httponly=True,
-                            max_age=entry_point.access_token_expiration.total_seconds() // 60)
+                            max_age=entry_point.settings.access_token_expiration.total_seconds() // 60)
 
         if not DEBUG_MODE:
             session.token = "********"
@@ -112,8 +116,8 @@ async def logout_user(session_id: str, token: Annotated[str, Depends(oauth2_sche
 @router.get("/{session_id}", response_model=UserSessionModel)
 async def get_user(user: Annotated[UserSessionModel, Depends(validate_user)]):
     user.networth = user_manager.get_networth(user_id=user.user_id)
-    user.networth_development_percentage = user_manager.get_networth_development_percentage(
-        user_id=user.user_id)
+    user.networth_development_percentage = await run_in_session(
+        lambda session: UserManager(db_session=session).get_networth_development_percentage(user_id=user.user_id))
     if not DEBUG_MODE:
         user.user_id = -1
     return user
@@ -1,6 +1,51 @@
-from .db.session import Session
+import asyncio
+import typing
+
+from .db.engines import engine_registry
+from .db.session import Session, bootstrap_schema
 from .db.tables import Base
 
-db_session = Session.create(d_Base=Base).instance
+# The engine connects lazily, importing this module doesn't touch the database
+session = Session.create()
+db_session = session.instance
+
+
+def init_db():
+    return bootstrap_schema(session.engine, Base)
+
+
+def init_worker():
+    """
+    Called from the lifespan of every worker process. The pool of the shared engine is
+    (re)created in this process, so no connection is shared with the parent or other
+    workers, and the schema is verified.
+    """
+    engine_registry.dispose(session.dsn)
+    return init_db()
+
+
+def create_db_session():
+    """
+    New orm session from the shared pool, for work running outside the request thread.
+    The caller is responsible for closing it.
+    """
+    return engine_registry.session(session.dsn)
+
+
+async def run_in_session(func: typing.Callable):
+    """
+    Runs ``func(db_session)`` in a worker thread with a new session from the shared pool. The event
+    loop isn't blocked, and concurrent identical manager calls can wait for each other (single flight).
+    """
+
+    def run():
+        db_session = create_db_session()
+        try:
+            return func(db_session)
+        finally:
+            db_session.close()
+
+    return await asyncio.to_thread(run)
+
 
-__all__ = ["db_session"]
+__all__ = ["db_session", "init_db", "init_worker", "create_db_session", "run_in_session"]
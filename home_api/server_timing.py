@@ -0,0 +1,131 @@
+import functools
+import inspect
+import time
+import typing
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import RequestStats, bind_request_stats, current_request_stats, unbind_request_stats
+
+# Order of the entries in the header
+PHASES = ("auth", "db", "compute", "serialize")
+
+
+def format_server_timing(stats: RequestStats, total: float) -> str:
+    """
+    ``auth`` contains the statements of the session lookup, ``db`` all statements of the request.
+    """
+    phases = stats.phases or {}
+    entries = []
+    for name in PHASES:
+        if name == "db":
+            entries.append(f'db;dur={stats.query_time * 1000:.2f};desc="{stats.queries} queries"')
+        elif name in phases:
+            entries.append(f"{name};dur={phases[name] * 1000:.2f}")
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def _timed_endpoint(endpoint: typing.Callable) -> typing.Callable:
+    # The endpoint time minus its statements and serialization is the compute time
+    def record(stats, start, query_time, serialize_time):
+        elapsed = time.perf_counter() - start
+        stats.add_phase("endpoint", elapsed)
+        compute = (elapsed - (stats.query_time - query_time)
+                   - (stats.phases.get("serialize", 0.0) - serialize_time))
+        stats.add_phase("compute", max(compute, 0.0))
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapped(*args, **kwargs):
+            stats = current_request_stats()
+            if stats is None or stats.phases is None:
+                return await endpoint(*args, **kwargs)
+            start, query_time, serialize_time = (time.perf_counter(), stats.query_time,
+                                                 stats.phases.get("serialize", 0.0))
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                record(stats, start, query_time, serialize_time)
+    else:
+        @functools.wraps(endpoint)
+        def wrapped(*args, **kwargs):
+            stats = current_request_stats()
+            if stats is None or stats.phases is None:
+                return endpoint(*args, **kwargs)
+            start, query_time, serialize_time = (time.perf_counter(), stats.query_time,
+                                                 stats.phases.get("serialize", 0.0))
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                record(stats, start, query_time, serialize_time)
+    return wrapped
+
+
+class TimedRoute(APIRoute):
+    """
+    Route recording the phases of its requests for the ``Server-Timing`` header.
+    Whatever the route handler does outside of the dependencies and the endpoint
+    (response validation and serialization) is counted as ``serialize``.
+    """
+
+    def __init__(self, path: str, endpoint: typing.Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        @functools.wraps(handler)
+        async def timed_handler(request):
+            stats = current_request_stats()
+            if stats is None or stats.phases is None:
+                return await handler(request)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                outside = (time.perf_counter() - start - stats.phases.get("auth", 0.0)
+                           - stats.phases.pop("endpoint", 0.0))
+                stats.add_phase("serialize", max(outside, 0.0))
+
+        return timed_handler
+
+
+class ServerTimingMiddleware(object):
+    """
+    Opt-in (SERVER_TIMING), adds a ``Server-Timing`` header with the time spent in the
+    authentication, the sql statements, the endpoint code and the serialization.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        stats = current_request_stats()
+        if stats is None:
+            stats = RequestStats()
+            token = bind_request_stats(stats)
+        stats.phases = {}
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", format_server_timing(stats, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                unbind_request_stats(token)
+
+
+__all__ = ["format_server_timing", "TimedRoute", "ServerTimingMiddleware"]
@@ -0,0 +1,130 @@
+import dataclasses
+import datetime
+import os
+from typing import Tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings(object):
+    """
+    Immutable snapshot of the environment variables and the access config.
+    It is created once (see ``EntryPoint.load``) so hot paths only do attribute lookups.
+    """
+    port: int
+    host: str
+    db_hostname: str
+    db_user: str | None
+    db_user_password: str | None
+    db_name: str | None
+    secret_key: str | None
+    jwt_algorithm: str | None
+    access_token_expiration: datetime.timedelta | None
+    crypt_context_schemes: Tuple[str, ...] | None
+    cache_max_entries: int = 1024
+    # e.g. redis://localhost:6379/0 to share cached results between workers
+    cache_url: str | None = None
+    # responses smaller than this are sent uncompressed
+    compression_min_size: int = 1024
+    # e.g. redis://localhost:6379/0 to publish events to the SSE connections of all workers
+    events_url: str | None = None
+    # number of uvicorn worker processes
+    workers: int = 1
+    # "postgres" sends the invalidations of the in-memory result cache to the other workers
+    # with LISTEN/NOTIFY, "none" keeps them local
+    cache_invalidation: str = "none"
+    # adds a Server-Timing header with the time per phase to every response
+    server_timing: bool = False
+    # requests sent with the header "X-Profile: <profiler_token>" are profiled, unset disables it
+    profiler_token: str | None = None
+    # number of profiles kept in the profiles directory
+    profiles_max: int = 20
+    # fraction of the debug payload logs (chart results) which are written
+    log_payload_sample_rate: float = 1.0
+    # checks the sql statements per request against QUERY_BUDGETS: "off", "warn" (log) or
+    # "strict" (raise, for tests)
+    query_budget: str = "off"
+    # statements slower than this are written to the slow query log, unset disables it
+    slow_query_ms: float | None = None
+    # minimum seconds between two EXPLAIN ANALYZE captures of the same statement
+    slow_query_explain_interval: float = 60.0
+    # sqlalchemy url of the database, e.g. sqlite:///:memory: or sqlite:///home.db, replaces the DB_*
+    # variables (postgres)
+    database_url: str | None = None
+
+    @classmethod
+    def from_env(cls, access_config: dict | None) -> "Settings":
+        access_config = access_config or {}
+        jwt_config = access_config.get("JWT") or {}
+        crypt_context = access_config.get("CRYPT_CONTEXT") or {}
+
+        expire_minutes = jwt_config.get("ACCESS_TOKEN_EXPIRE_MINUTES")
+        schemes = crypt_context.get("SCHEMES")
+        workers = max(1, int(os.getenv("API_WORKERS", 1)))
+        database_url = os.getenv("DATABASE_URL") or None
+        is_postgres = database_url is None or database_url.startswith("postgresql")
+        return cls(
+            port=int(os.getenv("ENDPOINT_PORT", 8000)),
+            host=os.getenv("ENDPOINT", "localhost"),
+            db_hostname=os.getenv("DB_HOSTNAME", "localhost"),
+            db_user=os.getenv("DB_USER"),
+            db_user_password=os.getenv("DB_USER_PASSWORD"),
+            db_name=os.getenv("DB_NAME"),
+            secret_key=os.getenv("JWT_SECRET_KEY"),
+            jwt_algorithm=jwt_config.get("ALGORITHM"),
+            access_token_expiration=None if expire_minutes is None else datetime.timedelta(
+                minutes=expire_minutes),
+            crypt_context_schemes=None if schemes is None else tuple(schemes),
+            cache_max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 1024)),
+            cache_url=os.getenv("CACHE_URL") or None,
+            compression_min_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)),
+            events_url=os.getenv("EVENTS_URL") or None,
+            workers=workers,
+            cache_invalidation=os.getenv("CACHE_INVALIDATION") or (
+                "postgres" if workers > 1 and is_postgres else "none"),
+            server_timing=os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes"),
+            profiler_token=os.getenv("PROFILER_TOKEN") or None,
+            profiles_max=max(1, int(os.getenv("PROFILES_MAX", 20))),
+            log_payload_sample_rate=float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 1.0)),
+            query_budget=(os.getenv("QUERY_BUDGET") or "off").lower(),
+            slow_query_ms=float(os.getenv("SLOW_QUERY_MS")) if os.getenv("SLOW_QUERY_MS") else None,
+            slow_query_explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 60.0)),
+            database_url=database_url,
+        )
+
+    def missing(self) -> list:
+        """
+        Returns the names of the required settings which are not set.
+        """
+        missing = []
+        if not self.port:
+            missing.append("PORT")
+        if not self.host:
+            missing.append("HOST")
+        if not self.database_url:
+            if not self.db_user:
+                missing.append("DB_USER")
+            if not self.db_user_password:
+                missing.append("DB_USER_PASSWORD")
+            if not self.db_name:
+                missing.append("DB_NAME")
+            if not self.db_hostname:
+                missing.append("DB_HOSTNAME")
+        if not self.secret_key:
+            missing.append("JWT_SECRET_KEY")
+        if not self.jwt_algorithm:
+            missing.append("JWT_ALGORITHM")
+        if not self.access_token_expiration:
+            missing.append("ACCESS_TOKEN")
+        if not self.crypt_context_schemes:
+            missing.append("CRYPT_SCHEMES")
+        return missing
+
+    def __repr__(self):
+        return (f"Settings(port={self.port}, host={self.host}, db_hostname={self.db_hostname}, "
+                f"db_user={self.db_user}, db_name={self.db_name}, jwt_algorithm={self.jwt_algorithm}, "
+                f"access_token_expiration={self.access_token_expiration}, "
+                f"crypt_context_schemes={self.crypt_context_schemes}, workers={self.workers}, "
+                f"cache_invalidation={self.cache_invalidation})")
+
+
+__all__ = ["Settings"]
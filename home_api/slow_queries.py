@@ -0,0 +1,181 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .etc import LOGS_DIR, worker_filename
+from .logger import StructuredFormatter, Truncated, logger
+
+SLOW_QUERY_FILENAME = "slow_queries.log"
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+MANAGERS_DIR = os.path.join(PACKAGE_DIR, "managers")
+# Execution option of the connections which must not be recorded (the EXPLAIN itself)
+SKIP_OPTION = "skip_slow_query_log"
+
+
+def _origin() -> str | None:
+    """
+    The manager method (or else the first function of this package) which executed the statement.
+    """
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(MANAGERS_DIR):
+            return f"{frame.f_code.co_qualname} ({os.path.basename(filename)}:{frame.f_lineno})"
+        if fallback is None and filename.startswith(PACKAGE_DIR) and filename != __file__:
+            fallback = f"{frame.f_code.co_qualname} ({os.path.basename(filename)}:{frame.f_lineno})"
+        frame = frame.f_back
+    return fallback
+
+
+class SlowQueryLog(object):
+    """
+    Writes the statements slower than ``threshold`` seconds as json lines, with the parameters,
+    duration and originating manager method. For postgres selects the plan is captured with
+    ``EXPLAIN (ANALYZE, BUFFERS)``, which runs the statement again: at most once per
+    ``explain_interval`` seconds per statement, on a separate connection of a background thread.
+    Entries which don't fit in the queue are dropped.
+    """
+
+    def __init__(self, threshold: float, filepath: str | None = None, explain_interval: float = 60.0,
+                 max_pending: int = 100):
+        self.threshold = threshold
+        self.filepath = filepath or os.path.join(LOGS_DIR, worker_filename(SLOW_QUERY_FILENAME))
+        self.explain_interval = explain_interval
+        self.recorded = 0
+        self.explained = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._last_explain = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._handler = None
+        self._logger = logging.getLogger(f"home_api.slow_queries.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self._handler = logging.handlers.RotatingFileHandler(self.filepath, maxBytes=10 * 1024 * 1024,
+                                                             backupCount=2)
+        self._handler.setFormatter(StructuredFormatter())
+        self._logger.addHandler(self._handler)
+        self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+        self._thread.start()
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def stop(self):
+        """
+        Writes the queued entries and stops the background thread.
+        """
+        if self._thread is None:
+            return
+        event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context like the metrics, a failing statement doesn't reach the after event
+        if context is not None:
+            context.slow_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "slow_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed < self.threshold:
+            return
+        if context is not None and context.execution_options.get(SKIP_OPTION):
+            return
+        self.recorded += 1
+        entry = {
+            "statement": statement,
+            "parameters": str(Truncated(parameters)),
+            "duration_ms": round(elapsed * 1000, 3),
+            "origin": _origin(),
+        }
+        explain = not executemany and self._should_explain(conn, statement)
+        try:
+            self._queue.put_nowait((conn.engine if explain else None, statement, parameters, entry))
+        except queue.Full:
+            self.dropped += 1
+
+    def _should_explain(self, conn, statement: str) -> bool:
+        if conn.dialect.name != "postgresql":
+            return False
+        # ANALYZE executes the statement, only reads are explained
+        words = statement.split(None, 1)
+        if not words or words[0].upper() not in ("SELECT", "WITH"):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explain.get(statement)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._last_explain[statement] = now
+        return True
+
+    def _explain(self, engine, statement: str, parameters) -> str:
+        try:
+            with engine.connect().execution_options(**{SKIP_OPTION: True}) as connection:
+                rows = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).all()
+                connection.rollback()
+            return "\n".join(row[0] for row in rows)
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            engine, statement, parameters, entry = item
+            if engine is not None:
+                entry["plan"] = self._explain(engine, statement, parameters)
+                self.explained += 1
+            self._logger.warning("Slow query", extra={"fields": entry})
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "explained": self.explained, "dropped": self.dropped}
+
+
+slow_query_log: SlowQueryLog | None = None
+
+
+def configure_slow_query_log(settings) -> SlowQueryLog | None:
+    """
+    Starts the slow query log if ``SLOW_QUERY_MS`` is set. Called once per worker at startup.
+    """
+    global slow_query_log
+    stop_slow_query_log()
+    if settings.slow_query_ms is None:
+        return None
+    slow_query_log = SlowQueryLog(threshold=settings.slow_query_ms / 1000,
+                                  explain_interval=settings.slow_query_explain_interval)
+    slow_query_log.start()
+    logger.info(f"Slow query log: statements slower than {settings.slow_query_ms} ms")
+    return slow_query_log
+
+
+def stop_slow_query_log():
+    global slow_query_log
+    if slow_query_log is not None:
+        logger.info(f"Slow query log: {slow_query_log.stats()}")
+        slow_query_log.stop()
+        slow_query_log = None
+
+
+__all__ = ["SLOW_QUERY_FILENAME", "SlowQueryLog", "configure_slow_query_log", "stop_slow_query_log"]
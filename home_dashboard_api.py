@@ -1,21 +1,30 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from home_api.app import app
 from home_api.entrypoint import entry_point
 import uvicorn
-from home_api.logger import logger
-from home_api.db.session import Session
 
 
 def run():
-    uvicorn.run(app,
-                host=entry_point.host,
-                port=entry_point.port,
-                proxy_headers=True,
-                log_level="info",
-                # workers=8,
-                )
+    settings = entry_point.settings
+    if settings.workers > 1:
+        # Every worker process imports the app by itself and sets up its
+        # database pool and caches in the lifespan
+        uvicorn.run("home_api.app:app",
+                    host=settings.host,
+                    port=settings.port,
+                    proxy_headers=True,
+                    log_level="info",
+                    workers=settings.workers,
+                    )
+    else:
+        from home_api.app import app
+        uvicorn.run(app,
+                    host=settings.host,
+                    port=settings.port,
+                    proxy_headers=True,
+                    log_level="info",
+                    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+import asyncio
+import dataclasses
+import datetime
+import os
+import sys
+import threading
+import time
+import uuid
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.db.session import Session
+from home_api.entrypoint import entry_point
+from home_api.db.tables import Base
+from home_api.managers.cache import MemoryCacheBackend, cached_result, configure_cache, invalidates_cache, result_cache
+from home_api.managers.errors import ManagerErrors
+from home_api.managers.expense_manager import ExpenseManager
+from home_api.managers.user_manager import UserManager
+from home_api.managers.single_flight import SingleFlight
+from home_api.runtime import run_in_session
+# fmt: on
+
+session = Session.create(d_Base=Base)
+user_manager = UserManager(db_session=session.instance)
+expense_manager = ExpenseManager(db_session=session.instance)
+
+
+class DummyManager(object):
+    def __init__(self):
+        self.calls = 0
+
+    @cached_result()
+    def compute(self, user_id, value=1):
+        self.calls += 1
+        if value < 0:
+            return ManagerErrors.VALUE_ERROR
+        return {"user_id": user_id, "value": value}
+
+    @invalidates_cache()
+    def write(self, user_id):
+        return True
+
+
+def test_memory_backend_lru_eviction():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    # touch a, so b is the least recently used entry
+    assert backend.get("a") == (True, 1)
+    backend.set("c", 3)
+    assert backend.get("b") == (False, None)
+    assert backend.get("a") == (True, 1)
+    assert backend.get("c") == (True, 3)
+    assert backend.stats()["evictions"] == 1
+
+
+def test_cached_result_and_invalidation():
+    manager = DummyManager()
+    user_id = -1000
+    first = manager.compute(user_id=user_id, value=2)
+    second = manager.compute(user_id, 2)
+    assert first == second
+    assert manager.calls == 1
+    # other arguments are cached separately
+    manager.compute(user_id=user_id, value=3)
+    assert manager.calls == 2
+    # errors are not cached
+    manager.compute(user_id=user_id, value=-1)
+    manager.compute(user_id=user_id, value=-1)
+    assert manager.calls == 4
+    # writes of another user don't invalidate
+    manager.write(user_id=user_id - 1)
+    manager.compute(user_id=user_id, value=2)
+    assert manager.calls == 4
+    manager.write(user_id=user_id)
+    manager.compute(user_id=user_id, value=2)
+    assert manager.calls == 5
+
+
+def test_results_computed_before_a_reset_are_not_served():
+    class ResettingManager(DummyManager):
+        @cached_result()
+        def compute(self, user_id, value=1):
+            self.calls += 1
+            if self.calls == 1:
+                # e.g. the invalidation listener reconnects while the result is computed
+                result_cache.clear()
+            return {"user_id": user_id, "calls": self.calls}
+
+    # The versions before and after the reset are the same
+    result_cache.clear()
+    manager = ResettingManager()
+    manager.compute(user_id=-1001)
+    assert manager.compute(user_id=-1001) == {"user_id": -1001, "calls": 2}
+
+
+def test_cache_disabled_with_several_workers():
+    configure_cache(dataclasses.replace(entry_point.settings, workers=2, cache_url=None))
+    try:
+        assert not result_cache.enabled
+        manager = DummyManager()
+        manager.compute(user_id=-1000, value=2)
+        manager.compute(user_id=-1000, value=2)
+        assert manager.calls == 2
+    finally:
+        configure_cache(entry_point.settings)
+    assert result_cache.enabled
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    group = SingleFlight()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    def worker():
+        results.append(group.do("key", compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(res is results[0] for res in results)
+    assert group.stats() == {"executed": 1, "coalesced": 4, "bypassed": 0, "in_flight": 0}
+    # Once finished, the next call computes again
+    group.do("key", compute)
+    assert len(calls) == 2
+
+
+def test_single_flight_does_not_block_the_event_loop():
+    group = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.5)
+        return "leader"
+
+    leader = threading.Thread(target=lambda: group.do("key", slow))
+    leader.start()
+    started.wait()
+
+    async def on_loop():
+        return group.do("key", lambda: "loop")
+
+    begin = time.perf_counter()
+    # The loop computes by itself instead of waiting for the leader thread
+    assert asyncio.run(on_loop()) == "loop"
+    assert time.perf_counter() - begin < 0.4
+    leader.join()
+    assert group.stats() == {"executed": 1, "coalesced": 0, "bypassed": 1, "in_flight": 0}
+
+
+def test_single_flight_coalesces_calls_of_the_routers():
+    group = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    async def requests():
+        # Like the routers, which run the manager calls in worker threads
+        return await asyncio.gather(*[run_in_session(lambda session: group.do("key", compute)) for _ in range(3)])
+
+    assert asyncio.run(requests()) == [{"value": 42}] * 3
+    assert len(calls) == 1
+    assert group.stats() == {"executed": 1, "coalesced": 2, "bypassed": 0, "in_flight": 0}
+
+
+def test_account_entry_invalidates_overview_chart():
+    user = user_manager.create_verified_dummy_user()
+    today = datetime.date.today()
+    expense_manager.add_account_entry(user_id=user.id,
+                                      entry_id=str(uuid.uuid4()),
+                                      start_date=today.replace(day=1),
+                                      end_date=today.replace(day=1),
+                                      amount=100.0,
+                                      name="Salary",
+                                      tag="#Income")
+    version = result_cache.get_version(user.id)
+    chart = expense_manager.get_overview_chart(user_id=user.id)
+    assert not chart["error"]
+    assert expense_manager.get_overview_chart(user_id=user.id)["payload"] is chart["payload"]
+
+    expense_manager.add_account_entry(user_id=user.id,
+                                      entry_id=str(uuid.uuid4()),
+                                      start_date=today.replace(day=1),
+                                      end_date=today.replace(day=1),
+                                      amount=-50.0,
+                                      name="Rent",
+                                      tag="#Rent")
+    assert result_cache.get_version(user.id) == version + 1
+    new_chart = expense_manager.get_overview_chart(user_id=user.id)
+    assert new_chart["payload"] is not chart["payload"]
+    assert new_chart["payload"]["cumulative_expenses"][0] == 50.0
+    user_manager.delete_user_by_email(user.email)
@@ -0,0 +1,91 @@
+import os
+import sys
+
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.compression import CompressionMiddleware, select_encoding
+from home_api.managers.cache import MemoryCacheBackend, ResultCache
+# fmt: on
+
+BIG_PAYLOAD = [{"id": i, "label": "Groceries", "value": i * 1.5} for i in range(500)]
+
+test_app = FastAPI()
+test_app.add_middleware(CompressionMiddleware, minimum_size=500,
+                        cache=ResultCache(MemoryCacheBackend()))
+
+
+@test_app.get("/big")
+async def big(response: Response):
+    response.headers["ETag"] = '"big-v1"'
+    return BIG_PAYLOAD
+
+
+@test_app.get("/small")
+async def small():
+    return {"message": "Hello World"}
+
+
+@test_app.get("/stream")
+async def stream():
+    def lines():
+        for i in range(100):
+            yield b'{"id": %d, "label": "Groceries"}\n' % i
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+client = TestClient(test_app)
+
+
+def get_middleware():
+    # the middleware stack is built on the first request
+    stack = test_app.middleware_stack
+    while not isinstance(stack, CompressionMiddleware):
+        stack = stack.app
+    return stack
+
+
+def test_select_encoding():
+    assert select_encoding("gzip, deflate, br", ("br", "gzip")) == "br"
+    assert select_encoding("gzip;q=1.0, br;q=0.5", ("br", "gzip")) == "gzip"
+    assert select_encoding("br;q=0", ("br", "gzip")) is None
+    assert select_encoding("*", ("gzip",)) == "gzip"
+    assert select_encoding("identity", ("gzip",)) is None
+    assert select_encoding("", ("gzip",)) is None
+
+
+def test_compression_threshold_and_cache():
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"big-v1"'
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"big-v1"'
+    # the client decodes the body transparently
+    assert response.json() == BIG_PAYLOAD
+    assert int(response.headers["content-length"]) < len(response.content)
+
+    middleware = get_middleware()
+    compressed = middleware.compressed
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.json() == BIG_PAYLOAD
+    # Same ETag, the compressed bytes come from the cache
+    assert middleware.compressed == compressed
+    assert middleware.cache_hits == 1
+
+
+def test_streaming_is_not_compressed():
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert len(response.text.splitlines()) == 100
@@ -0,0 +1,85 @@
+import datetime
+import os
+import sys
+import uuid
+
+from fastapi.testclient import TestClient
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.app import app
+from home_api.managers.user_manager import UserManager
+from home_api.managers.expense_manager import ExpenseManager
+from home_api.runtime import db_session, init_db
+from home_api.db.utils import generate_password
+
+# fmt: on
+
+init_db()
+client = TestClient(app)
+user_manager = UserManager(db_session=db_session)
+expense_manager = ExpenseManager(db_session=db_session)
+
+
+def login_user():
+    url = "/api/user/authenticate"
+    user = user_manager.create_verified_dummy_user()
+    password = generate_password(fixed=True)
+    response = client.post(
+        url, data={"username": user.username, "password": password})
+    assert response.status_code == 200
+    payload = response.json()
+    session_id = payload["session_id"]
+    access_token = payload["token"]
+    auth_headers = {"cookie": f"access_token=\"Bearer {access_token}\""}
+    return auth_headers, session_id, user
+
+
+def test_dashboard_all_components():
+    auth_headers, session_id, user = login_user()
+    today = datetime.date.today().replace(day=1)
+    res = expense_manager.add_account_entry(user_id=user.id,
+                                            entry_id=str(uuid.uuid4()),
+                                            start_date=today,
+                                            end_date=today,
+                                            amount=-30.0,
+                                            name="Internet",
+                                            tag="#Telecom")
+    assert not res["error"]
+
+    response = client.get(f"/api/dashboard/{session_id}", headers=auth_headers)
+    assert response.status_code == 200
+    payload = response.json()
+    assert set(payload["components"].keys()) == {"networth", "expense_overview_chart", "month_expenses",
+                                                 "transactions_totals", "category_breakdown",
+                                                 "energy_total", "energy_overview"}
+    assert payload["errors"] == {}
+    assert payload["components"]["networth"]["networth"] == -30.0
+    user_manager.delete_user_by_email(user.email)
+
+
+def test_dashboard_component_selection():
+    auth_headers, session_id, user = login_user()
+    response = client.get(f"/api/dashboard/{session_id}",
+                          params={"components": "transactions_totals,energy_total"},
+                          headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.json()["components"].keys()) == {"transactions_totals", "energy_total"}
+
+    response = client.get(f"/api/dashboard/{session_id}",
+                          params={"components": "unknown"},
+                          headers=auth_headers)
+    assert response.status_code == 400
+
+    # No account entries: the expense overview fails, the rest is still returned
+    response = client.get(f"/api/dashboard/{session_id}",
+                          params={"components": "expense_overview_chart,networth"},
+                          headers=auth_headers)
+    assert response.status_code == 200
+    payload = response.json()
+    assert "expense_overview_chart" in payload["errors"]
+    assert "networth" in payload["components"]
+    assert "etag" not in response.headers
+    user_manager.delete_user_by_email(user.email)
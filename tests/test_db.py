@@ -1,13 +1,19 @@
+import dataclasses
 import sys
 import os
 
+import pytest
+import sqlalchemy
+from sqlalchemy.pool import StaticPool
+
 # fmt: off
 cwd = os.path.join(os.path.dirname(__file__))
 parent_dir = os.path.join(cwd, "..")
 sys.path.append(parent_dir)
 from home_api.entrypoint import entry_point
-from home_api.db.session import Session
-from home_api.db.tables import Base, User, UserSession, EnergyCounter, EnergyCounterReading, AccountEntry
+from home_api.db.session import Session, bootstrap_schema
+from home_api.db.engines import EngineRegistry, engine_registry, engine_options, make_dsn
+from home_api.db.tables import Base, BankTransaction, User, UserSession, EnergyCounter, EnergyCounterReading, AccountEntry
 
 from home_api.db.utils import generate_password
 
@@ -17,13 +23,68 @@ session = Session.create(d_Base=Base)
 
 
 def test_entry_point():
-    assert entry_point.check_all()
+    assert len(entry_point.settings.missing()) == 0
+
+
+def test_settings_are_frozen():
+    settings = entry_point.settings
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.port = 1
+    # Reloading creates a new snapshot
+    assert entry_point.reload() is not settings
 
 
 def test_session_connection():
     assert session.is_connected
 
 
+def test_sessions_share_engine():
+    other = Session.create(d_Base=Base)
+    assert other.engine is session.engine
+    assert other.instance is not session.instance
+    other.cleanup()
+    # The shared engine stays usable after a session is cleaned up
+    assert session.instance.query(User).count() >= 0
+    stats = engine_registry.pool_stats()
+    assert len(stats) >= 1
+    for pool_stats in stats.values():
+        assert "checked_out" in pool_stats
+
+
+def test_sqlite_in_memory_engine():
+    assert make_dsn("user", "pw", "localhost", "db", database_url="sqlite://") == "sqlite://"
+    assert engine_options("postgresql+psycopg2://user:pw@localhost/db") == {}
+    assert "poolclass" not in engine_options("sqlite:///home.db")
+    registry = EngineRegistry()
+    other = Session(db_user=None, db_user_password=None, db_name=None, hostname=None, d_Base=Base,
+                    database_url="sqlite:///:memory:")
+    other.engine = registry.get_engine(other.dsn)
+    other.create_all()
+    # All sessions share the single connection of the in-memory database
+    with registry.session(other.dsn) as first:
+        first.add(User(username="sqlite", password="x", email="sqlite@gmail.com", first_name="S", last_name="Q"))
+        first.commit()
+    with registry.session(other.dsn) as second:
+        assert second.query(User).filter_by(username="sqlite").count() == 1
+    registry.dispose_all()
+    with registry.session(other.dsn) as third:
+        assert third.query(User).count() == 1
+
+
+@pytest.mark.skipif(isinstance(session.engine.pool, StaticPool), reason="in-memory sqlite has no pool")
+def test_engine_registry_resets_pool_in_child_process():
+    registry = EngineRegistry()
+    engine = registry.get_engine(session.dsn)
+    with engine.connect():
+        pass
+    assert engine.pool.checkedin() == 1
+    # Pretend this is a forked worker, the inherited connection must not be reused
+    registry._pid = -1
+    assert registry.get_engine(session.dsn) is engine
+    assert engine.pool.checkedin() == 0
+    registry.dispose_all()
+
+
 def create_user(first_name, last_name, email, password):
     user = User.create(session=session.instance,
                        first_name=first_name,
@@ -176,5 +237,15 @@ def test_create_account_entry():
     instance.delete(user)
     instance.commit()
 
+
+def test_bootstrap_creates_missing_indexes():
+    index, = BankTransaction.__table__.indexes
+    index.drop(session.engine)
+    assert index.name not in [ix["name"] for ix in sqlalchemy.inspect(session.engine).get_indexes("bank_transaction")]
+    # The table exists already, only the index is created
+    bootstrap_schema(session.engine, Base, force=True)
+    assert index.name in [ix["name"] for ix in sqlalchemy.inspect(session.engine).get_indexes("bank_transaction")]
+
+
 # if __name__ == "__main__":
 #     test_create_user_session()
@@ -0,0 +1,204 @@
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.db.tables import EnergyCounter, EnergyCounterMonth, EnergyCounterReading
+from home_api.managers.energy_manager import EnergyManager
+from home_api.managers.user_manager import UserManager
+from home_api.runtime import create_db_session, db_session, init_db
+# fmt: on
+
+init_db()
+user_manager = UserManager(db_session=db_session)
+energy_manager = EnergyManager(db_session=db_session)
+
+
+def create_counter(user_id, readings):
+    counter = EnergyCounter(id=uuid.uuid4(), user_id=user_id, counter_id="EL-1", counter_type="electricity",
+                            base_price=10.0, price=0.5, energy_unit="kWh", frequency="monthly",
+                            start_date=datetime.date(2021, 1, 15), end_date=datetime.date(2022, 1, 15),
+                            first_reading=100.0)
+    db_session.add(counter)
+    for reading_date, reading in readings:
+        db_session.add(EnergyCounterReading(id=uuid.uuid4(), counter_id=counter.id, reading=reading,
+                                            reading_date=reading_date))
+    db_session.commit()
+    return counter
+
+
+def test_energy_consumption_overview():
+    user_manager.delete_user_by_email("Energy.Overview@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Energy", last_name="Overview")
+    create_counter(user.id, [(datetime.date(2021, 2, 10), 150.0),
+                             (datetime.date(2021, 3, 5), 170.0),
+                             (datetime.date(2021, 3, 25), 200.0),
+                             (datetime.date(2021, 5, 20), 260.0)])
+
+    res = energy_manager._get_energy_consumption_overview(user_id=user.id, start_date=datetime.date(2021, 1, 1),
+                                                          end_date=datetime.date(2021, 6, 1),
+                                                          include_last_month=False)
+    assert res["x_labels"] == ["Jan 2021", "Feb 2021", "Mar 2021", "Apr 2021", "May 2021"]
+    # The first month is measured from the first reading of the counter, a month with several
+    # readings costs the consumption of its last reading, months without a reading cost nothing
+    assert res["consumption"] == [{"label": "ele-EL-", "data": [0.0, 35.0, 25.0, 0.0, 40.0]},
+                                  {"label": "Total", "data": [0.0, 35.0, 25.0, 0.0, 40.0]}]
+
+    # Starting later, the consumption is measured from the last reading before the range
+    res = energy_manager._get_energy_consumption_overview(user_id=user.id, start_date=datetime.date(2021, 3, 1),
+                                                          end_date=datetime.date(2021, 6, 1),
+                                                          include_last_month=False)
+    assert res["x_labels"] == ["Mar 2021", "Apr 2021", "May 2021"]
+    assert res["consumption"][0]["data"] == [25.0, 0.0, 40.0]
+    user_manager.delete_user_by_email(user.email)
+
+
+def stored_months(counter_id):
+    return [(row.month, row.consumption, row.cost) for row in
+            db_session.query(EnergyCounterMonth).filter(EnergyCounterMonth.counter_id == counter_id).
+            order_by(EnergyCounterMonth.month)]
+
+
+def assert_months_up_to_date(counter_id):
+    stored = stored_months(counter_id)
+    counter = db_session.query(EnergyCounter).filter(EnergyCounter.id == counter_id).first()
+    energy_manager._rebuild_consumption_months([counter])
+    rebuilt = stored_months(counter_id)
+    db_session.rollback()
+    assert stored == rebuilt
+
+
+def test_consumption_months_are_maintained_incrementally():
+    user_manager.delete_user_by_email("Energy.Months@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Energy", last_name="Months")
+    start_date = datetime.date.today().replace(day=10) - relativedelta(months=30)
+    res = energy_manager.add_energy_counter(user_id=user.id, counter_id_db=None, counter_id="GA-1",
+                                            counter_type="gas", energy_unit="m3", frequency="monthly",
+                                            base_price=5.0, price=0.25, start_date=start_date,
+                                            end_date=start_date + relativedelta(years=5), first_reading=0.0)
+    counter_id = res["payload"]["id"]
+
+    def add_reading(entry_id, reading, reading_date):
+        res = energy_manager.add_energy_counter_reading(user_id=user.id, entry_id=entry_id, counter_id="GA-1",
+                                                        counter_type="gas", reading=reading,
+                                                        reading_date=reading_date)
+        assert not res["error"]
+
+    rng = random.Random(3)
+    readings = []
+    reading_date, reading = start_date, 0.0
+    while reading_date < datetime.date.today() - datetime.timedelta(days=45):
+        reading_date += datetime.timedelta(days=rng.choice([3, 10, 20, 31, 40]))
+        reading += rng.uniform(0, 50)
+        readings.append((str(uuid.uuid4()), reading, reading_date))
+        add_reading(*readings[-1])
+    assert_months_up_to_date(counter_id)
+
+    # Change the latest reading, move an older one after it and delete some
+    entry_id, reading, reading_date = readings.pop()
+    add_reading(entry_id, reading + 10.0, reading_date)
+    assert_months_up_to_date(counter_id)
+    entry_id, _, _ = readings.pop(5)
+    add_reading(entry_id, reading + 30.0, reading_date + datetime.timedelta(days=20))
+    assert_months_up_to_date(counter_id)
+    for entry_id, _, _ in rng.sample(readings, 5):
+        assert not energy_manager.delete_energy_counter_reading(user_id=user.id, reading_id=entry_id)["error"]
+        assert_months_up_to_date(counter_id)
+
+    # The prices are applied to all months
+    months = stored_months(counter_id)
+    res = energy_manager.add_energy_counter(user_id=user.id, counter_id_db=counter_id, counter_id="GA-1",
+                                            counter_type="gas", energy_unit="m3", frequency="monthly",
+                                            base_price=7.0, price=0.5, start_date=start_date,
+                                            end_date=start_date + relativedelta(years=5), first_reading=0.0)
+    assert not res["error"]
+    assert [(month, consumption, round(7.0 + 0.5 * consumption, 2)) for month, consumption, _ in months] == \
+        stored_months(counter_id)
+
+    # The total is looked up from the stored months, like the overview computes it from the readings
+    overview = energy_manager._get_energy_consumption_overview(user_id=user.id, start_date=start_date,
+                                                               end_date=datetime.date.today().replace(day=1),
+                                                               include_last_month=False)
+    total = energy_manager.get_total_consumption(user_id=user.id)["payload"]
+    history = overview["consumption"][-1]["data"][:-2]
+    assert total["total"] == overview["consumption"][-1]["data"][-1]
+    assert total["average_consumption_until_previous_month"] == round(sum(history) / len(history), 2)
+    user_manager.delete_user_by_email(user.email)
+    assert stored_months(counter_id) == []
+
+
+def test_total_consumption_backfills_counters_without_months():
+    user_manager.delete_user_by_email("Energy.Backfill@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Energy", last_name="Backfill")
+    # Readings written directly, like those from before the table existed
+    counter = create_counter(user.id, [(datetime.date(2021, 2, 10), 150.0), (datetime.date(2021, 3, 5), 170.0)])
+    counter_id = counter.id
+    assert stored_months(counter_id) == []
+
+    assert not energy_manager.get_total_consumption(user_id=user.id)["error"]
+    assert stored_months(counter_id) == [(datetime.date(2021, 2, 1), 50.0, 35.0),
+                                         (datetime.date(2021, 3, 1), 20.0, 20.0)]
+    assert_months_up_to_date(counter_id)
+    user_manager.delete_user_by_email(user.email)
+
+
+@pytest.mark.skipif(db_session.get_bind().dialect.name != "postgresql", reason="needs concurrent transactions")
+def test_concurrent_backfills_dont_fail():
+    user_manager.delete_user_by_email("Energy.Race@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Energy", last_name="Race")
+    counter = create_counter(user.id, [(datetime.date(2021, 2, 10), 150.0)])
+    # Another request is backfilling the same counter and commits while this one inserts
+    other = create_db_session()
+    other.execute(insert(EnergyCounterMonth), [{"counter_id": counter.id, "month": datetime.date(2021, 2, 1),
+                                                "consumption": 50.0, "cost": 35.0}])
+    results = []
+    session = create_db_session()
+    thread = threading.Thread(target=lambda: results.append(
+        EnergyManager(db_session=session).get_total_consumption(user_id=user.id)))
+    thread.start()
+    time.sleep(0.5)
+    other.commit()
+    other.close()
+    thread.join()
+    session.close()
+    assert not results[0]["error"]
+    assert stored_months(counter.id) == [(datetime.date(2021, 2, 1), 50.0, 35.0)]
+    user_manager.delete_user_by_email(user.email)
+
+
+@pytest.mark.skipif(db_session.get_bind().dialect.name != "postgresql", reason="needs concurrent transactions")
+def test_reading_writes_wait_for_the_lock_of_the_counter():
+    user_manager.delete_user_by_email("Energy.Lock@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Energy", last_name="Lock")
+    counter = create_counter(user.id, [(datetime.date(2021, 2, 10), 150.0)])
+    # Another request writes a reading of the same counter and hasn't committed yet (FOR NO KEY UPDATE
+    # doesn't conflict with the key share lock of the foreign key, only with the lock of the counter)
+    other = create_db_session()
+    other.query(EnergyCounter).filter(EnergyCounter.id == counter.id).with_for_update(key_share=True).all()
+    results = []
+    session = create_db_session()
+    thread = threading.Thread(target=lambda: results.append(
+        EnergyManager(db_session=session).add_energy_counter_reading(
+            user_id=user.id, entry_id=str(uuid.uuid4()), counter_id="EL-1", counter_type="electricity",
+            reading=180.0, reading_date=datetime.date(2021, 3, 5))))
+    thread.start()
+    time.sleep(0.3)
+    assert thread.is_alive()
+    other.rollback()
+    other.close()
+    thread.join()
+    session.close()
+    assert not results[0]["error"]
+    assert_months_up_to_date(counter.id)
+    user_manager.delete_user_by_email(user.email)
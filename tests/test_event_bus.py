@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+import os
+import sys
+import uuid
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.db.session import Session
+from home_api.db.tables import Base
+from home_api.managers.event_bus import EventBus, Event, event_bus, ACCOUNT_ENTRY_ADDED, SESSION_REVOKED
+from home_api.managers.expense_manager import ExpenseManager
+from home_api.managers.user_manager import UserManager
+# fmt: on
+
+session = Session.create(d_Base=Base)
+user_manager = UserManager(db_session=session.instance)
+expense_manager = ExpenseManager(db_session=session.instance)
+
+
+def test_event_bus_fan_out_per_user():
+    async def run():
+        bus = EventBus()
+        first = bus.subscribe(user_id=1)
+        second = bus.subscribe(user_id=1)
+        other = bus.subscribe(user_id=2, max_size=2)
+
+        bus.publish(1, "ping", {"value": 1})
+        for subscription in (first, second):
+            event = await subscription.get(timeout=1)
+            assert event.kind == "ping"
+            assert event.payload == {"value": 1}
+        assert await other.get(timeout=0.05) is None
+
+        # A slow consumer loses the oldest events
+        for i in range(3):
+            bus.publish(2, "ping", {"value": i})
+        await asyncio.sleep(0)
+        assert other.dropped == 1
+        assert (await other.get(timeout=1)).payload == {"value": 1}
+
+        bus.unsubscribe(first)
+        bus.unsubscribe(second)
+        bus.unsubscribe(other)
+        assert bus.stats()["subscriptions"] == 0
+
+    asyncio.run(run())
+
+
+def test_event_roundtrip():
+    event = Event(user_id=3, kind=SESSION_REVOKED, payload={"session_id": "abc"})
+    assert Event.from_json(event.to_json()) == event
+
+
+def test_manager_publishes_on_write():
+    user = user_manager.create_verified_dummy_user()
+
+    async def run():
+        subscription = event_bus.subscribe(user_id=user.id)
+        try:
+            entry_id = str(uuid.uuid4())
+            today = datetime.date.today().replace(day=1)
+            # Managers publish from worker threads as well
+            res = await asyncio.to_thread(expense_manager.add_account_entry,
+                                          user_id=user.id,
+                                          entry_id=entry_id,
+                                          start_date=today,
+                                          end_date=today,
+                                          amount=10.0,
+                                          name="Entry",
+                                          tag="#Tag")
+            assert not res["error"]
+            event = await subscription.get(timeout=1)
+            assert event.kind == ACCOUNT_ENTRY_ADDED
+            assert event.payload == {"entry_id": entry_id}
+
+            # Failed writes don't publish
+            res = expense_manager.add_account_entry(user_id=-1, entry_id=str(uuid.uuid4()),
+                                                    start_date=today, end_date=today,
+                                                    amount=1.0, name="Entry", tag="#Tag")
+            assert res["error"]
+            assert await subscription.get(timeout=0.05) is None
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    asyncio.run(run())
+    user_manager.delete_user_by_email(user.email)
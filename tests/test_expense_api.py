@@ -13,12 +13,13 @@ sys.path.append(parent_dir)
 from home_api.app import app
 from home_api.managers.user_manager import UserManager
 from home_api.managers.expense_manager import ExpenseManager
-from home_api.runtime import db_session
+from home_api.runtime import db_session, init_db
 from home_api.db.utils import generate_password
 from home_api.pydantic_models.account import AccountEntryModel
 
 # fmt: on
 
+init_db()
 client = TestClient(app)
 user_manager = UserManager(db_session=db_session)
 expense_manager = ExpenseManager(db_session=db_session)
@@ -132,6 +133,50 @@ def test_delete_account_entry():
     assert response.status_code == 200
     delete_user()
 
+
+def test_account_entries_conditional_get():
+    auth_headers, session_id, user = login_user()
+    url = f"/api/expenses/account_entries/{session_id}"
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    # A write changes the data version and therefore the ETag
+    entry = create_account_entry()
+    response = client.put(f"/api/expenses/add_account_entry/{session_id}",
+                          json=entry.model_dump(), headers=auth_headers)
+    assert response.status_code == 200
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 1
+    delete_user()
+
+
+def test_account_entries_rows_match_model():
+    auth_headers, session_id, user = login_user()
+    entry = create_account_entry()
+    response = client.put(f"/api/expenses/add_account_entry/{session_id}",
+                          json=entry.model_dump(), headers=auth_headers)
+    assert response.status_code == 200
+    added = response.json()
+
+    response = client.get(f"/api/expenses/account_entries/{session_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    entries = response.json()
+    assert len(entries) == 1
+    # The rows are serialized without the response model, the output has to stay the same
+    assert list(entries[0].keys()) == list(AccountEntryModel.model_fields)
+    assert AccountEntryModel.model_validate(entries[0]).model_dump(mode="json") == entries[0]
+    assert entries[0] == added
+    delete_user()
+
 # def run():
 #     test_add_account_entry_success()
 #     test_add_account_entry_failure()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+import pytest
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.db.session import Session
+from home_api.db.tables import Base
+from home_api.managers.cache import MemoryCacheBackend, ResultCache
+from home_api.managers.invalidation import InvalidationBus, MemoryInvalidationBackend, MemoryInvalidationChannel, PostgresInvalidationBackend
+# fmt: on
+
+session = Session.create(d_Base=Base)
+
+
+def test_invalidation_reaches_other_workers_per_domain():
+    channel = MemoryInvalidationChannel()
+    first, second = ResultCache(MemoryCacheBackend()), ResultCache(MemoryCacheBackend())
+    first_bus, second_bus = InvalidationBus(cache=first), InvalidationBus(cache=second)
+    first_bus.start(MemoryInvalidationBackend(channel))
+    second_bus.start(MemoryInvalidationBackend(channel))
+    try:
+        first.invalidate_user(7, "energy")
+        assert second.get_version(7) == 1
+        assert second.get_version(7, "energy") == 1
+        assert second.get_version(7, "expenses") == 0
+        # The own message is not applied twice
+        assert first.get_version(7) == 1
+        assert first_bus.stats()["sent"] == 1
+        assert second_bus.stats()["received"] == 1
+    finally:
+        first_bus.stop()
+        second_bus.stop()
+    assert first.publisher is None
+    first.invalidate_user(7, "energy")
+    assert second.get_version(7, "energy") == 1
+
+
+@pytest.mark.skipif(session.engine.dialect.name != "postgresql", reason="LISTEN/NOTIFY needs postgres")
+def test_postgres_invalidation_roundtrip():
+    listener = ResultCache(MemoryCacheBackend())
+    listener.backend.set("stale", 1)
+    epoch = listener.epoch
+    listener_bus = InvalidationBus(cache=listener)
+    listener_bus.start(PostgresInvalidationBackend(engine=session.engine, poll_timeout=0.2))
+    sender_bus = InvalidationBus(cache=ResultCache(MemoryCacheBackend()))
+    sender_bus.start(PostgresInvalidationBackend(engine=session.engine, poll_timeout=0.2))
+    try:
+        # The listener connects in its thread, resend until it is subscribed
+        deadline = time.time() + 10
+        while listener.get_version(-2000, "transactions") == 0 and time.time() < deadline:
+            sender_bus.cache.invalidate_user(-2000, "transactions")
+            time.sleep(0.2)
+        assert listener.get_version(-2000, "transactions") > 0
+        assert listener.get_version(-2000, "energy") == 0
+        # Invalidations before the listener was connected are lost, so it starts with an empty cache
+        assert listener_bus.stats()["resets"] == 1
+        assert listener.backend.get("stale") == (False, None)
+        assert listener.epoch != epoch
+    finally:
+        sender_bus.stop()
+        listener_bus.stop()
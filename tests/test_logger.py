@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import queue
+import sys
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.etc import worker_filename
+from home_api.logger import DeferredQueueHandler, StructuredFormatter, Truncated, log_payload, logger
+# fmt: on
+
+
+class CountingPayload(object):
+    def __init__(self):
+        self.formatted = 0
+
+    def __repr__(self):
+        self.formatted += 1
+        return "payload"
+
+
+def test_payload_is_truncated_and_lazy():
+    payload = {"x_labels": [str(i) for i in range(1000)], "consumption": list(range(1000))}
+    text = str(Truncated(payload))
+    assert len(text) < 300
+    assert "..." in text
+
+    counting = CountingPayload()
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        log_payload("Chart", counting)
+    finally:
+        logger.setLevel(level)
+    assert counting.formatted == 0
+
+
+def test_structured_formatter_adds_fields():
+    record = logging.LogRecord("uvicorn.error", logging.INFO, __file__, 1, "File %s", ("a.csv",), None)
+    record.fields = {"user_id": 3, "filesize": 10}
+    data = json.loads(StructuredFormatter().format(record))
+    assert data["message"] == "File a.csv"
+    assert data["level"] == "INFO"
+    assert data["user_id"] == 3
+    assert data["filesize"] == 10
+
+
+def test_worker_filenames_differ_per_process():
+    assert worker_filename("slow_queries.log") == f"slow_queries.{os.getpid()}.log"
+
+
+def test_queued_records_are_formatted_by_the_listener():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    queued_logger = logging.getLogger("home_api.test_queued_records")
+    queued_logger.propagate = False
+    queued_logger.addHandler(handler)
+    counting = CountingPayload()
+    try:
+        try:
+            raise ValueError("failed")
+        except ValueError:
+            queued_logger.exception("Chart %s", Truncated(counting))
+    finally:
+        queued_logger.removeHandler(handler)
+    record = handler.queue.get_nowait()
+    # Nothing was formatted on the calling thread
+    assert counting.formatted == 0
+    data = json.loads(StructuredFormatter().format(record))
+    assert data["message"] == "Chart payload"
+    assert "ValueError: failed" in data["exception"]
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import StaticPool
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.app import app
+from home_api.metrics import MetricsRegistry, RequestStats, count_queries, db_queries_per_request, http_request_duration
+from home_api.server_timing import ServerTimingMiddleware
+from home_api.managers.user_manager import UserManager
+from home_api.runtime import db_session, init_db
+from home_api.db.utils import generate_password
+# fmt: on
+
+init_db()
+client = TestClient(app)
+user_manager = UserManager(db_session=db_session)
+
+
+def test_histogram_text_format():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    counter = registry.counter("calls_total", "Calls.", ("route",))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("/a/{id}",))
+    counter.inc(labels=('say "hi"',))
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="1"} 3' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/a/{id}"} 4' in text
+    assert 'latency_seconds_sum{route="/a/{id}"} 3.65' in text
+    assert 'calls_total{route="say \\"hi\\""} 1' in text
+
+
+def test_metrics_endpoint_records_route_templates():
+    user = user_manager.create_verified_dummy_user()
+    response = client.post("/api/user/authenticate",
+                           data={"username": user.username, "password": generate_password(fixed=True)})
+    assert response.status_code == 200
+    payload = response.json()
+    auth_headers = {"cookie": f"access_token=\"Bearer {payload['token']}\""}
+
+    route = "/api/expenses/account_entries/{session_id}"
+    requests_before = http_request_duration.count(("GET", route))
+    queries_before = db_queries_per_request.count((route,))
+    response = client.get(f"/api/expenses/account_entries/{payload['session_id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert http_request_duration.count(("GET", route)) == requests_before + 1
+    assert db_queries_per_request.count((route,)) == queries_before + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert f'http_requests_total{{method="GET",route="{route}",status="200"}}' in text
+    assert 'http_requests_in_flight 1' in text
+    assert 'db_query_duration_seconds_count' in text
+    if not isinstance(db_session.get_bind().pool, StaticPool):
+        # The single connection of an in-memory sqlite database has no pool stats
+        assert 'db_pool_connections{' in text
+    # Raw paths never become labels
+    assert payload["session_id"] not in text
+    user_manager.delete_user_by_email(user.email)
+
+
+def test_server_timing_header():
+    timed_client = TestClient(ServerTimingMiddleware(app))
+    user = user_manager.create_verified_dummy_user()
+    response = timed_client.post("/api/user/authenticate",
+                                 data={"username": user.username, "password": generate_password(fixed=True)})
+    payload = response.json()
+    auth_headers = {"cookie": f"access_token=\"Bearer {payload['token']}\""}
+
+    response = timed_client.get(f"/api/expenses/account_entries/{payload['session_id']}", headers=auth_headers)
+    assert response.status_code == 200
+    entries = dict(entry.strip().split(";", 1) for entry in response.headers["server-timing"].split(","))
+    assert list(entries) == ["auth", "db", "compute", "serialize", "total"]
+    assert "queries" in entries["db"]
+    assert "server-timing" not in client.get("/").headers
+    user_manager.delete_user_by_email(user.email)
+
+
+def test_failing_statements_leave_no_state_on_the_connection():
+    # The pooled connection, its info outlives the transaction
+    pooled_connection = db_session.connection().connection
+    with count_queries() as stats:
+        with pytest.raises(DBAPIError):
+            db_session.execute(text("SELECT * FROM missing_table"))
+        db_session.rollback()
+        db_session.execute(text("SELECT 1"))
+    assert stats.queries == 1
+    assert not pooled_connection.info.get("query_start")
+
+
+def test_request_stats_count_the_statements_of_all_threads():
+    stats = RequestStats()
+
+    def worker():
+        for _ in range(10000):
+            stats.add_query("SELECT 1", 0.001)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.queries == 40000
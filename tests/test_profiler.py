@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.app import app
+from home_api.profiler import ProfilerMiddleware, ProfileStore
+# fmt: on
+
+client = TestClient(app)
+# A separate app, the production app must not get a test route
+busy_app = FastAPI()
+
+
+@busy_app.get("/test_profiler/busy")
+async def busy():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return {"done": True}
+
+
+def test_profiled_request_writes_collapsed_stacks(tmp_path):
+    store = ProfileStore(directory=str(tmp_path), max_profiles=2)
+    profiled_client = TestClient(ProfilerMiddleware(busy_app, token="secret", store=store, interval=0.001))
+
+    # Without the token the request is not profiled
+    response = profiled_client.get("/test_profiler/busy", headers={"X-Profile": "wrong"})
+    assert "x-profile-url" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+    names = []
+    for _ in range(3):
+        response = profiled_client.get("/test_profiler/busy", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        names.append(response.headers["x-profile-url"].rsplit("/", 1)[1])
+    # Only the newest profiles are kept
+    assert sorted(os.listdir(tmp_path)) == sorted(names[1:])
+
+    with open(store.path(names[-1])) as f:
+        lines = f.read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("busy (tests/test_profiler.py" in line or "busy (test_profiler.py" in line for line in lines)
+    assert store.path("../" + names[-1]) is None
+
+
+def test_profiles_require_token():
+    response = client.get("/api/profiles/20240101_000000_x_00000000.folded")
+    assert response.status_code == 404
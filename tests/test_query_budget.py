@@ -0,0 +1,153 @@
+import os
+import sys
+import datetime
+import uuid
+
+import pytest
+from dateutil.relativedelta import relativedelta
+from fastapi.testclient import TestClient
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.app import app
+from home_api.db.tables import AccountEntry, BankTransaction, EnergyCounter, EnergyCounterReading
+from home_api.managers.energy_manager import EnergyManager
+from home_api.managers.expense_manager import ExpenseManager
+from home_api.managers.transactions_manager import TransactionsManager
+from home_api.managers.user_manager import UserManager
+from home_api.metrics import count_queries
+from home_api.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware
+from home_api.runtime import db_session, init_db
+from home_api.db.utils import generate_password
+# fmt: on
+
+init_db()
+user_manager = UserManager(db_session=db_session)
+expense_manager = ExpenseManager(db_session=db_session)
+transactions_manager = TransactionsManager(db_session=db_session)
+energy_manager = EnergyManager(db_session=db_session)
+
+CSV_HEADER = ("Auftragskonto;Buchungstag;Valutadatum;Buchungstext;Verwendungszweck;Gläubiger ID;Mandatsreferenz;"
+              "Kundenreferenz (End-to-End);Sammlerreferenz;Lastschrift Ursprungsbetrag;"
+              "Auslagenersatz Rücklastschrift;Begünstigter/Zahlungspflichtiger;Kontonummer/IBAN;BIC (SWIFT-Code);"
+              "Betrag;Währung;Info")
+CATEGORIES = [("Shopping", "Supermarket"), ("Shopping", "Drugstore"), ("Living Expenses", "Rent"),
+              ("Income", "Salary")]
+
+
+def month_start(months_ago: int) -> datetime.date:
+    return datetime.date.today().replace(day=1) - relativedelta(months=months_ago)
+
+
+def seed_user(last_name: str, months: int, counters: int = 1):
+    """
+    A user with account entries, transactions and energy readings of ``counters`` counters in each
+    of ``months`` months.
+    """
+    user_manager.delete_user_by_email(f"Budget.{last_name}@gmail.com")
+    user = user_manager.create_verified_dummy_user(first_name="Budget", last_name=last_name)
+    energy_counters = [EnergyCounter(id=uuid.uuid4(), user_id=user.id, counter_id=f"EL-{k}", counter_type="electricity",
+                                     base_price=10.0, price=0.3, energy_unit="kWh", frequency="monthly",
+                                     start_date=month_start(months), end_date=month_start(-1), first_reading=1000.0)
+                       for k in range(counters)]
+    db_session.add_all(energy_counters)
+    for i in range(months):
+        month = month_start(months - i)
+        db_session.add(AccountEntry(id=uuid.uuid4(), user_id=user.id, name=f"Entry {i}", tag=f"#Tag{i % 4}",
+                                    amount=-10.0 - i, total_amount=-10.0 - i, months_count=1,
+                                    start_date=month, end_date=month))
+        db_session.add(AccountEntry(id=uuid.uuid4(), user_id=user.id, name="Salary", tag="#Income",
+                                    amount=2000.0, total_amount=2000.0, months_count=1,
+                                    start_date=month, end_date=month))
+        for j, (category, subcategory) in enumerate(CATEGORIES):
+            db_session.add(BankTransaction(id=uuid.uuid4(), user_id=user.id, booking_date=month + relativedelta(days=j),
+                                           value_date=month + relativedelta(days=j),
+                                           amount=2000.0 if category == "Income" else -20.0 - j, currency="EUR",
+                                           description=f"Transaction {i} {j}", category=category,
+                                           subcategory=subcategory, keyword=""))
+        for counter in energy_counters:
+            db_session.add(EnergyCounterReading(id=uuid.uuid4(), counter_id=counter.id,
+                                                reading=1000.0 + 100 * (i + 1), reading_date=month.replace(day=28)))
+    db_session.commit()
+    return user
+
+
+def statement_csv(months: int) -> bytes:
+    lines = [CSV_HEADER]
+    for i in range(months):
+        day = month_start(months - i).strftime("%d.%m.%y")
+        lines.append(f'"DE02120300000000202051";"{day}";"{day}";"KARTENZAHLUNG";"REWE SAGT DANKE {i}";'
+                     f'"DE98ZZZ09999999999";"MR{i}";"NOTPROVIDED";"SR1";"1,00";"3,00";"REWE Markt GmbH";'
+                     f'"DE02100100109307118603";"COBADEFFXXX";"-{20 + i},50";"EUR";"Umsatz gebucht"')
+    return "\n".join(lines).encode("latin1")
+
+
+def manager_calls(user, months: int) -> dict:
+    start, end = month_start(months), month_start(0)
+    chart_range = {"start_month": start.month, "start_year": start.year,
+                   "end_month": end.month, "end_year": end.year}
+    content = statement_csv(months)
+    return {
+        "expenses.get_overview_chart": lambda: expense_manager.get_overview_chart(user_id=user.id, **chart_range),
+        "expenses.create_analysis_overview": lambda: expense_manager.create_analysis_overview(
+            user_id=user.id, start_date=start, end_date=end, month_freq=1),
+        "user.get_networth_development_percentage": lambda:
+            user_manager.get_networth_development_percentage(user_id=user.id),
+        "transactions.get_category_expenses_and_savings": lambda:
+            transactions_manager.get_category_expenses_and_savings(user_id=user.id),
+        "transactions.get_subcategory_expenses_and_savings": lambda:
+            transactions_manager.get_subcategory_expenses_and_savings(user_id=user.id),
+        "transactions.parse_file": lambda: transactions_manager.parse_file(
+            filename="statement.csv", filetype="text/csv", filesize=len(content), content=content,
+            user_id=user.id),
+        "energy.get_energy_consumption_overview": lambda: energy_manager.get_energy_consumption_overview(
+            user_id=user.id, start_date=start, end_date=end),
+        "energy.get_total_consumption": lambda: energy_manager.get_total_consumption(user_id=user.id),
+    }
+
+
+def test_manager_query_counts_do_not_grow_with_data():
+    counts = []
+    for last_name, months, counters in (("Small", 3, 1), ("Large", 30, 4)):
+        user = seed_user(last_name, months, counters)
+        res = {}
+        for name, call in manager_calls(user, months).items():
+            with count_queries() as stats:
+                call()
+            res[name] = stats.queries
+        counts.append(res)
+        user_manager.delete_user_by_email(user.email)
+    assert counts[0] == counts[1]
+
+
+def test_request_query_budgets():
+    client = TestClient(QueryBudgetMiddleware(app, strict=True))
+    user = seed_user("Budget", 24, counters=3)
+    response = client.post("/api/user/authenticate",
+                           data={"username": user.username, "password": generate_password(fixed=True)})
+    assert response.status_code == 200
+    payload = response.json()
+    auth_headers = {"cookie": f"access_token=\"Bearer {payload['token']}\""}
+    session_id = payload["session_id"]
+    start, end = month_start(24), month_start(0)
+    months = f"start_month={start.month}&start_year={start.year}&end_month={end.month}&end_year={end.year}"
+    # Raises QueryBudgetExceeded if a request needs more statements than its budget
+    for url in [f"/api/dashboard/{session_id}",
+                f"/api/expenses/overview_chart/{session_id}?{months}",
+                f"/api/expenses/analysis_overview/{session_id}?{months}&frequency=monthly",
+                f"/api/transactions/category_expenses_and_savings/{session_id}",
+                f"/api/transactions/subcategory_expenses_and_savings/{session_id}",
+                f"/api/energy/energy_consumption_overview/{session_id}?{months}",
+                f"/api/energy/energy_consumption_total/{session_id}"]:
+        assert client.get(url, headers=auth_headers).status_code == 200
+    response = client.post(f"/api/transactions/upload/{session_id}", headers=auth_headers,
+                           files={"file": ("statement.csv", statement_csv(24), "text/csv")})
+    assert response.status_code == 200
+
+    tight_client = TestClient(QueryBudgetMiddleware(app, strict=True, budgets={
+        "/api/expenses/account_entries/{session_id}": 1}))
+    with pytest.raises(QueryBudgetExceeded):
+        tight_client.get(f"/api/expenses/account_entries/{session_id}", headers=auth_headers)
+    user_manager.delete_user_by_email(user.email)
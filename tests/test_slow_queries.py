@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.managers.expense_manager import ExpenseManager
+from home_api.managers.user_manager import UserManager
+from home_api.runtime import db_session, init_db
+from home_api.slow_queries import SlowQueryLog
+# fmt: on
+
+init_db()
+user_manager = UserManager(db_session=db_session)
+expense_manager = ExpenseManager(db_session=db_session)
+
+
+def test_slow_queries_are_logged_with_rate_limited_plans(tmp_path):
+    user = user_manager.create_verified_dummy_user()
+    expense_manager.create_dummy_account_entry(user_id=user.id)
+    filepath = str(tmp_path / "slow_queries.log")
+    # Every statement is slow
+    slow_query_log = SlowQueryLog(threshold=0.0, filepath=filepath, explain_interval=60.0)
+    slow_query_log.start()
+    try:
+        # The pooled connection, its info outlives the transaction
+        pooled_connection = db_session.connection().connection
+        with pytest.raises(DBAPIError):
+            db_session.execute(text("SELECT * FROM missing_table"))
+        db_session.rollback()
+        expense_manager.get_month_expenses(user_id=user.id, month=5, year=2021)
+        expense_manager.get_month_expenses(user_id=user.id, month=6, year=2021)
+    finally:
+        slow_query_log.stop()
+    user_manager.delete_user_by_email(user.email)
+
+    with open(filepath) as f:
+        entries = [json.loads(line) for line in f]
+    own = [entry for entry in entries
+           if (entry["origin"] or "").startswith("ExpenseManager.get_month_expenses ")]
+    assert len(own) == 2
+    assert all(entry["duration_ms"] >= 0 and "GROUP BY" in entry["statement"] for entry in own)
+    # sqlite binds the dates as strings
+    assert any(date in own[0]["parameters"] for date in ("datetime.date(2021, 5, 1)", "2021-05-01"))
+    if db_session.get_bind().dialect.name == "postgresql":
+        # The same statement is only explained once per interval
+        assert "Execution Time" in own[0]["plan"]
+    assert "plan" not in own[1]
+    # The failing statement left nothing on its connection
+    assert not pooled_connection.info.get("slow_query_start")
+    # The EXPLAIN itself is not recorded
+    assert not any(entry["statement"].startswith("EXPLAIN") for entry in entries)
@@ -0,0 +1,125 @@
+import os
+import sys
+import datetime
+import json
+
+from fastapi.testclient import TestClient
+
+# fmt: off
+cwd = os.path.join(os.path.dirname(__file__))
+parent_dir = os.path.join(cwd, "..")
+sys.path.append(parent_dir)
+from home_api.app import app
+from home_api.db.tables import BankTransaction
+from home_api.managers.user_manager import UserManager
+from home_api.runtime import db_session, init_db
+from home_api.db.utils import generate_password
+# fmt: on
+
+init_db()
+client = TestClient(app)
+user_manager = UserManager(db_session=db_session)
+
+
+def delete_user():
+    user_manager.delete_user_by_email("John.Doe@gmail.com")
+
+
+def login_user():
+    user = user_manager.create_verified_dummy_user()
+    response = client.post("/api/user/authenticate",
+                           data={"username": user.username, "password": generate_password(fixed=True)})
+    assert response.status_code == 200
+    payload = response.json()
+    auth_headers = {"cookie": f"access_token=\"Bearer {payload['token']}\""}
+    return auth_headers, payload["session_id"], user
+
+
+def add_transactions(user_id, count):
+    start = datetime.date(2023, 1, 1)
+    for i in range(count):
+        transaction = BankTransaction.create_empty_bank_transaction(user_id=user_id)
+        # Three transactions per day, so the id has to break ties
+        transaction.booking_date = start + datetime.timedelta(days=i // 3)
+        transaction.value_date = transaction.booking_date
+        transaction.amount = -10.0 * i if i % 2 else 10.0 * i
+        transaction.category = "Groceries" if i % 4 == 0 else "Other"
+        db_session.add(transaction)
+    db_session.commit()
+
+
+def test_transactions_keyset_pagination():
+    auth_headers, session_id, user = login_user()
+    add_transactions(user.id, 25)
+    url = f"/api/transactions/transactions_page/{session_id}"
+
+    items = []
+    after = None
+    pages = 0
+    while True:
+        params = {"limit": 10}
+        if after:
+            params["after"] = after
+        response = client.get(url, params=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.json()
+        items.extend(page["items"])
+        pages += 1
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert pages == 3
+    assert len(items) == 25
+    assert len({item["id"] for item in items}) == 25
+    keys = [(item["booking_date"], item["id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+
+    response = client.get(url, params={"amount_sign": "negative", "category": "Other", "limit": 100},
+                          headers=auth_headers)
+    assert response.status_code == 200
+    filtered = response.json()["items"]
+    assert len(filtered) == 12
+    assert all(item["amount"] < 0 and item["category"] == "Other" for item in filtered)
+
+    response = client.get(url, params={"start_date": "2023-01-02", "end_date": "2023-01-03"},
+                          headers=auth_headers)
+    assert len(response.json()["items"]) == 6
+
+    response = client.get(url, params={"after": "not a cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+    delete_user()
+
+
+def test_transactions_ndjson_stream():
+    auth_headers, session_id, user = login_user()
+    add_transactions(user.id, 7)
+    url = f"/api/transactions/transactions_stream/{session_id}"
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "etag" in response.headers
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 7
+    assert lines[0]["booking_date"] == "2023-01-03"
+
+    response = client.get(url, params={"amount_sign": "positive"}, headers=auth_headers)
+    assert len(response.text.splitlines()) == 4
+    delete_user()
+
+
+def test_upload_is_parsed_in_memory():
+    delete_user()
+    auth_headers, session_id, user = login_user()
+    header = ("Auftragskonto;Buchungstag;Valutadatum;Buchungstext;Verwendungszweck;Gläubiger ID;Mandatsreferenz;"
+              "Kundenreferenz (End-to-End);Sammlerreferenz;Lastschrift Ursprungsbetrag;"
+              "Auslagenersatz Rücklastschrift;Begünstigter/Zahlungspflichtiger;Kontonummer/IBAN;BIC (SWIFT-Code);"
+              "Betrag;Währung;Info")
+    row = ('"DE02120300000000202051";"02.01.23";"02.01.23";"KARTENZAHLUNG";"REWE SAGT DANKE";"DE98ZZZ09999999999";'
+           '"MR1";"NOTPROVIDED";"SR1";"1,00";"3,00";"REWE Markt GmbH";"DE02100100109307118603";"COBADEFFXXX";'
+           '"-20,50";"EUR";"Umsatz gebucht"')
+    response = client.post(f"/api/transactions/upload/{session_id}", headers=auth_headers,
+                           files={"file": ("statement.csv", f"{header}\n{row}".encode("latin1"), "text/csv")})
+    assert response.status_code == 200
+    assert db_session.query(BankTransaction).filter(BankTransaction.user_id == user.id).count() == 1
+    assert not os.path.exists(os.path.join(parent_dir, "tmp"))
+    delete_user()
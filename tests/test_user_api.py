@@ -9,10 +9,11 @@ parent_dir = os.path.join(cwd, "..")
 sys.path.append(parent_dir)
 from home_api.app import app
 from home_api.managers.user_manager import UserManager
-from home_api.runtime import db_session
+from home_api.runtime import db_session, init_db
 from home_api.db.utils import generate_password
 
 # fmt: on
+init_db()
 client = TestClient(app)
 user_manager = UserManager(db_session=db_session)
 